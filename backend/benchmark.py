@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Endpoint benchmark suite.
+
+Generates a synthetic data set (synthetic_data.py) in a scratch directory,
+starts the local Plaid stand-in (fake_plaid.py) with the requested latency
+and failure rate, then drives every endpoint of main.py through an ASGI
+client, one scenario at a time at a fixed concurrency. For each scenario it
+reports p50/p95/p99 latency, throughput, error count and peak RSS, and saves
+everything as JSON so runs can be compared:
+
+    python benchmark.py --years 5 --spending 100000 --banks 8 --output before.json
+    python benchmark.py --years 5 --spending 100000 --banks 8 --compare before.json
+
+--compare exits non-zero if any scenario's p95 latency or throughput got
+worse than --threshold (default 20%) relative to the baseline run.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Endpoints that cannot be driven in a loop, and why
+SKIPPED = {
+    'GET /api/stream': 'server-sent events never complete',
+    'POST /api/create_link_token': 'calls the real Plaid SDK',
+    'POST /api/exchange_public_token': 'calls the real Plaid SDK',
+}
+
+
+@dataclass
+class Scenario:
+    name: str
+    send: Callable[..., Awaitable]
+    # Fraction of --requests to send; heavy full-dataset endpoints run fewer times
+    share: float = 1.0
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def start_fake_plaid(latency: float, jitter: float, failures: float, seed: int) -> str:
+    """Run fake_plaid on an ephemeral port in a background thread and return its base URL"""
+    import socket
+
+    import uvicorn
+
+    import fake_plaid
+
+    fake_plaid.configure(latency, jitter, failures, seed)
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(fake_plaid.app, log_level='error'))
+    threading.Thread(target=server.run, kwargs={'sockets': [sock]}, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
+
+
+def scenarios(context: dict) -> List[Scenario]:
+    """Every endpoint in main.py that can be benchmarked, as request factories"""
+    rng: random.Random = context['rng']
+    years_ago = context['years_ago']
+
+    def get(path, **params):
+        return lambda client: client.get(path, params=params)
+
+    def get_internal(path):
+        headers = {'Authorization': f"Bearer {os.environ['INTERNAL_API_TOKEN']}"}
+        return lambda client: client.get(path, headers=headers)
+
+    async def create_message(client):
+        return await client.post('/api/messages', json={'content': 'benchmark', 'author': 'partner1'})
+
+    async def update_message(client):
+        message_id = rng.choice(context['message_ids'])
+        return await client.put(f"/api/messages/{message_id}", json={'isRead': True})
+
+    async def delete_message(client):
+        message_id = context['message_ids'].pop() if context['message_ids'] else 'missing'
+        return await client.delete(f"/api/messages/{message_id}")
+
+    async def create_spending(client):
+        return await client.post('/api/spending/transactions', json={
+            'amount': rng.randint(1, 100), 'tag': 'fun', 'person': rng.choice(['ben', 'sydney']),
+        })
+
+    async def update_spending(client):
+        transaction_id = rng.choice(context['spending_ids'])
+        return await client.put(f"/api/spending/transactions/{transaction_id}", json={'amount': rng.randint(1, 100)})
+
+    async def delete_spending(client):
+        transaction_id = context['spending_ids'].pop() if context['spending_ids'] else 'missing'
+        return await client.delete(f"/api/spending/transactions/{transaction_id}")
+
+    async def import_spending(client):
+        rows = ['date,amount,tag,person'] + [
+            f"2024-01-{rng.randint(1, 28):02d},{rng.randint(1, 100)},fun,ben" for _ in range(100)
+        ]
+        return await client.post('/api/spending/import', content='\n'.join(rows).encode(),
+                                 headers={'Content-Type': 'text/csv'})
+
+    async def metric_update(client):
+        return await client.post('/api/metrics/update', json={'metric': 'dishesDone', 'increment': 1})
+
+    async def batch(client):
+        return await client.post('/api/batch', json={'operations': [
+            {'op': 'metrics.update', 'data': {'metric': 'kittyDuties', 'increment': 1}},
+            {'op': 'messages.create', 'data': {'content': 'batched', 'author': 'partner2'}},
+            {'op': 'spending.create', 'data': {'amount': 5, 'tag': 'fun', 'person': 'ben'}},
+        ]})
+
+    async def cached_messages(client):
+        etag = context.get('messages_etag')
+        response = await client.get('/api/messages', headers={'If-None-Match': etag} if etag else {})
+        context['messages_etag'] = response.headers.get('etag')
+        return response
+
+    async def categorize(client):
+        account_id = rng.choice(context['account_ids'])
+        return await client.post('/api/categorize_account',
+                                 json={'account_id': account_id, 'owner': rng.choice(['ben', 'sydney'])})
+
+    return [
+        Scenario('GET /', get('/')),
+        Scenario('GET /api/health', get('/api/health')),
+        Scenario('GET /api/reset_timers', get('/api/reset_timers')),
+        Scenario('GET /api/metrics/today', get('/api/metrics/today')),
+        Scenario('GET /api/metrics/week', get('/api/metrics/week')),
+        Scenario('POST /api/metrics/update', metric_update),
+        Scenario('GET /api/analytics/history', get('/api/analytics/history')),
+        Scenario('GET /api/analytics/history (all years)', get('/api/analytics/history', start=years_ago), 0.2),
+        Scenario('GET /api/analytics/summary (all years)', get('/api/analytics/summary', start=years_ago), 0.2),
+        Scenario('GET /api/messages', get('/api/messages')),
+        Scenario('GET /api/messages (If-None-Match)', cached_messages),
+        Scenario('POST /api/messages', create_message),
+        Scenario('PUT /api/messages/{id}', update_message),
+        Scenario('DELETE /api/messages/{id}', delete_message),
+        Scenario('GET /api/spending/transactions (all)', get('/api/spending/transactions'), 0.05),
+        Scenario('GET /api/spending/transactions (page)', get('/api/spending/transactions', limit=100)),
+        Scenario('GET /api/spending/transactions (ndjson)',
+                 get('/api/spending/transactions', format='ndjson'), 0.05),
+        Scenario('GET /api/spending/export', get('/api/spending/export'), 0.05),
+        Scenario('POST /api/spending/import (100 rows)', import_spending, 0.2),
+        Scenario('GET /api/spending/stats', get('/api/spending/stats')),
+        Scenario('POST /api/spending/transactions', create_spending),
+        Scenario('PUT /api/spending/transactions/{id}', update_spending),
+        Scenario('DELETE /api/spending/transactions/{id}', delete_spending),
+        Scenario('POST /api/batch', batch),
+        Scenario('GET /connect', get('/connect')),
+        Scenario('GET /api/accounts', get('/api/accounts')),
+        Scenario('GET /api/balances', get('/api/balances')),
+        Scenario('GET /api/plaid/health', get_internal('/api/plaid/health')),
+        Scenario('GET /api/dashboard', get('/api/dashboard')),
+        Scenario('POST /api/categorize_account', categorize),
+        Scenario('POST /api/transactions/sync', lambda client: client.post('/api/transactions/sync'), 0.2),
+        Scenario('GET /internal/metrics', get_internal('/internal/metrics')),
+    ]
+
+
+async def measure(client, scenario: Scenario, requests: int, concurrency: int) -> dict:
+    """Send `requests` requests for one scenario and summarize latency, throughput and errors"""
+    latencies = []
+    statuses: Dict[str, int] = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await scenario.send(client)
+                status = str(response.status_code)
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    errors = sum(count for status, count in statuses.items() if not status.startswith(('2', '304')))
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'throughput_rps': round(requests / elapsed, 1),
+        'errors': errors,
+        'statuses': statuses,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+async def prepare(client, context: dict, pool: int):
+    """Create the messages and transactions the update and delete scenarios work on"""
+    for _ in range(pool):
+        response = await client.post('/api/messages', json={'content': 'to edit', 'author': 'partner2'})
+        context['message_ids'].append(response.json()['id'])
+        response = await client.post('/api/spending/transactions', json={'amount': 1, 'tag': 'fun', 'person': 'ben'})
+        context['spending_ids'].append(response.json()['id'])
+    accounts = (await client.get('/api/accounts')).json()
+    context['account_ids'] = [account['account_id'] for account in accounts.get('accounts', [])] or ['missing']
+
+
+async def run(args, main) -> dict:
+    import httpx
+
+    context = {
+        'rng': random.Random(args.seed),
+        'years_ago': str(np.datetime64('today') - np.timedelta64(int(args.years * 365), 'D')),
+        'message_ids': [],
+        'spending_ids': [],
+    }
+    results = {}
+    # Run the startup and shutdown hooks around the whole benchmark
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+            await prepare(client, context, args.requests)
+            for scenario in scenarios(context):
+                if args.only and not re.search(args.only, scenario.name):
+                    continue
+                requests = max(1, int(args.requests * scenario.share))
+                results[scenario.name] = await measure(client, scenario, requests, args.concurrency)
+                print(format_row(scenario.name, results[scenario.name]), flush=True)
+    return results
+
+
+def format_row(name: str, result: dict) -> str:
+    return (f"{name:<45} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+            f"{result['throughput_rps']:>9.1f} {result['errors']:>6} {result['peak_rss_mb']:>8.1f}")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """Scenarios whose p95 latency or throughput regressed by more than threshold"""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        if result['p95_ms'] > before['p95_ms'] * (1 + threshold):
+            regressions.append(f"{name}: p95 {before['p95_ms']:.2f}ms -> {result['p95_ms']:.2f}ms")
+        if result['throughput_rps'] < before['throughput_rps'] * (1 - threshold):
+            regressions.append(f"{name}: throughput {before['throughput_rps']:.1f} -> {result['throughput_rps']:.1f} req/s")
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--years', type=float, default=3, help='years of synthetic metrics and spending')
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--spending', type=int, default=10000, help='synthetic spending transactions')
+    parser.add_argument('--banks', type=int, default=3, help='linked fake Plaid tokens')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=10, help='in-flight requests per scenario')
+    parser.add_argument('--plaid-latency-ms', type=float, default=50)
+    parser.add_argument('--plaid-jitter-ms', type=float, default=10)
+    parser.add_argument('--plaid-failure-rate', type=float, default=0.0)
+    parser.add_argument('--plaid-cache-ttl', type=float, help='PLAID_CACHE_TTL_SECONDS for the run')
+    parser.add_argument('--spending-backend', choices=['sqlite', 'json'], help='SPENDING_BACKEND for the run')
+    parser.add_argument('--only', help='only run scenarios whose name matches this regex')
+    parser.add_argument('--data-dir', help='data directory (default: a fresh temporary directory)')
+    parser.add_argument('--output', default='benchmark.json', help='where to write the JSON results')
+    parser.add_argument('--compare', help='baseline JSON results to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed regression (0.2 = 20%%)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+    baseline_file = os.path.abspath(args.compare) if args.compare else None
+
+    # Everything main.py reads from the environment must be set before it is imported
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ['PLAID_BASE_URL'] = start_fake_plaid(
+        args.plaid_latency_ms, args.plaid_jitter_ms, args.plaid_failure_rate, args.seed
+    )
+    if args.plaid_cache_ttl is not None:
+        os.environ['PLAID_CACHE_TTL_SECONDS'] = str(args.plaid_cache_ttl)
+    if args.spending_backend:
+        os.environ['SPENDING_BACKEND'] = args.spending_backend
+    os.environ.setdefault('INTERNAL_API_TOKEN', 'benchmark')
+
+    from synthetic_data import generate
+
+    data_dir = os.path.abspath(args.data_dir or tempfile.mkdtemp(prefix='dashboard-bench-'))
+    started = time.perf_counter()
+    generated = generate(data_dir, args.years, args.messages, args.spending, args.banks, args.seed)
+    print(f"Generated {generated} in {data_dir} ({time.perf_counter() - started:.1f}s)")
+    os.chdir(data_dir)
+    import main
+
+    print(f"{'scenario':<45} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'errors':>6} {'rss MB':>8}")
+    results = asyncio.run(run(args, main))
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+            'generated': generated,
+        },
+        'scenarios': results,
+        'skipped': SKIPPED,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    os.chdir(BACKEND_DIR)
+    if not args.data_dir:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    if baseline_file:
+        with open(baseline_file) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION  {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {baseline_file}")
+
+
+if __name__ == "__main__":
+    main_cli()
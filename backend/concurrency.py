@@ -0,0 +1,158 @@
+"""
+Per-store write locks for the read-modify-write handlers.
+
+Each store gets its own lock stripe, so a metric tap never waits on a message
+post, and reads never take a lock at all. A write section:
+
+1. takes the store's asyncio.Lock, serializing writers in this process
+2. takes an fcntl file lock on `<directory>/<store>.lock` when STORE_PROCESS_LOCKS=1,
+   serializing writers across processes (e.g. uvicorn --workers N)
+3. takes the store's thread lock, so the write-behind flusher never
+   serializes half-applied changes
+
+With process locks enabled the store is re-synced from disk on entry and
+flushed on exit, so the next process to take the lock sees this write; the
+write-behind flusher then leaves that store alone. Each write also bumps a
+version counter kept in the lock file, which other workers poll
+(changed_elsewhere()) to tell their own clients about the change.
+
+Process locks default to on when WEB_CONCURRENCY (uvicorn's default for
+--workers) is greater than 1.
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: process locks are unavailable
+    fcntl = None
+
+from fastapi.concurrency import run_in_threadpool
+
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+STORE_PROCESS_LOCKS = os.getenv('STORE_PROCESS_LOCKS', '1' if WEB_CONCURRENCY > 1 else '0') == '1'
+
+
+class StoreLock:
+    """One lock stripe: in-process asyncio lock plus optional cross-process file lock"""
+
+    def __init__(self, name: str, store=None, process_lock: bool = STORE_PROCESS_LOCKS, directory: str = '.'):
+        self.name = name
+        self.store = store
+        self.lock_filename = os.path.join(directory, f"{name}.lock")
+        self.process_lock = process_lock and fcntl is not None
+        self._lock: Optional[asyncio.Lock] = None
+        if self.process_lock and store is not None:
+            # Flushing outside the file lock could overwrite another process's write
+            store.write_behind = False
+        # Version last seen by changed_elsewhere(), and writes this process made since then
+        self.seen_version = self.version()[0] if self.process_lock else 0
+        self.own_writes = 0
+
+    def _async_lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def _acquire_file(self) -> int:
+        fd = os.open(self.lock_filename, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd
+
+    def _release_file(self, fd: int):
+        try:
+            # "<version> <pid>": lets other workers see that this stripe changed
+            version = _parse_version(os.pread(fd, 64, 0))[0] + 1
+            data = f"{version} {os.getpid()}\n".encode()
+            os.pwrite(fd, data, 0)
+            os.ftruncate(fd, len(data))
+            self.own_writes += 1
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def version(self) -> Tuple[int, int]:
+        """(version, pid of the last writer) of this stripe"""
+        try:
+            with open(self.lock_filename, 'rb') as f:
+                return _parse_version(f.read(64))
+        except OSError:
+            return 0, 0
+
+    @contextmanager
+    def _store_section(self):
+        if self.store is None:
+            yield
+            return
+        with self.store.lock:
+            if self.process_lock:
+                # Pick up whatever the previous lock holder wrote
+                self.store.data
+            yield
+            if self.process_lock:
+                self.store.flush()
+
+    @asynccontextmanager
+    async def write(self):
+        async with self._async_lock():
+            lock_file = await run_in_threadpool(self._acquire_file) if self.process_lock else None
+            try:
+                with self._store_section():
+                    yield
+            finally:
+                if lock_file is not None:
+                    self._release_file(lock_file)
+
+
+class ConcurrencyManager:
+    """Registry of store lock stripes"""
+
+    def __init__(self, process_lock: bool = STORE_PROCESS_LOCKS, directory: str = '.'):
+        self.process_lock = process_lock
+        self.directory = directory
+        self._locks: Dict[str, StoreLock] = {}
+
+    def register(self, name: str, store=None) -> StoreLock:
+        self._locks[name] = StoreLock(name, store, self.process_lock, self.directory)
+        return self._locks[name]
+
+    def changed_elsewhere(self) -> List[str]:
+        """Stripes another process has written since the last call"""
+        changed = []
+        for name, lock in self._locks.items():
+            if not lock.process_lock:
+                continue
+            version = lock.version()[0]
+            # Anything beyond our own writes since the last poll came from another worker
+            if version - lock.seen_version > lock.own_writes:
+                changed.append(name)
+            lock.seen_version = version
+            lock.own_writes = 0
+        return changed
+
+    @asynccontextmanager
+    async def write(self, *names: str):
+        """Hold the write locks for several stores, always acquired in name order"""
+        async with _nested([self._locks[name] for name in sorted(set(names))]):
+            yield
+
+
+def _parse_version(data: bytes) -> Tuple[int, int]:
+    try:
+        version, pid = data.split()[:2]
+        return int(version), int(pid)
+    except ValueError:
+        return 0, 0
+
+
+@asynccontextmanager
+async def _nested(locks):
+    if not locks:
+        yield
+        return
+    async with locks[0].write():
+        async with _nested(locks[1:]):
+            yield
@@ -19,6 +19,8 @@ from plaid.model.accounts_get_request import AccountsGetRequest
 from plaid.model.country_code import CountryCode
 from plaid.model.products import Products
 
+from plaid_resilience import Breakers, call_with_retry
+
 # Load environment variables
 load_dotenv()
 
@@ -41,6 +43,8 @@ configuration = Configuration(
 
 api_client = ApiClient(configuration)
 client = plaid_api.PlaidApi(api_client)
+# Transient errors are retried; a bank that keeps failing is not called again until it recovers
+breakers = Breakers()
 
 STORAGE_FILE = 'account_setup.json'
 
@@ -67,7 +71,7 @@ def create_link_token():
             user=user
         )
         
-        response = client.link_token_create(request)
+        response = call_with_retry(client.link_token_create, request, path='/link/token/create')
         return response['link_token']
     except Exception as e:
         print(f"❌ Error creating link token: {str(e)}")
@@ -77,7 +81,9 @@ def exchange_public_token(public_token):
     """Exchange public token for access token"""
     try:
         request = ItemPublicTokenExchangeRequest(public_token=public_token)
-        response = client.item_public_token_exchange(request)
+        # Only retried if Plaid never saw the request: a public token can be exchanged once
+        response = call_with_retry(client.item_public_token_exchange, request,
+                                   path='/item/public_token/exchange', idempotent=False)
         return response['access_token'], response['item_id']
     except Exception as e:
         print(f"❌ Error exchanging token: {str(e)}")
@@ -87,7 +93,8 @@ def get_accounts(access_token):
     """Get accounts for an access token"""
     try:
         request = AccountsGetRequest(access_token=access_token)
-        response = client.accounts_get(request)
+        response = call_with_retry(client.accounts_get, request, path='/accounts/get',
+                                   access_token=access_token, breakers=breakers)
         return response['accounts']
     except Exception as e:
         print(f"❌ Error getting accounts: {str(e)}")
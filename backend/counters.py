@@ -0,0 +1,218 @@
+"""
+Crash-safe counters for the MetricEntry fields in current_metrics.json.
+
+Every increment is appended to a small journal file before it is applied to
+the in-memory totals, so a tap costs one short append instead of a full file
+rewrite. The snapshot (current_metrics.json) is checkpointed periodically
+with an atomic rename, and records the sequence number of the last journal
+entry it contains. On load the journal is replayed on top of the snapshot,
+so a crash at any point loses no acknowledged update. With
+METRICS_JOURNAL_FSYNC the snapshot and its rename are fsynced before the
+journal is truncated, so that holds across power loss too.
+
+A snapshot that exists but cannot be parsed is never replaced with empty
+metrics: loading raises CorruptStoreError, leaving the file and the journal
+untouched until someone restores or moves the snapshot aside.
+"""
+
+import json
+import os
+import time
+from typing import List, Optional, Tuple
+
+from instrumentation import count_store_bytes, store_io
+from store import CorruptStoreError, JsonStore
+
+# Checkpoint the snapshot after this many journal records or this many seconds
+CHECKPOINT_EVERY = int(os.getenv('METRICS_CHECKPOINT_EVERY', '500'))
+CHECKPOINT_SECONDS = float(os.getenv('METRICS_CHECKPOINT_SECONDS', '60'))
+# fsync each journal append (survives power loss, not just process crashes)
+JOURNAL_FSYNC = os.getenv('METRICS_JOURNAL_FSYNC', '1') == '1'
+
+METRIC_FIELDS = ['sexCount', 'qualityTimeHours', 'dishesDone', 'trashFullHours', 'kittyDuties']
+
+
+def empty_daily_entry(day: str) -> dict:
+    """A zeroed MetricEntry for the given day"""
+    entry = {'date': day}
+    entry.update({field: 0 for field in METRIC_FIELDS})
+    return entry
+
+
+def apply_increment(current_week: dict, day: str, metric: str, increment: int) -> dict:
+    """Apply one increment to the daily entry and weekly totals, returning the daily entry"""
+    daily_entries = current_week['daily_entries']
+    if day not in daily_entries:
+        daily_entries[day] = empty_daily_entry(day)
+
+    daily_entry = daily_entries[day]
+    if metric in daily_entry:
+        old_value = daily_entry[metric]
+        new_value = max(0, old_value + increment)
+        daily_entry[metric] = new_value
+
+        weekly_totals = current_week['weekly_totals']
+        if metric in weekly_totals:
+            weekly_totals[metric] += (new_value - old_value)
+            weekly_totals[metric] = max(0, weekly_totals[metric])
+
+    return daily_entry
+
+
+class MetricCounters(JsonStore):
+    """current_metrics.json backed by a snapshot plus an append-only increment journal"""
+
+    # The journal is truncated once a checkpoint is written, so the snapshot must be durable first
+    fsync = JOURNAL_FSYNC
+
+    def __init__(self, filename: str, journal_filename: Optional[str] = None):
+        self.journal_filename = journal_filename or f"{filename}.journal"
+        self._seq = 0
+        self._journal_records = 0
+        # Bytes of the journal already applied to the in-memory totals
+        self._journal_offset = 0
+        self._last_checkpoint = time.monotonic()
+        super().__init__(filename, {})
+
+    def _load(self):
+        super()._load()
+        self._seq = self._data.get('journal_seq', 0)
+        self._journal_records = 0
+        self._journal_offset = 0
+        self._replay()
+
+    def _unreadable(self, source: str, error: Exception):
+        # Starting from defaults would overwrite the week with zeros on the next save
+        raise CorruptStoreError(
+            f"{source} cannot be read ({error}); refusing to replace it with empty metrics. "
+            f"Restore it or move it aside; {self.journal_filename} is left as it is."
+        )
+
+    @property
+    def data(self) -> dict:
+        with self._lock:
+            data = super().data
+            # Another process may have appended to the journal since we last looked
+            try:
+                if os.path.getsize(self.journal_filename) > self._journal_offset:
+                    self._replay()
+            except OSError:
+                pass
+            return data
+
+    def _replay(self):
+        """Re-apply journal records newer than the snapshot, from the last applied offset"""
+        if not os.path.exists(self.journal_filename):
+            return
+        current_week = self._data.get('current_week')
+        with store_io(self.journal_filename, 'read'):
+            with open(self.journal_filename, 'rb') as f:
+                f.seek(self._journal_offset)
+                chunk = f.read()
+        count_store_bytes(self.journal_filename, 'read', len(chunk))
+        # Leave a torn final line (crash or concurrent append) for the next replay
+        complete = chunk[:chunk.rfind(b'\n') + 1]
+        self._journal_offset += len(complete)
+        for line in complete.splitlines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record['seq'] <= self._seq:
+                continue
+            if current_week is not None and current_week['week_start'] == record['week_start']:
+                # Batched records carry several increments written in one append
+                for day, metric, increment in record.get('increments') or [
+                    (record['day'], record['metric'], record['increment'])
+                ]:
+                    apply_increment(current_week, day, metric, increment)
+            self._seq = record['seq']
+            self._journal_records += 1
+            self._version += 1
+
+    def _append(self, record: dict):
+        line = json.dumps(record).encode() + b'\n'
+        with store_io(self.journal_filename, 'write', len(line)):
+            with open(self.journal_filename, 'ab') as f:
+                f.write(line)
+                f.flush()
+                if JOURNAL_FSYNC:
+                    os.fsync(f.fileno())
+                self._journal_offset = f.tell()
+        self._journal_records += 1
+        self._version += 1
+
+    def increment(self, day: str, metric: str, increment: int) -> dict:
+        """Journal and apply an increment for the current week, returning the daily entry"""
+        with self._lock:
+            current_week = self.data['current_week']
+            self._seq += 1
+            self._append({
+                'seq': self._seq,
+                'week_start': current_week['week_start'],
+                'day': day,
+                'metric': metric,
+                'increment': increment,
+            })
+            return dict(apply_increment(current_week, day, metric, increment))
+
+    def increment_many(self, increments: List[Tuple[str, str, int]]) -> List[dict]:
+        """Journal several (day, metric, increment) updates as one record and apply them in order"""
+        with self._lock:
+            current_week = self.data['current_week']
+            self._seq += 1
+            self._append({
+                'seq': self._seq,
+                'week_start': current_week['week_start'],
+                'increments': [list(item) for item in increments],
+            })
+            return [
+                dict(apply_increment(current_week, day, metric, increment))
+                for day, metric, increment in increments
+            ]
+
+    def save(self, data: Optional[dict] = None):
+        """Structural changes (week archive, new day) are checkpointed immediately"""
+        with self._lock:
+            super().save(data)
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Atomically write the snapshot and truncate the journal"""
+        with self._lock:
+            if self._data is None:
+                return
+            self._data['journal_seq'] = self._seq
+            self._dirty = True
+            super().flush()
+            if self._dirty:
+                # Snapshot write failed; keep the journal so nothing is lost
+                return
+            try:
+                with store_io(self.journal_filename, 'write'):
+                    with open(self.journal_filename, 'w'):
+                        pass
+            except OSError as e:
+                # The snapshot covers every record, so replay skips them; retry at the next checkpoint
+                print(f"Error truncating {self.journal_filename}: {e}")
+                return
+            self._journal_records = 0
+            self._journal_offset = 0
+            self._last_checkpoint = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            due = (
+                self._journal_records >= CHECKPOINT_EVERY
+                or (self._journal_records and time.monotonic() - self._last_checkpoint >= CHECKPOINT_SECONDS)
+            )
+            if self._dirty or due:
+                self.checkpoint()
+
+    def close(self):
+        with self._lock:
+            # Under cross-process locks, checkpoints only happen while holding the file lock
+            if not self.write_behind:
+                return
+            if self._dirty or self._journal_records:
+                self.checkpoint()
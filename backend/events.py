@@ -0,0 +1,63 @@
+"""
+Server-sent events for dashboard clients.
+
+Handlers publish a change event after they commit (metric taps, message and
+spending CRUD, the 4am rollover) and every connected client receives it over
+GET /api/stream, so the UI stays current without polling. A periodic
+heartbeat carries the reset timers. Nothing runs while no client is connected.
+
+publish() must be called from the event loop thread.
+"""
+
+import asyncio
+import json
+import os
+from typing import AsyncIterator, Callable, Set
+
+STREAM_HEARTBEAT_SECONDS = float(os.getenv('STREAM_HEARTBEAT_SECONDS', '30'))
+# Events buffered per client before it is considered too slow and told to resync
+STREAM_QUEUE_SIZE = 100
+
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class EventBroker:
+    """Fans published events out to every subscribed client queue"""
+
+    def __init__(self, queue_size: int = STREAM_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event: str, data):
+        if not self._subscribers:
+            return
+        message = format_sse(event, data)
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # The client fell behind; drop its backlog and ask it to refetch everything
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(format_sse('resync', {}))
+
+    async def stream(self, heartbeat: Callable[[], dict],
+                     interval: float = STREAM_HEARTBEAT_SECONDS) -> AsyncIterator[str]:
+        """SSE messages for one client: published events plus a heartbeat every `interval`"""
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._subscribers.add(queue)
+        try:
+            yield format_sse('heartbeat', heartbeat())
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=interval)
+                except asyncio.TimeoutError:
+                    yield format_sse('heartbeat', heartbeat())
+        finally:
+            self._subscribers.discard(queue)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Plaid REST endpoints the dashboard calls.
+
+Serves deterministic synthetic accounts, balances and transactions for any
+access token, including cursor-paginated /transactions/sync, so the backend
+can be exercised without real bank credentials:
+
+    python fake_plaid.py --port 8001
+    PLAID_BASE_URL=http://localhost:8001 python main.py
+
+--latency-ms/--jitter-ms delay every response and --failure-rate answers
+that fraction of requests with a Plaid-style 500, to see how the dashboard
+copes with slow or flaky banks (FAKE_PLAID_LATENCY_MS, FAKE_PLAID_JITTER_MS
+and FAKE_PLAID_FAILURE_RATE do the same when imported).
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+from datetime import date, timedelta
+from typing import List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Fake Plaid")
+
+TRANSACTIONS_PER_TOKEN = 200
+
+# Simulated bank behaviour, changed with configure()
+latency_ms = float(os.getenv('FAKE_PLAID_LATENCY_MS', '0'))
+jitter_ms = float(os.getenv('FAKE_PLAID_JITTER_MS', '0'))
+failure_rate = float(os.getenv('FAKE_PLAID_FAILURE_RATE', '0'))
+_faults = random.Random(0)
+
+
+def configure(latency: float = 0, jitter: float = 0, failures: float = 0, seed: int = 0):
+    """Set the simulated latency (ms), jitter (ms) and failure rate (0-1)"""
+    global latency_ms, jitter_ms, failure_rate, _faults
+    latency_ms, jitter_ms, failure_rate = latency, jitter, failures
+    _faults = random.Random(seed)
+
+
+@app.middleware("http")
+async def simulate_bank(request: Request, call_next):
+    delay = latency_ms + (_faults.uniform(-jitter_ms, jitter_ms) if jitter_ms else 0)
+    if delay > 0:
+        await asyncio.sleep(delay / 1000)
+    if failure_rate and _faults.random() < failure_rate:
+        return JSONResponse(status_code=500, content={
+            'error_type': 'API_ERROR',
+            'error_code': 'INTERNAL_SERVER_ERROR',
+            'error_message': 'simulated failure',
+        })
+    return await call_next(request)
+
+
+def _rng(access_token: str) -> random.Random:
+    seed = int(hashlib.sha256(access_token.encode()).hexdigest()[:8], 16)
+    return random.Random(seed)
+
+
+def fake_accounts(access_token: str) -> List[dict]:
+    rng = _rng(access_token)
+    prefix = hashlib.sha256(access_token.encode()).hexdigest()[:12]
+    accounts = []
+    for kind, subtype in [('depository', 'checking'), ('depository', 'savings'), ('credit', 'credit card')]:
+        current = round(rng.uniform(100, 10000), 2)
+        accounts.append({
+            'account_id': f"{prefix}-{subtype.replace(' ', '-')}",
+            'name': f"Fake {subtype.title()}",
+            'type': kind,
+            'subtype': subtype,
+            'balances': {'current': current, 'available': current if kind == 'depository' else None},
+        })
+    return accounts
+
+
+def fake_transactions(access_token: str) -> List[dict]:
+    rng = _rng(access_token)
+    accounts = fake_accounts(access_token)
+    today = date.today()
+    transactions = []
+    for i in range(TRANSACTIONS_PER_TOKEN):
+        account = rng.choice(accounts)
+        transactions.append({
+            'transaction_id': f"{account['account_id']}-tx{i}",
+            'account_id': account['account_id'],
+            'amount': round(rng.uniform(-500, 300), 2),
+            'date': (today - timedelta(days=rng.randint(0, 90))).isoformat(),
+            'name': rng.choice(['Grocery Store', 'Coffee Shop', 'Payroll', 'Restaurant', 'Gas Station']),
+            'pending': False,
+        })
+    return transactions
+
+
+@app.post("/accounts/get")
+@app.post("/accounts/balance/get")
+async def accounts(request: Request):
+    body = await request.json()
+    return {'accounts': fake_accounts(body['access_token']), 'item': {'item_id': 'fake-item'}}
+
+
+@app.post("/transactions/get")
+async def transactions_get(request: Request):
+    body = await request.json()
+    transactions = [
+        t for t in fake_transactions(body['access_token'])
+        if body['start_date'] <= t['date'] <= body['end_date']
+    ]
+    return {'transactions': transactions, 'total_transactions': len(transactions)}
+
+
+@app.post("/transactions/sync")
+async def transactions_sync(request: Request):
+    body = await request.json()
+    transactions = fake_transactions(body['access_token'])
+    # The cursor is simply the offset of the next transaction to hand out
+    offset = int(body.get('cursor') or 0)
+    count = int(body.get('count', 100))
+    page = transactions[offset:offset + count]
+    next_offset = offset + len(page)
+    return {
+        'added': page,
+        'modified': [],
+        'removed': [],
+        'next_cursor': str(next_offset),
+        'has_more': next_offset < len(transactions),
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency-ms', type=float, default=latency_ms)
+    parser.add_argument('--jitter-ms', type=float, default=jitter_ms)
+    parser.add_argument('--failure-rate', type=float, default=failure_rate)
+    args = parser.parse_args()
+    configure(args.latency_ms, args.jitter_ms, args.failure_rate)
+    uvicorn.run(app, host=args.host, port=args.port)
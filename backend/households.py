@@ -0,0 +1,311 @@
+"""
+Household partitions.
+
+Every request is scoped to a household, named by the X-Household-Id header
+(or the `household` query parameter, for EventSource clients that cannot set
+headers). Each household has its own metrics, messages, spending, analytics,
+linked Plaid tokens and account owners, stored under HOUSEHOLDS_DIR/<id>/.
+The `default` household keeps using the data files in the working directory,
+so an existing single-couple deployment needs no migration.
+
+Households other than `default` must be created before they are used, with
+`python households.py create <id>` (or by setting HOUSEHOLD_AUTO_CREATE=1);
+requests naming any other id are rejected before anything is opened, so they
+cannot create directories or push real households out of the LRU.
+
+Households are opened on first use and kept in an LRU of at most
+MAX_LOADED_HOUSEHOLDS. Households idle for HOUSEHOLD_IDLE_SECONDS, or the
+least recently used ones once the LRU is full, are flushed and closed. A
+household serving a request or an open event stream is never evicted.
+"""
+
+import asyncio
+import copy
+import os
+import re
+import sys
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from concurrency import ConcurrencyManager
+from counters import MetricCounters
+from events import EventBroker
+from message_store import MessageStore
+from metric_history import HISTORY_DIR, MetricHistory
+from plaid_transport import PlaidTransport
+from spending_storage import open_spending_storage
+from store import JsonStore
+from transaction_sync import BANK_TRANSACTIONS_DB_FILE, BankTransactionStore, TransactionSync
+
+HOUSEHOLDS_DIR = os.getenv('HOUSEHOLDS_DIR', 'households')
+MAX_LOADED_HOUSEHOLDS = int(os.getenv('MAX_LOADED_HOUSEHOLDS', '256'))
+HOUSEHOLD_IDLE_SECONDS = float(os.getenv('HOUSEHOLD_IDLE_SECONDS', '900'))
+HOUSEHOLD_AUTO_CREATE = os.getenv('HOUSEHOLD_AUTO_CREATE', '0') == '1'
+
+DEFAULT_HOUSEHOLD = 'default'
+HOUSEHOLD_HEADER = 'X-Household-Id'
+HOUSEHOLD_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Account owners for households that have not configured their own
+DEFAULT_OWNERS = ['sydney', 'ben', 'investments']
+DEFAULT_SETUP = {
+    'access_tokens': [],
+    'account_categorizations': {},
+    'owners': DEFAULT_OWNERS,
+    # Owner of accounts that have not been categorized yet
+    'default_owner': 'ben',
+}
+
+
+class UnknownHouseholdError(LookupError):
+    """The household has not been created"""
+
+
+def valid_household_id(household_id: str) -> bool:
+    return bool(HOUSEHOLD_ID_PATTERN.match(household_id))
+
+
+def household_directory(household_id: str) -> Optional[str]:
+    """Where a household's data files live; None for the working directory"""
+    return None if household_id == DEFAULT_HOUSEHOLD else os.path.join(HOUSEHOLDS_DIR, household_id)
+
+
+def household_exists(household_id: str) -> bool:
+    directory = household_directory(household_id)
+    return directory is None or os.path.isdir(directory)
+
+
+def create_household(household_id: str) -> bool:
+    """Create a household's directory, returning False if it already existed"""
+    if not valid_household_id(household_id):
+        raise ValueError(f"Invalid household id: {household_id}")
+    if household_exists(household_id):
+        return False
+    os.makedirs(household_directory(household_id))
+    return True
+
+
+def list_households() -> List[str]:
+    if not os.path.isdir(HOUSEHOLDS_DIR):
+        return [DEFAULT_HOUSEHOLD]
+    return [DEFAULT_HOUSEHOLD] + sorted(
+        name for name in os.listdir(HOUSEHOLDS_DIR)
+        if valid_household_id(name) and os.path.isdir(os.path.join(HOUSEHOLDS_DIR, name))
+    )
+
+
+class Household:
+    """One household's stores, locks, event stream and Plaid state"""
+
+    def __init__(self, household_id: str, transport: PlaidTransport, directory: Optional[str] = None):
+        self.id = household_id
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.metrics_store = MetricCounters(self.path('current_metrics.json'))
+        self.messages_store = MessageStore(self.path('messages.json'))
+        self.spending_storage = open_spending_storage(directory=directory)
+        self.metric_history = MetricHistory(self.path(HISTORY_DIR), legacy_json=self.path('analytics_data.json'))
+        # Always JSON: connect_banks.py reads and writes this file directly
+        self.setup_store = JsonStore(self.path('account_setup.json'), DEFAULT_SETUP, file_format='json')
+
+        # One write lock stripe per store; read-modify-write handlers hold the stripes they touch
+        self.concurrency = ConcurrencyManager(directory=directory or '.')
+        self.concurrency.register('metrics', self.metrics_store)
+        self.concurrency.register('messages', self.messages_store)
+        self.concurrency.register('spending', getattr(self.spending_storage, 'store', None))
+        # metric_history switches generations atomically; the stripe only orders archive writers
+        self.concurrency.register('analytics')
+        self.concurrency.register('setup', self.setup_store)
+
+        # Change events pushed to this household's dashboards over /api/stream
+        self.events = EventBroker()
+
+        # Locally synced bank transactions (Plaid /transactions/sync)
+        self.bank_transactions = BankTransactionStore(
+            self.path(os.path.basename(BANK_TRANSACTIONS_DB_FILE)) if directory else BANK_TRANSACTIONS_DB_FILE
+        )
+        self.transaction_sync = TransactionSync(transport, self.bank_transactions)
+
+        self.active_requests = 0
+        self.last_used = time.monotonic()
+
+    def path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename) if self.directory else filename
+
+    @property
+    def setup(self) -> dict:
+        data = self.setup_store.data
+        # Older account_setup.json files only have tokens and categorizations
+        for key, value in DEFAULT_SETUP.items():
+            if key not in data:
+                data[key] = copy.deepcopy(value)
+        return data
+
+    @property
+    def access_tokens(self) -> List[str]:
+        return self.setup['access_tokens']
+
+    @property
+    def account_categorizations(self) -> Dict[str, str]:
+        return self.setup['account_categorizations']
+
+    @property
+    def owners(self) -> List[str]:
+        return self.setup['owners']
+
+    def owner_of(self, account_id: str) -> str:
+        return self.account_categorizations.get(account_id, self.setup['default_owner'])
+
+    @property
+    def evictable(self) -> bool:
+        return self.active_requests == 0 and self.events.subscriber_count == 0
+
+    async def close(self):
+        """Stop background work and flush and close every store"""
+        await self.transaction_sync.stop_background()
+        for store in (self.metrics_store, self.messages_store, self.setup_store):
+            store.close()
+        self.spending_storage.close()
+        self.bank_transactions.close()
+
+
+class HouseholdRegistry:
+    """Lazily opened households with LRU and idle eviction"""
+
+    def __init__(self, transport: PlaidTransport,
+                 on_open: Optional[Callable[[Household], Awaitable[None]]] = None,
+                 on_close: Optional[Callable[[Household], None]] = None,
+                 max_loaded: int = MAX_LOADED_HOUSEHOLDS,
+                 idle_seconds: float = HOUSEHOLD_IDLE_SECONDS,
+                 auto_create: bool = HOUSEHOLD_AUTO_CREATE):
+        self.transport = transport
+        self.auto_create = auto_create
+        self.on_open = on_open
+        self.on_close = on_close
+        self.max_loaded = max_loaded
+        self.idle_seconds = idle_seconds
+        self._households: 'OrderedDict[str, Household]' = OrderedDict()
+        self._opening: Dict[str, asyncio.Future] = {}
+        self._closing: Dict[str, asyncio.Future] = {}
+        # Requests waiting on a household that is still being opened
+        self._pending_pins: Dict[str, int] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def loaded(self) -> List[Household]:
+        return list(self._households.values())
+
+    async def _open(self, household_id: str) -> Household:
+        try:
+            # Let a household that is still being evicted finish flushing first
+            closing = self._closing.get(household_id)
+            if closing is not None:
+                await asyncio.gather(closing, return_exceptions=True)
+            household = Household(household_id, self.transport, household_directory(household_id))
+            if self.on_open is not None:
+                await self.on_open(household)
+        except BaseException:
+            self._pending_pins.pop(household_id, None)
+            raise
+        # Pin it for every request that waited on the open before anything can evict it
+        household.active_requests = self._pending_pins.pop(household_id, 0)
+        self._households[household_id] = household
+        return household
+
+    async def acquire(self, household_id: str) -> Household:
+        """Open (or reuse) a household and pin it until release()
+
+        Raises UnknownHouseholdError for a household that has not been created,
+        unless auto_create is set.
+        """
+        household = self._households.get(household_id)
+        if household is not None:
+            household.active_requests += 1
+        else:
+            if not (self.auto_create or household_id in self._opening or household_exists(household_id)):
+                raise UnknownHouseholdError(household_id)
+            # Concurrent first requests for a household share one open
+            self._pending_pins[household_id] = self._pending_pins.get(household_id, 0) + 1
+            task = self._opening.get(household_id)
+            if task is None:
+                task = asyncio.ensure_future(self._open(household_id))
+                self._opening[household_id] = task
+                task.add_done_callback(lambda _: self._opening.pop(household_id, None))
+            try:
+                household = await asyncio.shield(task)
+            except asyncio.CancelledError:
+                # Give up this request's pin, whether or not the open has finished
+                if not task.done():
+                    self._pending_pins[household_id] -= 1
+                elif not task.cancelled() and task.exception() is None:
+                    self.release(task.result())
+                raise
+        household.last_used = time.monotonic()
+        self._households.move_to_end(household_id)
+        await self._evict_over_capacity()
+        return household
+
+    def release(self, household: Household):
+        household.active_requests -= 1
+        household.last_used = time.monotonic()
+
+    async def _evict(self, household: Household):
+        del self._households[household.id]
+        if self.on_close is not None:
+            self.on_close(household)
+        closing = asyncio.ensure_future(household.close())
+        self._closing[household.id] = closing
+        try:
+            await closing
+        finally:
+            self._closing.pop(household.id, None)
+
+    async def _evict_over_capacity(self):
+        # Least recently used first; pinned households are skipped
+        for household in self.loaded():
+            if len(self._households) <= self.max_loaded:
+                return
+            if self._households.get(household.id) is household and household.evictable:
+                await self._evict(household)
+
+    async def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        for household in self.loaded():
+            if (self._households.get(household.id) is household and household.evictable
+                    and household.last_used < cutoff):
+                await self._evict(household)
+
+    def start(self, interval: float = 60):
+        """Periodically close households that have gone idle"""
+        async def loop():
+            while True:
+                await asyncio.sleep(interval)
+                await self.evict_idle()
+
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.get_running_loop().create_task(loop())
+
+    async def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        for household in self.loaded():
+            await self._evict(household)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == 'create':
+        try:
+            created = create_household(sys.argv[2])
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+        print(f"Created household {sys.argv[2]}" if created else f"Household {sys.argv[2]} already exists")
+    elif len(sys.argv) == 2 and sys.argv[1] == 'list':
+        for household_id in list_households():
+            print(household_id)
+    else:
+        print("Usage: python households.py create <id> | list")
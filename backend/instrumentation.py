@@ -0,0 +1,244 @@
+"""
+Always-on latency and I/O instrumentation, exported in Prometheus text format.
+
+Metrics live in this process's memory and are recorded with a dict lookup, a
+bisect and a few additions under a lock, so they can stay enabled in
+production. GET /internal/metrics renders them:
+
+    dashboard_http_request_duration_seconds  per route, method and status,
+                                             until the last body byte is sent
+    dashboard_store_io_seconds               per data file and operation:
+                                             read/write (file I/O),
+                                             decode/encode (JSON), commit/query
+                                             (SQLite)
+    dashboard_store_io_bytes_total           bytes read and written per data file
+    dashboard_plaid_request_duration_seconds per Plaid path and access token
+    dashboard_plaid_errors_total             per Plaid path, token and error
+    dashboard_plaid_retries_total            retried Plaid calls per path, token
+                                             and error
+    dashboard_plaid_rejected_total           calls failed fast by an open
+                                             circuit breaker, per path and token
+    dashboard_plaid_circuit_transitions_total breaker state changes per token
+
+Data files are labelled by file name, so every household's messages.json
+shares one series. Access tokens are labelled by a short hash, never the
+token itself. With several workers each process reports its own metrics.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class Counter:
+    """Monotonic totals per label set"""
+
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, labels)} {value:g}" for labels, value in values]
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram per label set"""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._series: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Labels, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(labels, time.perf_counter() - started)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        lines = []
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                lines.append(f"{self.name}_bucket"
+                             f"{_format_labels(self.label_names + ('le',), labels + (le,))} {cumulative}")
+            label_text = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {total:.6f}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Registry:
+    """The metrics one process exposes"""
+
+    def __init__(self):
+        self._metrics: List = []
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_request_seconds = registry.histogram(
+    'dashboard_http_request_duration_seconds',
+    'Time from receiving a request to sending the last byte of its response',
+    ('method', 'route', 'status'),
+)
+store_io_seconds = registry.histogram(
+    'dashboard_store_io_seconds',
+    'Time spent on data file I/O, JSON encoding and decoding, and SQLite statements',
+    ('store', 'op'),
+)
+store_io_bytes = registry.counter(
+    'dashboard_store_io_bytes_total',
+    'Bytes read from and written to data files',
+    ('store', 'op'),
+)
+plaid_request_seconds = registry.histogram(
+    'dashboard_plaid_request_duration_seconds',
+    'Plaid API call latency',
+    ('path', 'token'),
+)
+plaid_errors = registry.counter(
+    'dashboard_plaid_errors_total',
+    'Failed Plaid API calls by HTTP status or exception type',
+    ('path', 'token', 'error'),
+)
+plaid_retries = registry.counter(
+    'dashboard_plaid_retries_total',
+    'Plaid calls retried after a transient failure',
+    ('path', 'token', 'error'),
+)
+plaid_rejected = registry.counter(
+    'dashboard_plaid_rejected_total',
+    'Plaid calls failed fast because the access token\'s circuit breaker was open',
+    ('path', 'token'),
+)
+plaid_circuit_transitions = registry.counter(
+    'dashboard_plaid_circuit_transitions_total',
+    'Circuit breaker state changes per access token',
+    ('token', 'state'),
+)
+
+
+def store_label(filename: str) -> str:
+    return os.path.basename(filename)
+
+
+def token_label(access_token: str) -> str:
+    """A stable, non-reversible label for an access token"""
+    return hashlib.sha256(access_token.encode()).hexdigest()[:8]
+
+
+@contextmanager
+def store_io(filename: str, op: str, nbytes: Optional[int] = None):
+    """Time one store operation, and count its bytes if known"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        labels = (store_label(filename), op)
+        store_io_seconds.observe(labels, time.perf_counter() - started)
+        if nbytes:
+            store_io_bytes.inc(labels, nbytes)
+
+
+def count_store_bytes(filename: str, op: str, nbytes: int):
+    if nbytes:
+        store_io_bytes.inc((store_label(filename), op), nbytes)
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording each HTTP request's latency under its route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = '500'
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = str(message['status'])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the scope; unmatched paths share one label
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            http_request_seconds.observe((scope['method'], route, status), time.perf_counter() - started)
@@ -1,64 +1,80 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Optional, Dict, Any, AsyncIterator, Callable, Iterator, Tuple
+import asyncio
+import hashlib
+import hmac
 import os
+import threading
+import time
+import traceback
+from contextlib import asynccontextmanager, suppress
 from datetime import datetime, timedelta
-import json
-import requests
 from dotenv import load_dotenv
-import pytz
+
+from store import start_write_behind, stop_write_behind
+from instrumentation import RequestMetricsMiddleware, registry
+from serialization import FastJSONResponse, dumps, encodable_ints
+from counters import empty_daily_entry
+from metric_history import DEFAULT_ROLLING_WINDOW
+from periods import periods
+from spending_csv import CsvImportParser, csv_chunks, fill_defaults
+from spending_storage import DuplicateIdError, decode_cursor, encode_cursor
+from plaid_transport import PlaidTransport
+from plaid_resilience import call_with_retry
+from plaid_cache import PlaidCache, data_age
+from transaction_sync import weekly_changes
+from scheduler import ResetScheduler
+from households import (DEFAULT_HOUSEHOLD, HOUSEHOLD_HEADER, Household, HouseholdRegistry,
+                        UnknownHouseholdError, valid_household_id)
+from workers import LeaderElection, SharedStateWatcher
 
 # Load environment variables from .env file (check both current and parent directory)
 load_dotenv()  # Current directory
 load_dotenv(dotenv_path='../.env')  # Parent directory
 
-# Plaid imports
-import plaid
-from plaid.api import plaid_api
-from plaid.configuration import Configuration
-from plaid.api_client import ApiClient
-from plaid.model.link_token_create_request import LinkTokenCreateRequest
-from plaid.model.link_token_create_request_user import LinkTokenCreateRequestUser
-from plaid.model.item_public_token_exchange_request import ItemPublicTokenExchangeRequest
-from plaid.model.accounts_get_request import AccountsGetRequest
-from plaid.model.transactions_get_request import TransactionsGetRequest
-from plaid.model.country_code import CountryCode
-from plaid.model.products import Products
-
-app = FastAPI(title="Relationship Dashboard API")
-
-# CORS setup for React frontend
-# For production, add your Amplify domain after deployment
-CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:3000,http://localhost:3001,http://localhost:3002').split(',')
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=CORS_ORIGINS,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Timezone setup
-CST = pytz.timezone('US/Central')
+# Weeks returned by /api/analytics/history when no start date is given
+DEFAULT_HISTORY_WEEKS = 12
 
 # Plaid configuration
 PLAID_CLIENT_ID = os.getenv('PLAID_CLIENT_ID')
 PLAID_SECRET = os.getenv('PLAID_PRODUCTION_API')  # Using sandbox secret
 PLAID_ENV = 'production'  # Change to 'development' or 'production' when ready
 
-configuration = Configuration(
-    host=getattr(plaid.Environment, PLAID_ENV.capitalize(), plaid.Environment.Sandbox),
-    api_key={
-        'clientId': PLAID_CLIENT_ID,
-        'secret': PLAID_SECRET,
-    }
-)
+# The Plaid SDK is only used to link banks and takes longer to import than the rest
+# of the app, so it is imported and configured on first use
+_plaid_client = None
+_plaid_client_lock = threading.Lock()
 
-api_client = ApiClient(configuration)
-client = plaid_api.PlaidApi(api_client)
+def plaid_client():
+    """The Plaid SDK client, importing the SDK on first use (blocking; call from a worker thread)"""
+    global _plaid_client
+    with _plaid_client_lock:
+        if _plaid_client is None:
+            import plaid
+            from plaid.api import plaid_api
+            from plaid.api_client import ApiClient
+            from plaid.configuration import Configuration
+
+            configuration = Configuration(
+                host=getattr(plaid.Environment, PLAID_ENV.capitalize(), plaid.Environment.Sandbox),
+                api_key={
+                    'clientId': PLAID_CLIENT_ID,
+                    'secret': PLAID_SECRET,
+                }
+            )
+            _plaid_client = plaid_api.PlaidApi(ApiClient(configuration))
+        return _plaid_client
+
+# Pooled async transport for the REST calls made on every dashboard load
+plaid_transport = PlaidTransport(PLAID_CLIENT_ID, PLAID_SECRET)
+plaid_cache = PlaidCache(plaid_transport)
+
+# Plaid endpoints whose responses are cached per access token
+CACHED_PLAID_PATHS = ['/accounts/get', '/accounts/balance/get']
 
 # Data models
 class PublicTokenExchange(BaseModel):
@@ -66,7 +82,7 @@ class PublicTokenExchange(BaseModel):
 
 class AccountCategorization(BaseModel):
     account_id: str
-    owner: str  # 'sydney', 'ben', or 'investments'
+    owner: str  # one of the household's owners, e.g. 'sydney', 'ben', or 'investments'
 
 class FinanceData(BaseModel):
     sydneyBalance: float
@@ -86,7 +102,8 @@ class MetricEntry(BaseModel):
 
 class MetricUpdate(BaseModel):
     metric: str
-    increment: int
+    # Bounded so weekly totals stay far inside the range the stores can encode
+    increment: int = Field(ge=-2 ** 31, le=2 ** 31 - 1)
 
 class Note(BaseModel):
     id: Optional[str] = None
@@ -111,105 +128,104 @@ class SpendingTransaction(BaseModel):
     date: Optional[str] = None
     id: Optional[str] = None
 
-# Data storage functions
-def load_data_file(filename: str, default_data: dict = None) -> dict:
-    """Load data from JSON file"""
-    if default_data is None:
-        default_data = {}
-    
-    if os.path.exists(filename):
-        try:
-            with open(filename, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            print(f"Error reading {filename}, using default data")
-            return default_data
-    return default_data
-
-def save_data_file(filename: str, data: dict):
-    """Save data to JSON file"""
+class BatchOperation(BaseModel):
+    op: str  # 'metrics.update', 'messages.create|update|delete', 'spending.create|update|delete'
+    id: Optional[str] = None  # message/transaction id for update and delete
+    data: Dict[str, Any] = {}
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
+def start_plaid_background(household: Household):
+    """Warm the household's Plaid data and keep its transactions synced (leader worker only)"""
+    if PLAID_CLIENT_ID and PLAID_SECRET and household.access_tokens:
+        # Pre-fetch balances and accounts in the background so the first dashboard load is fast
+        for path in CACHED_PLAID_PATHS:
+            plaid_cache.refresh_in_background(path, household.access_tokens)
+        # Keep the local transaction store current while the household is loaded
+        household.transaction_sync.start_background(lambda: household.access_tokens)
+
+async def open_household(household: Household):
+    """Apply any rollover missed while the household was unloaded, then warm its Plaid data"""
+    async with household.concurrency.write('metrics', 'messages', 'analytics'):
+        initialize_data(household)
+    if leader.is_leader:
+        start_plaid_background(household)
+
+def close_household(household: Household):
+    """Drop an evicted household's cached Plaid responses"""
+    for access_token in household.access_tokens:
+        plaid_cache.invalidate(access_token)
+
+# Households are opened on first request and closed when idle
+households = HouseholdRegistry(plaid_transport, on_open=open_household, on_close=close_household)
+
+async def become_leader():
+    """Take over the background Plaid work after the previous leader worker exited"""
+    for household in households.loaded():
+        start_plaid_background(household)
+
+# With several uvicorn workers, once-per-deployment work runs only in the leader
+leader = LeaderElection(on_elected=become_leader)
+
+def publish_external_change(household: Household, store: str):
+    """Tell this worker's stream clients about a write made by another worker"""
+    if store == 'metrics':
+        current_day = get_current_day()
+        metrics_data = household.metrics_store.data
+        household.events.publish('metrics', {
+            'today': metrics_data['current_week']['daily_entries'].get(current_day, empty_daily_entry(current_day)),
+            'week': current_week_totals(metrics_data, get_current_week_start())
+        })
+    elif store in ('messages', 'spending'):
+        household.events.publish(store, {'action': 'changed'})
+
+shared_state = SharedStateWatcher(households, publish_external_change)
+
+async def current_household(request: Request) -> AsyncIterator[Household]:
+    """Resolve the request's household (X-Household-Id header or ?household=) and pin it while in use"""
+    household_id = (request.headers.get(HOUSEHOLD_HEADER) or request.query_params.get('household')
+                    or DEFAULT_HOUSEHOLD)
+    if not valid_household_id(household_id):
+        raise HTTPException(status_code=400, detail="Invalid household id")
     try:
-        with open(filename, 'w') as f:
-            json.dump(data, f, indent=2)
-    except IOError as e:
-        print(f"Error saving {filename}: {e}")
+        household = await households.acquire(household_id)
+    except UnknownHouseholdError:
+        raise HTTPException(status_code=404, detail="Unknown household")
+    try:
+        yield household
+    finally:
+        households.release(household)
 
 def get_current_week_start() -> str:
-    """Get the start of the current week (Monday) in CST"""
-    now = datetime.now(CST)
-    days_since_monday = now.weekday()  # Monday is 0
-    week_start = now - timedelta(days=days_since_monday)
-    week_start = week_start.replace(hour=4, minute=0, second=0, microsecond=0)
-    
-    # If it's before 4am on Monday, use the previous week
-    if now.weekday() == 0 and now.hour < 4:
-        week_start -= timedelta(days=7)
-    
-    return week_start.strftime('%Y-%m-%d')
+    """Get the start of the current week (Monday), accounting for the reset hour"""
+    return periods.current_week_start()
 
 def get_current_day() -> str:
-    """Get the current day in CST, accounting for 4am reset"""
-    now = datetime.now(CST)
-    
-    # If it's before 4am, use the previous day
-    if now.hour < 4:
-        now -= timedelta(days=1)
-    
-    return now.strftime('%Y-%m-%d')
+    """Get the current day, accounting for the reset hour"""
+    return periods.current_day()
 
 def get_time_until_reset() -> dict:
     """Get time until next reset for both daily and weekly"""
-    now = datetime.now(CST)
-    
-    # Next daily reset (4am tomorrow, or 4am today if before 4am)
-    next_daily = now.replace(hour=4, minute=0, second=0, microsecond=0)
-    if now.hour >= 4:
-        next_daily += timedelta(days=1)
-    
-    # Next weekly reset (4am next Monday)
-    days_until_monday = (7 - now.weekday()) % 7
-    if days_until_monday == 0 and now.hour >= 4:  # It's Monday after 4am
-        days_until_monday = 7
-    
-    next_weekly = now + timedelta(days=days_until_monday)
-    next_weekly = next_weekly.replace(hour=4, minute=0, second=0, microsecond=0)
-    
-    daily_seconds = int((next_daily - now).total_seconds())
-    weekly_seconds = int((next_weekly - now).total_seconds())
-    
-    return {
-        'daily_reset_in_seconds': daily_seconds,
-        'weekly_reset_in_seconds': weekly_seconds,
-        'daily_reset_time': next_daily.isoformat(),
-        'weekly_reset_time': next_weekly.isoformat()
-    }
+    return periods.time_until_reset()
 
-def cleanup_old_messages():
-    """Remove messages older than 24 hours"""
-    messages_data = load_data_file('messages.json', {'messages': []})
-    current_day = get_current_day()
-    
-    # Filter messages to only keep today's
-    messages_data['messages'] = [
-        msg for msg in messages_data['messages'] 
-        if msg.get('timestamp', '').startswith(current_day)
-    ]
-    
-    save_data_file('messages.json', messages_data)
+def cleanup_old_messages(household: Household):
+    """Remove messages from before today's reset by dropping their day shards"""
+    household.messages_store.expire(get_current_day())
 
-def archive_weekly_data():
+def archive_weekly_data(household: Household):
     """Archive current week's data to analytics and reset current metrics"""
     current_week = get_current_week_start()
-    metrics_data = load_data_file('current_metrics.json', {})
-    analytics_data = load_data_file('analytics_data.json', {'weekly_history': []})
+    metrics_data = household.metrics_store.data
+    
+    # Already rolled over for this week; safe to call again after a restart
+    if 'current_week' in metrics_data and metrics_data['current_week']['week_start'] == current_week:
+        return
     
     # Archive current week if it exists
     if 'current_week' in metrics_data and metrics_data['current_week']['week_start'] != current_week:
-        analytics_data['weekly_history'].append(metrics_data['current_week'])
-        
-        # Keep only last 12 weeks for analytics
-        analytics_data['weekly_history'] = analytics_data['weekly_history'][-12:]
-        save_data_file('analytics_data.json', analytics_data)
+        # Upserts by week_start, so archiving the same week twice keeps one copy
+        household.metric_history.upsert_weeks([metrics_data['current_week']])
     
     # Reset current week data
     metrics_data['current_week'] = {
@@ -224,49 +240,135 @@ def archive_weekly_data():
         }
     }
     
-    save_data_file('current_metrics.json', metrics_data)
+    household.metrics_store.save()
 
-# Load existing setup data
-setup_data = load_data_file('account_setup.json', {'access_tokens': [], 'account_categorizations': {}})
-access_tokens: List[str] = setup_data.get('access_tokens', [])
-account_categorizations: Dict[str, str] = setup_data.get('account_categorizations', {})
-
-# Initialize data files on startup
-def initialize_data():
-    """Initialize data files with default structure"""
+def initialize_data(household: Household):
+    """Initialize data files with default structure and apply any due daily/weekly rollover"""
     current_week = get_current_week_start()
     current_day = get_current_day()
     
     # Initialize current metrics
-    metrics_data = load_data_file('current_metrics.json', {})
+    metrics_data = household.metrics_store.data
     if 'current_week' not in metrics_data or metrics_data['current_week']['week_start'] != current_week:
-        archive_weekly_data()
+        archive_weekly_data(household)
+        metrics_data = household.metrics_store.data
     
     # Ensure today's entry exists
     if 'current_week' in metrics_data:
         if current_day not in metrics_data['current_week']['daily_entries']:
-            metrics_data['current_week']['daily_entries'][current_day] = {
-                'date': current_day,
-                'sexCount': 0,
-                'qualityTimeHours': 0,
-                'dishesDone': 0,
-                'trashFullHours': 0,
-                'kittyDuties': 0
-            }
-            save_data_file('current_metrics.json', metrics_data)
+            metrics_data['current_week']['daily_entries'][current_day] = empty_daily_entry(current_day)
+            household.metrics_store.save()
     
     # Initialize messages and clean old ones
-    load_data_file('messages.json', {'messages': []})
-    cleanup_old_messages()
+    cleanup_old_messages(household)
     
-    # Initialize analytics data
-    load_data_file('analytics_data.json', {'weekly_history': []})
-    
-    # Initialize spending data
-    load_data_file('spending.json', {'transactions': []})
+    # Map the metric history (importing analytics_data.json on first run)
+    household.metric_history.columns()
+
+def roll_over_if_due(household: Household) -> bool:
+    """Apply a week rollover the scheduler has not run yet; call holding the metrics write lock
+
+    The 4am timer can fire late, and a tap journaled into last week's current_week
+    would be archived with it. Costs one string compare when there is nothing to do.
+    """
+    current_week = household.metrics_store.data.get('current_week')
+    if current_week and current_week['week_start'] == get_current_week_start():
+        return False
+    initialize_data(household)
+    return True
+
+async def run_rollover():
+    """Scheduled 4am job: roll over the day/week for every loaded household and tell its clients"""
+    # Unloaded households catch up when they are next opened
+    for loaded in households.loaded():
+        household = await households.acquire(loaded.id)
+        try:
+            async with household.concurrency.write('metrics', 'messages', 'analytics'):
+                initialize_data(household)
+            household.events.publish('reset', get_time_until_reset())
+        finally:
+            households.release(household)
 
-# Initialize on startup
-initialize_data()
+# Daily message expiry and weekly archive run at the reset boundaries (4am US/Central by default)
+reset_scheduler = ResetScheduler(run_rollover, get_time_until_reset)
+
+# Open the default household and import the Plaid SDK after the server is already
+# accepting connections, instead of before (for scale-from-zero)
+FAST_START = os.getenv('FAST_START', '0') == '1'
+
+async def warm_up():
+    """Apply the default household's rollover, map its history and prefetch its Plaid data"""
+    if leader.is_leader:
+        household = await households.acquire(DEFAULT_HOUSEHOLD)
+        households.release(household)
+    if PLAID_CLIENT_ID and PLAID_SECRET:
+        await run_in_threadpool(plaid_client)
+
+def report_warm_up(task: asyncio.Task):
+    """Log a failed background warm-up, which nothing awaits until shutdown"""
+    if task.cancelled() or task.exception() is None:
+        return
+    error = task.exception()
+    print(f"Warm-up failed: {type(error).__name__}: {error}")
+    traceback.print_exception(type(error), error, error.__traceback__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the workers' shared machinery, warm up, and flush everything on shutdown"""
+    # Elect a leader worker, which alone opens the default household at startup
+    await leader.start()
+    warm_up_task = None
+    if FAST_START:
+        warm_up_task = asyncio.create_task(warm_up())
+        warm_up_task.add_done_callback(report_warm_up)
+    else:
+        await warm_up()
+    households.start()
+    shared_state.start()
+    # Catch up on missed rollovers and schedule the next ones
+    reset_scheduler.start()
+    # Begin write-behind flushing of the in-memory stores
+    start_write_behind()
+
+    yield
+
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await warm_up_task
+    # Write any buffered store changes to disk before exiting
+    await reset_scheduler.stop()
+    await shared_state.stop()
+    await households.close()
+    await leader.stop()
+    stop_write_behind()
+    await plaid_cache.aclose()
+    await plaid_transport.aclose()
+
+app = FastAPI(title="Relationship Dashboard API", default_response_class=FastJSONResponse, lifespan=lifespan)
+
+# CORS setup for React frontend
+# For production, add your Amplify domain after deployment
+# Bearer token for the operational endpoints; unset leaves them disabled
+INTERNAL_API_TOKEN = os.getenv('INTERNAL_API_TOKEN', '')
+
+def require_internal_token(request: Request):
+    """404 unless the request carries INTERNAL_API_TOKEN, so the endpoints look absent to everyone else"""
+    scheme, _, token = request.headers.get('authorization', '').partition(' ')
+    if not INTERNAL_API_TOKEN or scheme.lower() != 'bearer' or not hmac.compare_digest(
+            token.encode(), INTERNAL_API_TOKEN.encode()):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:3000,http://localhost:3001,http://localhost:3002').split(',')
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=CORS_ORIGINS,
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+app.add_middleware(RequestMetricsMiddleware)
 
 @app.get("/")
 async def root():
@@ -276,260 +378,469 @@ async def root():
 async def health_check():
     return {"status": "healthy", "plaid_configured": bool(PLAID_CLIENT_ID and PLAID_SECRET)}
 
+@app.get("/api/plaid/health", dependencies=[Depends(require_internal_token)])
+async def get_plaid_health(household: Household = Depends(current_household)):
+    """Circuit breaker state and last error for each of the household's linked banks (this worker)"""
+    return {"items": plaid_transport.health(household.access_tokens)}
+
+@app.get("/internal/metrics", include_in_schema=False, dependencies=[Depends(require_internal_token)])
+async def get_internal_metrics():
+    """Request, store I/O and Plaid metrics for this worker in Prometheus text format"""
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/api/reset_timers")
 async def get_reset_timers():
     """Get time until next resets"""
     return get_time_until_reset()
 
+@app.get("/api/stream")
+async def stream_events(household: Household = Depends(current_household)):
+    """Server-sent change events for metrics, messages and spending, plus a timer heartbeat"""
+    return StreamingResponse(
+        household.events.stream(get_time_until_reset),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # Metrics endpoints
 @app.get("/api/metrics/today")
-async def get_todays_metrics():
+async def get_todays_metrics(household: Household = Depends(current_household)):
     """Get today's metric entry"""
     current_day = get_current_day()
-    metrics_data = load_data_file('current_metrics.json', {})
+    metrics_data = household.metrics_store.data
     
     if 'current_week' not in metrics_data:
-        initialize_data()
-        metrics_data = load_data_file('current_metrics.json', {})
+        initialize_data(household)
+        metrics_data = household.metrics_store.data
     
-    daily_entry = metrics_data['current_week']['daily_entries'].get(current_day, {
-        'date': current_day,
-        'sexCount': 0,
-        'qualityTimeHours': 0,
-        'dishesDone': 0,
-        'trashFullHours': 0,
-        'kittyDuties': 0
-    })
+    daily_entry = metrics_data['current_week']['daily_entries'].get(current_day, empty_daily_entry(current_day))
     
     return daily_entry
 
 @app.get("/api/metrics/week")
-async def get_weekly_metrics():
+async def get_weekly_metrics(household: Household = Depends(current_household)):
     """Get current week's aggregated metrics"""
     current_week = get_current_week_start()
-    metrics_data = load_data_file('current_metrics.json', {})
+    metrics_data = household.metrics_store.data
     
     if 'current_week' not in metrics_data:
-        initialize_data()
-        metrics_data = load_data_file('current_metrics.json', {})
+        initialize_data(household)
+        metrics_data = household.metrics_store.data
     
-    weekly_data = metrics_data['current_week']['weekly_totals']
+    return current_week_totals(metrics_data, current_week)
+
+def current_week_totals(metrics_data: dict, current_week: str) -> dict:
+    """Weekly totals in the /api/metrics/week format"""
+    weekly_data = dict(metrics_data['current_week']['weekly_totals'])
     weekly_data['weekStart'] = current_week
-    
     return weekly_data
 
 @app.post("/api/metrics/update")
-async def update_metric(update: MetricUpdate):
+async def update_metric(update: MetricUpdate, household: Household = Depends(current_household)):
     """Update a specific metric for today"""
     current_day = get_current_day()
-    current_week = get_current_week_start()
     
-    metrics_data = load_data_file('current_metrics.json', {})
+    # Week rollover is normally done by the 4am scheduler, but the timer can run late;
+    # journal the increment and apply it to the in-memory totals
+    async with household.concurrency.write('metrics'):
+        rolled_over = roll_over_if_due(household)
+        daily_entry = household.metrics_store.increment(current_day, update.metric, update.increment)
+        week = current_week_totals(household.metrics_store.data, get_current_week_start())
     
-    if 'current_week' not in metrics_data or metrics_data['current_week']['week_start'] != current_week:
-        archive_weekly_data()
-        metrics_data = load_data_file('current_metrics.json', {})
-    
-    # Ensure today's entry exists
-    if current_day not in metrics_data['current_week']['daily_entries']:
-        metrics_data['current_week']['daily_entries'][current_day] = {
-            'date': current_day,
-            'sexCount': 0,
-            'qualityTimeHours': 0,
-            'dishesDone': 0,
-            'trashFullHours': 0,
-            'kittyDuties': 0
-        }
-    
-    # Update the metric
-    daily_entry = metrics_data['current_week']['daily_entries'][current_day]
-    if update.metric in daily_entry:
-        old_value = daily_entry[update.metric]
-        new_value = max(0, old_value + update.increment)
-        daily_entry[update.metric] = new_value
-        
-        # Update weekly totals
-        weekly_totals = metrics_data['current_week']['weekly_totals']
-        if update.metric in weekly_totals:
-            weekly_totals[update.metric] += (new_value - old_value)
-            weekly_totals[update.metric] = max(0, weekly_totals[update.metric])
-    
-    save_data_file('current_metrics.json', metrics_data)
+    if rolled_over:
+        household.events.publish('reset', get_time_until_reset())
+    household.events.publish('metrics', {'today': daily_entry, 'week': week})
     return daily_entry
 
+def parse_date_range(start: Optional[str], end: Optional[str], default_days: int) -> Tuple[str, str]:
+    """Validate YYYY-MM-DD start/end query parameters, defaulting to the last `default_days` days"""
+    try:
+        end_date = datetime.strptime(end, '%Y-%m-%d') if end else datetime.strptime(get_current_day(), '%Y-%m-%d')
+        start_date = datetime.strptime(start, '%Y-%m-%d') if start else end_date - timedelta(days=default_days)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+
+def make_etag(household: Household, *versions) -> str:
+    """Weak ETag for a response built from these store versions (and query parameters)"""
+    digest = hashlib.sha1('|'.join(map(str, (household.id,) + versions)).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """A 304 if the client's If-None-Match already names this ETag"""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return None
+    tags = {tag.strip().removeprefix('W/') for tag in header.split(',')}
+    if '*' in tags or etag.removeprefix('W/') in tags:
+        return Response(status_code=304, headers=cache_headers(etag))
+    return None
+
+def cache_headers(etag: str) -> dict:
+    # Always revalidate; the household header selects different data for the same URL
+    return {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': HOUSEHOLD_HEADER}
+
 @app.get("/api/analytics/history")
-async def get_analytics_history():
-    """Get historical data for analytics"""
-    analytics_data = load_data_file('analytics_data.json', {'weekly_history': []})
-    current_metrics = load_data_file('current_metrics.json', {})
-    
+async def get_analytics_history(request: Request, start: Optional[str] = None, end: Optional[str] = None,
+                                household: Household = Depends(current_household)):
+    """Get weeks starting between start and end (YYYY-MM-DD, default the last 12 weeks)"""
+    start, end = parse_date_range(start, end, DEFAULT_HISTORY_WEEKS * 7)
+    etag = make_etag(household, household.metric_history.version, household.metrics_store.instance,
+                     household.metrics_store.version, start, end)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    current_metrics = household.metrics_store.data
+    
+    history = household.metric_history.weeks_between(start, end)
     # Include current week in history for analytics
-    history = analytics_data['weekly_history'].copy()
-    if 'current_week' in current_metrics:
-        history.append(current_metrics['current_week'])
+    current_week = current_metrics.get('current_week')
+    if current_week and start <= current_week['week_start'] <= end:
+        history.append(current_week)
     
-    return {'weekly_history': history}
+    return FastJSONResponse({'start': start, 'end': end, 'weekly_history': history}, headers=cache_headers(etag))
+
+@app.get("/api/analytics/summary")
+async def get_analytics_summary(request: Request, start: Optional[str] = None, end: Optional[str] = None,
+                                window: int = DEFAULT_ROLLING_WINDOW, period: str = 'week',
+                                household: Household = Depends(current_household)):
+    """Per-metric totals, means, percentiles, rolling means and day/week/month sums between start and end"""
+    start, end = parse_date_range(start, end, 365)
+    if window < 1:
+        raise HTTPException(status_code=400, detail="window must be at least 1")
+    if period not in ('day', 'week', 'month'):
+        raise HTTPException(status_code=400, detail="period must be day, week or month")
+    etag = make_etag(household, household.metric_history.version, household.metrics_store.instance,
+                     household.metrics_store.version, start, end, window, period)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    current_week = household.metrics_store.data.get('current_week', {})
+    extra_entries = list(current_week.get('daily_entries', {}).values())
+    summary = await run_in_threadpool(household.metric_history.summary, start, end, window, extra_entries, period)
+    return FastJSONResponse(summary, headers=cache_headers(etag))
 
 # Messages endpoints
 @app.get("/api/messages")
-async def get_messages():
+async def get_messages(request: Request, household: Household = Depends(current_household)):
     """Get all messages for today"""
-    cleanup_old_messages()
-    messages_data = load_data_file('messages.json', {'messages': []})
-    
-    # Sort by timestamp, newest first
-    messages = sorted(messages_data['messages'], key=lambda x: x.get('timestamp', ''), reverse=True)
-    return {'messages': messages}
+    etag = make_etag(household, household.messages_store.instance, household.messages_store.version)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    # Expired messages are removed by the 4am scheduler, not on read; the store keeps them newest first
+    return FastJSONResponse({'messages': household.messages_store.list()}, headers=cache_headers(etag))
 
-@app.post("/api/messages")
-async def create_message(note: Note):
-    """Create a new message"""
-    cleanup_old_messages()
-    messages_data = load_data_file('messages.json', {'messages': []})
-    
-    # Generate ID and timestamp
-    new_message = {
-        'id': str(len(messages_data['messages']) + int(datetime.now().timestamp())),
+# Message and spending mutations are shared by the REST handlers and /api/batch.
+# Each returns the response body and the change event to publish once committed.
+def apply_create_message(household: Household, note: Note) -> Tuple[dict, Optional[tuple]]:
+    # The store assigns a unique id
+    new_message = household.messages_store.create({
         'content': note.content,
         'author': note.author,
-        'timestamp': datetime.now(CST).isoformat(),
+        'timestamp': periods.now().isoformat(),
         'isRead': False,
         'isFavorite': False
-    }
-    
-    messages_data['messages'].append(new_message)
-    save_data_file('messages.json', messages_data)
-    
+    })
+    return new_message, ('messages', {'action': 'created', 'message': new_message})
+
+def require_encodable(updates: dict):
+    """Reject integers the stores could not write back to disk"""
+    if not encodable_ints(updates):
+        raise HTTPException(status_code=422, detail="Integers must fit in 64 bits")
+
+def apply_update_message(household: Household, message_id: str, updates: dict) -> Tuple[dict, Optional[tuple]]:
+    require_encodable(updates)
+    message = household.messages_store.update(message_id, updates)
+    if message is None:
+        raise HTTPException(status_code=404, detail="Message not found")
+    return message, ('messages', {'action': 'updated', 'message': message})
+
+def apply_delete_message(household: Household, message_id: str) -> Tuple[dict, Optional[tuple]]:
+    household.messages_store.delete(message_id)
+    return {"message": "Message deleted"}, ('messages', {'action': 'deleted', 'id': message_id})
+
+@app.post("/api/messages")
+async def create_message(note: Note, household: Household = Depends(current_household)):
+    """Create a new message"""
+    async with household.concurrency.write('messages'):
+        new_message, event = apply_create_message(household, note)
+    household.events.publish(*event)
     return new_message
 
 @app.put("/api/messages/{message_id}")
-async def update_message(message_id: str, updates: dict):
+async def update_message(message_id: str, updates: dict, household: Household = Depends(current_household)):
     """Update a message (mark as read, favorite, etc.)"""
-    messages_data = load_data_file('messages.json', {'messages': []})
-    
-    for message in messages_data['messages']:
-        if message['id'] == message_id:
-            message.update(updates)
-            save_data_file('messages.json', messages_data)
-            return message
-    
-    raise HTTPException(status_code=404, detail="Message not found")
+    async with household.concurrency.write('messages'):
+        message, event = apply_update_message(household, message_id, updates)
+    household.events.publish(*event)
+    return message
 
 @app.delete("/api/messages/{message_id}")
-async def delete_message(message_id: str):
+async def delete_message(message_id: str, household: Household = Depends(current_household)):
     """Delete a message"""
-    messages_data = load_data_file('messages.json', {'messages': []})
-    
-    messages_data['messages'] = [msg for msg in messages_data['messages'] if msg['id'] != message_id]
-    save_data_file('messages.json', messages_data)
-    
-    return {"message": "Message deleted"}
+    async with household.concurrency.write('messages'):
+        result, event = apply_delete_message(household, message_id)
+    household.events.publish(*event)
+    return result
 
 # Spending tracking endpoints
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
 @app.get("/api/spending/transactions")
-async def get_spending_transactions(month: Optional[str] = None):
-    """Get all spending transactions, optionally filtered by month"""
-    spending_data = load_data_file('spending.json', {'transactions': []})
-    transactions = spending_data.get('transactions', [])
-    
-    # If month filter is provided (format: YYYY-MM), filter transactions
-    if month:
-        transactions = [t for t in transactions if t.get('date', '').startswith(month)]
-    
-    # Sort by date, newest first
-    transactions.sort(key=lambda x: x.get('date', ''), reverse=True)
-    
-    return {'transactions': transactions}
+async def get_spending_transactions(request: Request, month: Optional[str] = None,
+                                    person: Optional[str] = None, tag: Optional[str] = None,
+                                    limit: Optional[int] = None, before: Optional[str] = None,
+                                    after: Optional[str] = None, format: str = 'json',
+                                    household: Household = Depends(current_household)):
+    """Get spending transactions newest first, optionally filtered by month (YYYY-MM), person and tag.
 
-@app.post("/api/spending/transactions")
-async def create_spending_transaction(transaction: SpendingTransaction):
-    """Create a new spending transaction"""
-    spending_data = load_data_file('spending.json', {'transactions': []})
-    
+    With `limit`, `before` or `after` the response is one page plus `next_cursor` (pass as `before`
+    for older rows) and `prev_cursor` (pass as `after` for newer rows). `format=ndjson` streams every
+    matching row, one JSON object per line.
+    """
+    try:
+        before_key = decode_cursor(before) if before else None
+        after_key = decode_cursor(after) if after else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    if format not in ('json', 'ndjson'):
+        raise HTTPException(status_code=400, detail="format must be json or ndjson")
+
+    etag = make_etag(household, household.spending_storage.version, month, person, tag, limit, before, after, format)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    filters = {'month': month, 'person': person, 'tag': tag, 'before': before_key, 'after': after_key}
+    if format == 'ndjson':
+        return StreamingResponse(stream_transactions(household.id, filters, ndjson_chunks),
+                                 media_type='application/x-ndjson', headers=cache_headers(etag))
+    if limit is None and before is None and after is None:
+        transactions = await run_in_threadpool(household.spending_storage.page, month, person, tag)
+        return FastJSONResponse({'transactions': transactions}, headers=cache_headers(etag))
+
+    limit = limit or DEFAULT_PAGE_SIZE
+    # One extra row tells whether there is another page in the direction of travel
+    rows = await run_in_threadpool(household.spending_storage.page, limit=limit + 1, **filters)
+    backwards = after is not None and before is None
+    more = len(rows) > limit
+    rows = rows[1:] if backwards and more else rows[:limit]
+    older = more if not backwards else bool(rows)
+    newer = more if backwards else before is not None
+    return FastJSONResponse({
+        'transactions': rows,
+        'next_cursor': encode_cursor(rows[-1]) if rows and older else None,
+        'prev_cursor': encode_cursor(rows[0]) if rows and newer else None,
+    }, headers=cache_headers(etag))
+
+def ndjson_chunks(chunks) -> Iterator[str]:
+    for chunk in chunks:
+        yield b''.join(dumps(transaction) + b'\n' for transaction in chunk).decode()
+
+async def stream_transactions(household_id: str, filters: dict, render: Callable) -> AsyncIterator[str]:
+    """Every matching transaction rendered as text, read from storage a chunk at a time"""
+    # Pin the household for the whole stream, which outlives the request's own pin
+    household = await households.acquire(household_id)
+    try:
+        texts = render(household.spending_storage.iter_chunks(**filters))
+        while True:
+            text = await run_in_threadpool(next, texts, None)
+            if text is None:
+                break
+            yield text
+    finally:
+        households.release(household)
+
+@app.get("/api/spending/export")
+async def export_spending(month: Optional[str] = None, person: Optional[str] = None, tag: Optional[str] = None,
+                          household: Household = Depends(current_household)):
+    """Stream matching spending transactions as CSV, newest first"""
+    filters = {'month': month, 'person': person, 'tag': tag}
+    return StreamingResponse(stream_transactions(household.id, filters, csv_chunks), media_type='text/csv',
+                             headers={'Content-Disposition': 'attachment; filename="spending.csv"'})
+
+@app.post("/api/spending/import")
+async def import_spending(request: Request, household: Household = Depends(current_household)):
+    """Bulk-create spending transactions from a CSV body (id, date, amount, tag, person), reporting bad rows"""
+    parser = CsvImportParser()
+    transactions = []
+    try:
+        # Parsed and validated as the body arrives; only valid rows are kept
+        async for data in request.stream():
+            transactions.extend(parser.feed(data))
+        transactions.extend(parser.close())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        async with household.concurrency.write('spending'):
+            storage = household.spending_storage
+            # Checked under the write lock, so an id can't be taken between the check and the insert
+            transactions = parser.reject_taken_ids(transactions, storage.existing_ids)
+            if transactions:
+                fill_defaults(transactions, storage.count() + int(datetime.now().timestamp()), periods.now().isoformat())
+                storage.create_many(transactions)
+    except Exception as e:
+        # create_many is all-or-nothing, so nothing was imported
+        print(f"Error importing spending CSV: {str(e)}")
+        raise HTTPException(status_code=500, detail={
+            'imported': 0,
+            'rows': parser.rows,
+            'error_count': parser.error_count,
+            'errors': parser.errors,
+            'message': f"Import failed, no rows were imported: {str(e)}",
+        })
+    if transactions:
+        household.events.publish('spending', {'action': 'imported', 'count': len(transactions)})
+    return {
+        'imported': len(transactions),
+        'rows': parser.rows,
+        'error_count': parser.error_count,
+        'errors': parser.errors,
+    }
+
+def apply_create_spending(household: Household, transaction: SpendingTransaction) -> Tuple[dict, Optional[tuple]]:
     # Generate ID and date if not provided
     new_transaction = {
-        'id': str(len(spending_data['transactions']) + int(datetime.now().timestamp())),
+        'id': str(household.spending_storage.count() + int(datetime.now().timestamp())),
         'amount': transaction.amount,
         'tag': transaction.tag,
         'person': transaction.person,
-        'date': transaction.date or datetime.now(CST).isoformat()
+        'date': transaction.date or periods.now().isoformat()
     }
     
-    spending_data['transactions'].append(new_transaction)
-    save_data_file('spending.json', spending_data)
-    
-    return new_transaction
+    created = household.spending_storage.create(new_transaction)
+    return created, ('spending', {'action': 'created', 'transaction': created})
+
+def apply_update_spending(household: Household, transaction_id: str, updates: dict) -> Tuple[dict, Optional[tuple]]:
+    require_encodable(updates)
+    try:
+        transaction = household.spending_storage.update(transaction_id, updates)
+    except DuplicateIdError as e:
+        raise HTTPException(status_code=409, detail=f"Transaction id already exists: {e}")
+    if transaction is None:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    return transaction, ('spending', {'action': 'updated', 'transaction': transaction})
+
+def apply_delete_spending(household: Household, transaction_id: str) -> Tuple[dict, Optional[tuple]]:
+    event = None
+    if household.spending_storage.delete(transaction_id) is not None:
+        event = ('spending', {'action': 'deleted', 'id': transaction_id})
+    return {"message": "Transaction deleted"}, event
+
+@app.post("/api/spending/transactions")
+async def create_spending_transaction(transaction: SpendingTransaction, household: Household = Depends(current_household)):
+    """Create a new spending transaction"""
+    async with household.concurrency.write('spending'):
+        created, event = apply_create_spending(household, transaction)
+    household.events.publish(*event)
+    return created
 
 @app.put("/api/spending/transactions/{transaction_id}")
-async def update_spending_transaction(transaction_id: str, updates: dict):
+async def update_spending_transaction(transaction_id: str, updates: dict, household: Household = Depends(current_household)):
     """Update a spending transaction"""
-    spending_data = load_data_file('spending.json', {'transactions': []})
-    
-    for transaction in spending_data['transactions']:
-        if transaction['id'] == transaction_id:
-            transaction.update(updates)
-            save_data_file('spending.json', spending_data)
-            return transaction
-    
-    raise HTTPException(status_code=404, detail="Transaction not found")
+    async with household.concurrency.write('spending'):
+        transaction, event = apply_update_spending(household, transaction_id, updates)
+    household.events.publish(*event)
+    return transaction
 
 @app.delete("/api/spending/transactions/{transaction_id}")
-async def delete_spending_transaction(transaction_id: str):
+async def delete_spending_transaction(transaction_id: str, household: Household = Depends(current_household)):
     """Delete a spending transaction"""
-    spending_data = load_data_file('spending.json', {'transactions': []})
-    
-    spending_data['transactions'] = [
-        t for t in spending_data['transactions'] if t['id'] != transaction_id
-    ]
-    save_data_file('spending.json', spending_data)
-    
-    return {"message": "Transaction deleted"}
+    async with household.concurrency.write('spending'):
+        result, event = apply_delete_spending(household, transaction_id)
+    if event:
+        household.events.publish(*event)
+    return result
 
 @app.get("/api/spending/stats")
-async def get_spending_stats():
+async def get_spending_stats(request: Request, household: Household = Depends(current_household)):
     """Get spending statistics aggregated by tag and person"""
-    spending_data = load_data_file('spending.json', {'transactions': []})
-    transactions = spending_data.get('transactions', [])
-    
-    # Group by month
-    monthly_stats = {}
-    
-    for transaction in transactions:
-        date_str = transaction.get('date', '')
-        if not date_str:
-            continue
-        
-        # Extract month (YYYY-MM)
-        month = date_str[:7] if len(date_str) >= 7 else datetime.now(CST).strftime('%Y-%m')
-        
-        if month not in monthly_stats:
-            monthly_stats[month] = {
-                'total_by_tag': {'necessities': 0, 'eating out': 0, 'fun': 0, 'clothes': 0},
-                'total_by_person': {'ben': 0, 'sydney': 0},
-                'transaction_count': 0
-            }
-        
-        stats = monthly_stats[month]
-        tag = transaction.get('tag', '')
-        person = transaction.get('person', '')
-        amount = transaction.get('amount', 0)
-        
-        if tag in stats['total_by_tag']:
-            stats['total_by_tag'][tag] += amount
-        
-        if person in stats['total_by_person']:
-            stats['total_by_person'][person] += amount
-        
-        stats['transaction_count'] += 1
+    etag = make_etag(household, household.spending_storage.version)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    # Aggregates are maintained incrementally by the spending storage
+    return FastJSONResponse({'monthly_stats': household.spending_storage.stats()}, headers=cache_headers(etag))
+
+# Batch endpoint
+MAX_BATCH_OPERATIONS = 1000
+
+BATCH_OPERATIONS = {
+    'messages.create': lambda household, op: apply_create_message(household, Note(**op.data)),
+    'messages.update': lambda household, op: apply_update_message(household, op.id, op.data),
+    'messages.delete': lambda household, op: apply_delete_message(household, op.id),
+    'spending.create': lambda household, op: apply_create_spending(household, SpendingTransaction(**op.data)),
+    'spending.update': lambda household, op: apply_update_spending(household, op.id, op.data),
+    'spending.delete': lambda household, op: apply_delete_spending(household, op.id),
+}
+
+class BatchFailed(Exception):
+    def __init__(self, index: int, status_code: int, detail: Any):
+        self.index = index
+        self.status_code = status_code
+        self.detail = detail
+
+@app.post("/api/batch")
+async def apply_batch(batch: BatchRequest, household: Household = Depends(current_household)):
+    """Apply an ordered list of metric, message and spending operations all-or-nothing"""
+    if len(batch.operations) > MAX_BATCH_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_OPERATIONS} operations per batch")
     
-    # Calculate averages
-    for month, stats in monthly_stats.items():
-        stats['avg_by_tag'] = {
-            tag: stats['total_by_tag'][tag] / max(1, stats['transaction_count']) 
-            for tag in ['necessities', 'eating out', 'fun', 'clothes']
-        }
+    current_day = get_current_day()
+    results: List[Optional[dict]] = [None] * len(batch.operations)
+    pending_events = []
+    metric_updates = []
     
-    return {'monthly_stats': monthly_stats}
+    try:
+        # Roll back messages and spending if any operation fails
+        async with household.concurrency.write('metrics', 'messages', 'spending'):
+            # A rollover is kept even if the batch fails, so it is announced straight away
+            if any(operation.op == 'metrics.update' for operation in batch.operations) and roll_over_if_due(household):
+                household.events.publish('reset', get_time_until_reset())
+            with household.spending_storage.transaction(), household.messages_store.transaction():
+                for index, operation in enumerate(batch.operations):
+                    try:
+                        if operation.op == 'metrics.update':
+                            # Metric taps are journaled together after everything else succeeds
+                            update = MetricUpdate(**operation.data)
+                            metric_updates.append((index, (current_day, update.metric, update.increment)))
+                            continue
+                        if operation.op not in BATCH_OPERATIONS:
+                            raise HTTPException(status_code=400, detail=f"Unknown operation: {operation.op}")
+                        result, event = BATCH_OPERATIONS[operation.op](household, operation)
+                    except ValidationError as e:
+                        raise BatchFailed(index, 422, str(e))
+                    except HTTPException as e:
+                        raise BatchFailed(index, e.status_code, e.detail)
+                    results[index] = {'status': 200, 'result': result}
+                    if event:
+                        pending_events.append(event)
+            
+                if metric_updates:
+                    entries = household.metrics_store.increment_many([item for _, item in metric_updates])
+                    for (index, _), entry in zip(metric_updates, entries):
+                        results[index] = {'status': 200, 'result': entry}
+                    pending_events.append(('metrics', {
+                        'today': entries[-1],
+                        'week': current_week_totals(household.metrics_store.data, get_current_week_start())
+                    }))
+    except BatchFailed as failure:
+        return FastJSONResponse(status_code=failure.status_code, content={
+            'committed': False,
+            'failed_index': failure.index,
+            'detail': failure.detail
+        })
+    
+    for event in pending_events:
+        household.events.publish(*event)
+    return {'committed': True, 'results': results}
 
 # Existing Plaid endpoints (unchanged)
 @app.get("/connect", response_class=HTMLResponse)
@@ -541,6 +852,8 @@ async def connect():
 <p>This will open Plaid Link to connect your banks. You only need to do this once per bank.</p>
 <script src="https://cdn.plaid.com/link/v2/stable/link-initialize.js"></script>
 <script>
+// Visit /connect?household=<id> to link banks for a household other than the default
+const household = new URLSearchParams(location.search).get('household') || 'default';
 fetch('/api/create_link_token', {method:'POST'}).then(r=>r.json()).then(data=>{
   if (data.link_token) {
     const handler = Plaid.create({
@@ -549,7 +862,7 @@ fetch('/api/create_link_token', {method:'POST'}).then(r=>r.json()).then(data=>{
         document.body.innerHTML = '<p>Connecting...</p>';
         fetch('/api/exchange_public_token', {
           method:'POST', 
-          headers:{'Content-Type':'application/json'},
+          headers:{'Content-Type':'application/json', 'X-Household-Id': household},
           body: JSON.stringify({ public_token })
         }).then(r=>r.json()).then(result=>{
           document.body.innerHTML = '<h3>✅ Connected!</h3><p>' + metadata.institution.name + ' has been connected.</p><p>You can close this page and refresh your dashboard.</p>';
@@ -577,42 +890,58 @@ fetch('/api/create_link_token', {method:'POST'}).then(r=>r.json()).then(data=>{
 </body></html>"""
     return HTMLResponse(html)
 
+def plaid_link_token_create():
+    from plaid.model.country_code import CountryCode
+    from plaid.model.link_token_create_request import LinkTokenCreateRequest
+    from plaid.model.link_token_create_request_user import LinkTokenCreateRequestUser
+    from plaid.model.products import Products
+
+    user = LinkTokenCreateRequestUser(client_user_id='relationship_dashboard_user')
+    
+    request = LinkTokenCreateRequest(
+        products=[Products('transactions')],
+        client_name="Relationship Dashboard",
+        country_codes=[CountryCode('US')],
+        language='en',
+        user=user
+    )
+    return call_with_retry(plaid_client().link_token_create, request, path='/link/token/create')
+
+def plaid_public_token_exchange(public_token: str):
+    from plaid.model.item_public_token_exchange_request import ItemPublicTokenExchangeRequest
+
+    request = ItemPublicTokenExchangeRequest(
+        public_token=public_token
+    )
+    # A public token can only be exchanged once, so only retry if Plaid never saw the request
+    return call_with_retry(plaid_client().item_public_token_exchange, request,
+                           path='/item/public_token/exchange', idempotent=False)
+
 @app.post("/api/create_link_token")
 async def create_link_token():
     """Create a Plaid Link token for account linking"""
     try:
-        user = LinkTokenCreateRequestUser(client_user_id='relationship_dashboard_user')
-        
-        request = LinkTokenCreateRequest(
-            products=[Products('transactions')],
-            client_name="Relationship Dashboard",
-            country_codes=[CountryCode('US')],
-            language='en',
-            user=user
-        )
-        
-        response = client.link_token_create(request)
+        # The Plaid SDK is synchronous (and imported on first use); keep it off the event loop
+        response = await run_in_threadpool(plaid_link_token_create)
         return {"link_token": response['link_token']}
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating link token: {str(e)}")
 
 @app.post("/api/exchange_public_token")
-async def exchange_public_token(data: PublicTokenExchange):
+async def exchange_public_token(data: PublicTokenExchange, household: Household = Depends(current_household)):
     """Exchange public token for access token"""
     try:
-        request = ItemPublicTokenExchangeRequest(
-            public_token=data.public_token
-        )
-        
-        response = client.item_public_token_exchange(request)
+        response = await run_in_threadpool(plaid_public_token_exchange, data.public_token)
         access_token = response['access_token']
+        plaid_cache.invalidate(access_token)
         
         # Store access token and save to file
-        access_tokens.append(access_token)
-        setup_data['access_tokens'] = access_tokens
-        setup_data['account_categorizations'] = account_categorizations
-        save_data_file('account_setup.json', setup_data)
+        async with household.concurrency.write('setup'):
+            household.access_tokens.append(access_token)
+            household.setup_store.save()
+        if leader.is_leader:
+            household.transaction_sync.start_background(lambda: household.access_tokens)
         
         return {"access_token": access_token, "item_id": response['item_id']}
     
@@ -620,163 +949,138 @@ async def exchange_public_token(data: PublicTokenExchange):
         raise HTTPException(status_code=500, detail=f"Error exchanging token: {str(e)}")
 
 @app.get("/api/accounts")
-async def get_accounts():
+async def get_accounts(household: Household = Depends(current_household)):
     """Get all linked accounts"""
     all_accounts = []
     
-    for access_token in access_tokens:
-        try:
-            accounts_data = {
-                "client_id": PLAID_CLIENT_ID,
-                "secret": PLAID_SECRET,
-                "access_token": access_token
-            }
-            r = requests.post("https://production.plaid.com/accounts/get", 
-                            json=accounts_data, timeout=30)
-            r.raise_for_status()
-            response = r.json()
-            
-            for account in response.get('accounts', []):
-                account_data = {
-                    'account_id': account['account_id'],
-                    'name': account['name'],
-                    'type': account['type'],
-                    'subtype': account.get('subtype'),
-                    'balance': account['balances']['current'],
-                    'available': account['balances']['available'],
-                    'owner': account_categorizations.get(account['account_id'], 'ben')
-                }
-                all_accounts.append(account_data)
-                
-        except Exception as e:
-            print(f"Error fetching accounts for token: {str(e)}")
+    # Cached per bank; stale entries are refreshed in the background
+    results, fetched_at = await plaid_cache.fetch('/accounts/get', household.access_tokens)
+    
+    for access_token, response in results:
+        if isinstance(response, Exception):
+            print(f"Error fetching accounts for token: {str(response)}")
             continue
+        
+        for account in response.get('accounts', []):
+            account_data = {
+                'account_id': account['account_id'],
+                'name': account['name'],
+                'type': account['type'],
+                'subtype': account.get('subtype'),
+                'balance': account['balances']['current'],
+                'available': account['balances']['available'],
+                'owner': household.owner_of(account['account_id'])
+            }
+            all_accounts.append(account_data)
     
-    return {"accounts": all_accounts}
+    return {"accounts": all_accounts, **data_age(fetched_at)}
 
 @app.post("/api/categorize_account")
-async def categorize_account(categorization: AccountCategorization):
+async def categorize_account(categorization: AccountCategorization, household: Household = Depends(current_household)):
     """Categorize an account as belonging to Sydney, Ben, or Investments"""
-    account_categorizations[categorization.account_id] = categorization.owner
-    setup_data['access_tokens'] = access_tokens
-    setup_data['account_categorizations'] = account_categorizations
-    save_data_file('account_setup.json', setup_data)
+    async with household.concurrency.write('setup'):
+        household.account_categorizations[categorization.account_id] = categorization.owner
+        household.setup_store.save()
     return {"message": f"Account categorized as {categorization.owner}"}
 
-async def calculate_weekly_change(owner: str) -> float:
-    """Calculate weekly spending/income change for an owner"""
-    # This is a simplified implementation
-    # In a real app, you'd analyze transactions from the past week vs previous week
-    
-    total_change = 0.0
-    week_ago = datetime.now() - timedelta(days=7)
-    
-    for access_token in access_tokens:
-        try:
-            # Get transactions for the past 14 days to compare weeks
-            start_date = (datetime.now() - timedelta(days=14)).date().isoformat()
-            end_date = datetime.now().date().isoformat()
-            
-            transaction_data = {
-                "client_id": PLAID_CLIENT_ID,
-                "secret": PLAID_SECRET,
-                "access_token": access_token,
-                "start_date": start_date,
-                "end_date": end_date
-            }
-            
-            r = requests.post("https://production.plaid.com/transactions/get", 
-                            json=transaction_data, timeout=30)
-            
-            if r.status_code != 200:
-                print(f"Plaid transactions API error: {r.status_code} - {r.text}")
-                continue
-                
-            response_data = r.json()
-            transactions = response_data.get("transactions", [])
-            
-            # Filter transactions for accounts owned by this person
-            for transaction in transactions:
-                account_id = transaction['account_id']
-                if account_categorizations.get(account_id) == owner:
-                    # Only count transactions from the past week
-                    date_value = transaction['date']
-                    if isinstance(date_value, str):
-                        transaction_date = datetime.strptime(date_value, '%Y-%m-%d')
-                    else:
-                        # Already a date object, convert to datetime
-                        transaction_date = datetime.combine(date_value, datetime.min.time())
-                    if transaction_date >= week_ago:
-                        # Negative amount means money spent, positive means money received
-                        total_change -= transaction['amount']
-        
-        except Exception as e:
-            print(f"Error calculating weekly change: {str(e)}")
-            continue
-    
-    # If no real transaction data found, return 0 instead of fake data
-    if total_change == 0:
-        print(f"No transactions found for {owner} in the past week")
-        total_change = 0.0  # Return actual 0 instead of fake random numbers
-    
-    return total_change
+async def calculate_weekly_change(household: Household, owner: str) -> float:
+    """Calculate weekly spending/income change for an owner from locally synced transactions"""
+    return round(weekly_changes(household.bank_transactions, household.account_categorizations).get(owner, 0.0), 2)
+
+@app.post("/api/transactions/sync")
+async def sync_transactions(household: Household = Depends(current_household)):
+    """Pull new, modified and removed transactions from Plaid for every linked bank"""
+    return {"synced": await household.transaction_sync.sync_all(household.access_tokens)}
 
 @app.get("/api/balances")
-async def get_balances():
+async def get_balances(household: Household = Depends(current_household)):
     """Get aggregated financial data for the dashboard - subtracts credit cards"""
-    # Initialize balances
-    sydney_balance = 0.0
-    ben_balance = 0.0
-    investments_balance = 0.0
+    return await owner_balances(household)
+
+async def owner_balances(household: Household) -> dict:
+    """Net balance and weekly change per owner, in the /api/balances format"""
+    # Initialize balances for each of the household's owners
+    balances = {owner: 0.0 for owner in household.owners}
     
-    for access_token in access_tokens:
-        try:
-            accounts_data = {
-                "client_id": PLAID_CLIENT_ID,
-                "secret": PLAID_SECRET,
-                "access_token": access_token
-            }
-            r = requests.post("https://production.plaid.com/accounts/balance/get", 
-                            json=accounts_data, timeout=30)
-            r.raise_for_status()
-            
-            for acct in r.json().get("accounts", []):
-                owner = account_categorizations.get(acct["account_id"], "ben")
-                balance = acct["balances"].get("current", 0) or 0
-                
-                # For credit cards, subtract the balance (debt) from net worth
-                if acct["type"] == "credit":
-                    balance = -balance  # Convert debt to negative value
-                
-                # Aggregate by owner
-                if owner == 'sydney':
-                    sydney_balance += balance
-                elif owner == 'ben':
-                    ben_balance += balance
-                elif owner == 'investments':
-                    investments_balance += balance
-                    
-        except Exception as e:
-            print(f"Error fetching balances for token: {str(e)}")
+    # Cached per bank; stale entries are refreshed in the background
+    results, fetched_at = await plaid_cache.fetch('/accounts/balance/get', household.access_tokens)
+    
+    for access_token, response in results:
+        if isinstance(response, Exception):
+            print(f"Error fetching balances for token: {str(response)}")
             continue
+        
+        for acct in response.get("accounts", []):
+            owner = household.owner_of(acct["account_id"])
+            balance = acct["balances"].get("current", 0) or 0
+            
+            # For credit cards, subtract the balance (debt) from net worth
+            if acct["type"] == "credit":
+                balance = -balance  # Convert debt to negative value
+            
+            # Aggregate by owner
+            if owner in balances:
+                balances[owner] += balance
     
-    # Skip weekly changes calculation to avoid blocking API calls
-    # Since we're not displaying weekly changes, this makes the API much faster
+    # Weekly changes come from the local transaction store, not live Plaid calls
+    changes = weekly_changes(household.bank_transactions, household.account_categorizations)
     
     return {
-        "sydney": {
-            "balance": round(sydney_balance, 2),
-            "weeklyChange": 0.0
-        },
-        "ben": {
-            "balance": round(ben_balance, 2),
-            "weeklyChange": 0.0
+        **{
+            owner: {
+                "balance": round(balance, 2),
+                "weeklyChange": round(changes.get(owner, 0.0), 2)
+            }
+            for owner, balance in balances.items()
         },
-        "investments": {
-            "balance": round(investments_balance, 2),
-            "weeklyChange": 0.0
-        }
+        **data_age(fetched_at)
+    }
+
+# Dashboard page load
+def dashboard_metrics(household: Household) -> dict:
+    """Today's entry and the week's totals from a single read of the metrics store"""
+    metrics_data = household.metrics_store.data
+    if 'current_week' not in metrics_data:
+        initialize_data(household)
+        metrics_data = household.metrics_store.data
+    current_day = get_current_day()
+    return {
+        'today': metrics_data['current_week']['daily_entries'].get(current_day, empty_daily_entry(current_day)),
+        'week': current_week_totals(metrics_data, get_current_week_start()),
+    }
+
+async def timed_section(name: str, build: Callable[[], Any]) -> Tuple[Any, dict]:
+    """Build one dashboard section, returning (value or None, timing and any error)"""
+    started = time.perf_counter()
+    try:
+        value = build()
+        if asyncio.iscoroutine(value):
+            value = await value
+        error = None
+    except Exception as e:
+        print(f"Error building dashboard section {name}: {str(e)}")
+        value, error = None, str(e) or type(e).__name__
+    return value, {'ms': round((time.perf_counter() - started) * 1000, 3), 'error': error}
+
+@app.get("/api/dashboard")
+async def get_dashboard(household: Household = Depends(current_household)):
+    """Everything the dashboard shows on load: metrics, messages, reset timers and balances
+
+    The local sections are built while the Plaid balance fetch is in flight. A
+    section that fails is returned as null with its error, and the rest still load.
+    """
+    sections = {
+        # Started first so the in-memory sections are built while it waits on Plaid
+        'balances': lambda: owner_balances(household),
+        'metrics': lambda: dashboard_metrics(household),
+        'messages': household.messages_store.list,
+        'timers': get_time_until_reset,
     }
+    results = await asyncio.gather(*(timed_section(name, build) for name, build in sections.items()))
+    payload = {name: value for name, (value, _) in zip(sections, results)}
+    payload['sections'] = {name: timing for name, (_, timing) in zip(sections, results)}
+    server_timing = ', '.join(f"{name};dur={timing['ms']}" for name, timing in payload['sections'].items())
+    return FastJSONResponse(payload, headers={'Server-Timing': server_timing})
 
 if __name__ == "__main__":
     import uvicorn
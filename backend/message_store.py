@@ -0,0 +1,132 @@
+"""
+Today's messages, sharded by reset day.
+
+messages.json holds one shard per reset day (the day starts at RESET_HOUR,
+as for metrics), each mapping message id to message in creation order:
+
+    {"next_id": 1792213831, "days": {"2026-10-17": {"1792213830": {...}}}}
+
+Expiring a day drops its shard without looking at the messages in it, and
+reads walk the shards newest day first and each shard backwards, so
+messages come out newest first without sorting. An id -> day index makes
+get, update and delete O(1).
+
+Ids come from a counter stored with the messages, seeded above both the
+current time in milliseconds and any existing numeric id, so they never
+repeat, even across days. The older {"messages": [...]} layout is
+converted on load.
+"""
+
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from periods import periods
+from store import STORE_FORMAT, JsonStore
+
+
+class MessageStore(JsonStore):
+    """messages.json as day shards with an id index"""
+
+    def __init__(self, filename: str, file_format: str = STORE_FORMAT):
+        self._index: Dict[str, str] = {}
+        self._index_data: Optional[dict] = None
+        super().__init__(filename, {'next_id': 0, 'days': {}}, file_format)
+
+    def _load(self):
+        super()._load()
+        if 'messages' in self._data:
+            self._data = self._from_list(self._data['messages'])
+            self._dirty = True
+
+    @staticmethod
+    def _from_list(messages: List[dict]) -> dict:
+        """Shard a flat message list (the old layout) by reset day"""
+        days = periods.day_buckets(message.get('timestamp', '') for message in messages)
+        current_day = periods.current_day()
+        shards: Dict[str, Dict[str, dict]] = {}
+        order = sorted(range(len(messages)), key=lambda i: messages[i].get('timestamp', ''))
+        for i in order:
+            day = current_day if np.isnat(days[i]) else str(days[i])
+            shards.setdefault(day, {})[str(messages[i]['id'])] = messages[i]
+        return {'next_id': 0, 'days': {day: shards[day] for day in sorted(shards)}}
+
+    def _shards(self) -> Dict[str, Dict[str, dict]]:
+        data = self.data
+        if self._index_data is not data:
+            # First use, a reload or a rolled-back transaction
+            self._index = {message_id: day for day, shard in data['days'].items() for message_id in shard}
+            self._index_data = data
+        return data['days']
+
+    def _next_id(self) -> str:
+        data = self.data
+        next_id = data.get('next_id') or 0
+        if not next_id:
+            # A new or converted store starts above the clock and every existing id
+            numeric = [int(message_id) for message_id in self._index if message_id.isdigit()]
+            next_id = max([int(time.time() * 1000)] + [n + 1 for n in numeric])
+        data['next_id'] = next_id + 1
+        return str(next_id)
+
+    def list(self) -> List[dict]:
+        """Every message, newest first"""
+        shards = self._shards()
+        return [message for day in sorted(shards, reverse=True) for message in reversed(shards[day].values())]
+
+    def count(self) -> int:
+        self._shards()
+        return len(self._index)
+
+    def get(self, message_id: str) -> Optional[dict]:
+        shards = self._shards()
+        day = self._index.get(message_id)
+        return None if day is None else shards[day][message_id]
+
+    def create(self, message: dict) -> dict:
+        """Add a message to today's shard under a new id"""
+        with self._lock:
+            shards = self._shards()
+            message = {'id': self._next_id(), **message}
+            day = periods.current_day()
+            shards.setdefault(day, {})[message['id']] = message
+            self._index[message['id']] = day
+            self.save()
+            return message
+
+    def update(self, message_id: str, updates: dict) -> Optional[dict]:
+        """Apply updates to a message (its id cannot change)"""
+        with self._lock:
+            message = self.get(message_id)
+            if message is None:
+                return None
+            message.update({key: value for key, value in updates.items() if key != 'id'})
+            self.save()
+            return message
+
+    def delete(self, message_id: str) -> Optional[dict]:
+        with self._lock:
+            shards = self._shards()
+            day = self._index.pop(message_id, None)
+            if day is None:
+                return None
+            message = shards[day].pop(message_id)
+            if not shards[day]:
+                del shards[day]
+            self.save()
+            return message
+
+    def expire(self, current_day: str) -> int:
+        """Drop every shard older than current_day, returning how many messages went with them"""
+        with self._lock:
+            shards = self._shards()
+            expired = [day for day in shards if day < current_day]
+            removed = 0
+            for day in expired:
+                removed += len(shards[day])
+                for message_id in shards.pop(day):
+                    del self._index[message_id]
+            if expired:
+                self.save()
+            return removed
@@ -0,0 +1,288 @@
+"""
+Long-term metric history in a columnar, memory-mapped layout.
+
+Archived weeks are kept as one NumPy array per column under
+metric_history/<generation>/:
+
+    days.npy           datetime64[D]  one row per archived day, sorted
+    day_weeks.npy      datetime64[D]  week_start each day was archived under
+    <metric>.npy       int32          one column per MetricEntry field
+    weeks.npy          datetime64[D]  archived week starts, sorted
+    week_<field>.npy   int32          one column per weekly total
+
+Readers memory-map the generation named in metric_history/CURRENT. A write
+builds the next generation and switches CURRENT with an atomic rename, so a
+reader never sees a half-written archive. Archiving a week upserts by
+week_start: archiving the same week again replaces it instead of adding a
+second copy.
+
+Range queries are binary searches on the sorted day column, and summaries
+(totals, means, percentiles, rolling means, day/week/month sums) are computed
+on whole columns.
+
+On first use the weekly_history in analytics_data.json is imported once,
+keeping the last copy of any week that was archived more than once.
+"""
+
+import json
+import os
+import shutil
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from counters import METRIC_FIELDS
+from instrumentation import store_io
+from periods import PeriodEngine
+
+WEEKLY_TOTAL_FIELDS = ['sexCount', 'qualityTimeHours', 'dishesDone', 'trashTargetHours', 'kittyDuties']
+HISTORY_DIR = 'metric_history'
+DEFAULT_ROLLING_WINDOW = 7
+
+DAY = 'datetime64[D]'
+
+
+def to_day(value: str) -> np.datetime64:
+    return np.datetime64(value[:10], 'D')
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over `window` values (fewer at the start of the series)"""
+    if len(values) == 0:
+        return values.astype(np.float64)
+    sums = np.cumsum(values, dtype=np.float64)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    return sums / counts
+
+
+class MetricHistory:
+    """Archived weeks of daily metric entries, stored column by column"""
+
+    def __init__(self, directory: str = HISTORY_DIR, legacy_json: Optional[str] = None):
+        self.directory = directory
+        self.legacy_json = legacy_json
+        self._generation: Optional[str] = None
+        self._columns: Dict[str, np.ndarray] = {}
+
+    # Storage
+
+    def _current_generation(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.directory, 'CURRENT')) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    @staticmethod
+    def _empty_columns() -> Dict[str, np.ndarray]:
+        columns = {'days': np.array([], dtype=DAY), 'day_weeks': np.array([], dtype=DAY),
+                   'weeks': np.array([], dtype=DAY)}
+        columns.update({field: np.array([], dtype=np.int32) for field in METRIC_FIELDS})
+        columns.update({f"week_{field}": np.array([], dtype=np.int32) for field in WEEKLY_TOTAL_FIELDS})
+        return columns
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Memory-mapped columns of the current generation, re-mapped if another process wrote a new one"""
+        generation = self._current_generation()
+        if generation is None and self.legacy_json and os.path.exists(self.legacy_json):
+            self.import_json(self.legacy_json)
+            generation = self._current_generation()
+        if generation != self._generation or not self._columns:
+            columns = self._empty_columns()
+            if generation is not None:
+                path = os.path.join(self.directory, generation)
+                for name in columns:
+                    columns[name] = np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+            self._columns = columns
+            self._generation = generation
+        return self._columns
+
+    @property
+    def version(self) -> str:
+        """The current generation; it changes on every write, in any process"""
+        return self._current_generation() or '0'
+
+    def _write(self, columns: Dict[str, np.ndarray]):
+        previous = self._current_generation()
+        generation = f"{int(previous or 0) + 1:06d}"
+        path = os.path.join(self.directory, generation)
+        os.makedirs(path, exist_ok=True)
+        with store_io(self.directory, 'write', sum(values.nbytes for values in columns.values())):
+            for name, values in columns.items():
+                np.save(os.path.join(path, f"{name}.npy"), values)
+        current_tmp = os.path.join(self.directory, 'CURRENT.tmp')
+        with open(current_tmp, 'w') as f:
+            f.write(generation)
+        os.replace(current_tmp, os.path.join(self.directory, 'CURRENT'))
+        # Keep the previous generation for readers that just read the old CURRENT;
+        # older ones stay readable through existing memory maps until unmapped
+        for entry in os.listdir(self.directory):
+            if entry.isdigit() and entry not in (generation, previous):
+                shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+
+    # Writes
+
+    def upsert_weeks(self, weeks: Iterable[dict]):
+        """Archive weeks (in the current_week format), replacing any already archived with the same week_start"""
+        latest: Dict[str, dict] = {}
+        for week in weeks:
+            latest[week['week_start']] = week
+        if not latest:
+            return
+
+        day_rows: Dict[str, Tuple[str, dict]] = {}
+        for week_start, week in latest.items():
+            for day, entry in week.get('daily_entries', {}).items():
+                day_rows[day] = (week_start, entry)
+
+        new_weeks = np.array(sorted(latest), dtype=DAY)
+        new_days = np.array(sorted(day_rows), dtype=DAY)
+        old = self.columns()
+
+        # Drop replaced weeks, and days that are being re-archived
+        keep_days = ~(np.isin(old['days'], new_days) | np.isin(old['day_weeks'], new_weeks))
+        keep_weeks = ~np.isin(old['weeks'], new_weeks)
+
+        days = np.concatenate([old['days'][keep_days], new_days])
+        day_order = np.argsort(days, kind='stable')
+        weeks = np.concatenate([old['weeks'][keep_weeks], new_weeks])
+        week_order = np.argsort(weeks, kind='stable')
+
+        columns = {
+            'days': days[day_order],
+            'day_weeks': np.concatenate([
+                old['day_weeks'][keep_days],
+                np.array([day_rows[day][0] for day in sorted(day_rows)], dtype=DAY),
+            ])[day_order],
+            'weeks': weeks[week_order],
+        }
+        for field in METRIC_FIELDS:
+            added = np.array([day_rows[day][1].get(field, 0) for day in sorted(day_rows)], dtype=np.int32)
+            columns[field] = np.concatenate([old[field][keep_days], added])[day_order]
+        for field in WEEKLY_TOTAL_FIELDS:
+            added = np.array([latest[week]['weekly_totals'].get(field, 0) for week in sorted(latest)],
+                             dtype=np.int32)
+            columns[f"week_{field}"] = np.concatenate([old[f"week_{field}"][keep_weeks], added])[week_order]
+        self._write(columns)
+
+    def import_json(self, filename: str) -> int:
+        """One-shot import of analytics_data.json's weekly_history, returning the number of weeks archived"""
+        try:
+            with open(filename) as f:
+                history = json.load(f).get('weekly_history', [])
+        except (json.JSONDecodeError, IOError):
+            print(f"Error reading {filename}, starting with an empty metric history")
+            history = []
+        os.makedirs(self.directory, exist_ok=True)
+        self._write(self._empty_columns())
+        self.upsert_weeks(history)
+        return len({week['week_start'] for week in history})
+
+    # Queries
+
+    def _day_slice(self, start: Optional[str], end: Optional[str]) -> slice:
+        days = self.columns()['days']
+        lo = 0 if start is None else int(np.searchsorted(days, to_day(start), side='left'))
+        hi = len(days) if end is None else int(np.searchsorted(days, to_day(end), side='right'))
+        return slice(lo, hi)
+
+    def weeks_between(self, start: Optional[str] = None, end: Optional[str] = None) -> List[dict]:
+        """Archived weeks whose week_start falls in [start, end], oldest first, in the current_week format"""
+        columns = self.columns()
+        weeks = columns['weeks']
+        lo = 0 if start is None else int(np.searchsorted(weeks, to_day(start), side='left'))
+        hi = len(weeks) if end is None else int(np.searchsorted(weeks, to_day(end), side='right'))
+        if lo >= hi:
+            return []
+
+        selected = weeks[lo:hi]
+        in_weeks = np.isin(columns['day_weeks'], selected)
+        day_strings = np.datetime_as_string(columns['days'][in_weeks])
+        day_week_strings = np.datetime_as_string(columns['day_weeks'][in_weeks])
+        day_values = {field: columns[field][in_weeks].tolist() for field in METRIC_FIELDS}
+
+        result = {}
+        for i, week_start in enumerate(np.datetime_as_string(selected)):
+            result[week_start] = {
+                'week_start': week_start,
+                'daily_entries': {},
+                'weekly_totals': {
+                    field: int(columns[f"week_{field}"][lo + i]) for field in WEEKLY_TOTAL_FIELDS
+                },
+            }
+        for i, (day, week_start) in enumerate(zip(day_strings, day_week_strings)):
+            entry = {'date': day}
+            entry.update({field: day_values[field][i] for field in METRIC_FIELDS})
+            result[week_start]['daily_entries'][day] = entry
+        return list(result.values())
+
+    def daily_series(self, start: str, end: str, extra_entries: Iterable[dict] = ()) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Every calendar day in [start, end] with each metric's value (0 where nothing was recorded)"""
+        first, last = to_day(start), to_day(end)
+        calendar = np.arange(first, last + np.timedelta64(1, 'D'), dtype=DAY)
+        series = {field: np.zeros(len(calendar), dtype=np.int64) for field in METRIC_FIELDS}
+        if len(calendar) == 0:
+            return calendar, series
+
+        columns = self.columns()
+        window = self._day_slice(start, end)
+        offsets = (columns['days'][window] - first).astype(np.int64)
+        for field in METRIC_FIELDS:
+            series[field][offsets] = columns[field][window]
+
+        # Days not archived yet (the current week) override the archive
+        for entry in extra_entries:
+            offset = int((to_day(entry['date']) - first).astype(np.int64))
+            if 0 <= offset < len(calendar):
+                for field in METRIC_FIELDS:
+                    series[field][offset] = entry.get(field, 0)
+        return calendar, series
+
+    def summary(self, start: str, end: str, window: int = DEFAULT_ROLLING_WINDOW,
+                extra_entries: Iterable[dict] = (), period: str = 'week') -> dict:
+        """Totals, daily means, percentiles, a trailing rolling mean and per-period sums per metric over [start, end]"""
+        calendar, series = self.daily_series(start, end, extra_entries)
+        if period == 'month':
+            buckets = PeriodEngine.months(calendar).astype(DAY)
+        elif period == 'week':
+            buckets = PeriodEngine.week_starts(calendar)
+        else:
+            buckets = calendar
+        period_starts, inverse = np.unique(buckets, return_inverse=True)
+        metrics = {}
+        for field, values in series.items():
+            if len(values):
+                p50, p90 = np.percentile(values, [50, 90])
+                rolling = np.round(rolling_mean(values, window), 3)
+            else:
+                p50 = p90 = 0.0
+                rolling = np.array([])
+            metrics[field] = {
+                'total': int(values.sum()),
+                'mean': round(float(values.mean()), 3) if len(values) else 0.0,
+                'p50': float(p50),
+                'p90': float(p90),
+                'max': int(values.max()) if len(values) else 0,
+                'rolling_mean': rolling.tolist(),
+                'by_period': np.bincount(inverse, weights=values, minlength=len(period_starts)).astype(np.int64).tolist(),
+            }
+        return {
+            'start': start,
+            'end': end,
+            'days': np.datetime_as_string(calendar).tolist(),
+            'window': window,
+            'period': period,
+            'period_starts': np.datetime_as_string(period_starts).tolist(),
+            'metrics': metrics,
+        }
+
+
+if __name__ == "__main__":
+    # python metric_history.py import [analytics_data.json]
+    if len(sys.argv) > 1 and sys.argv[1] == 'import':
+        source = sys.argv[2] if len(sys.argv) > 2 else 'analytics_data.json'
+        print(f"Archived {MetricHistory().import_json(source)} weeks from {source}")
+    else:
+        print("Usage: python metric_history.py import [analytics_data.json]")
@@ -0,0 +1,200 @@
+"""
+Day, week and month buckets for the dashboard's reset schedule.
+
+The dashboard's day starts at RESET_HOUR (default 4am) in RESET_TIMEZONE
+(default US/Central) rather than at midnight, and weeks start at that hour on
+Monday. PeriodEngine turns whole arrays of ISO timestamps into day, week and
+month buckets in a few NumPy passes instead of one pytz conversion per row.
+
+Timestamps with a UTC offset (or a trailing Z) are placed with a table of the
+exact UTC instant of every reset boundary, built once per year with pytz (so
+DST changes are honoured) and cached. Naive timestamps are taken as local
+wall-clock time, and bare YYYY-MM-DD dates are already a day.
+"""
+
+import os
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pytz
+
+RESET_HOUR = int(os.getenv('RESET_HOUR', '4'))
+RESET_TIMEZONE = os.getenv('RESET_TIMEZONE', 'US/Central')
+
+DAY = 'datetime64[D]'
+MONTH = 'datetime64[M]'
+# 1970-01-01 was a Thursday; shifting by 3 makes Monday weekday 0
+EPOCH_WEEKDAY_SHIFT = 3
+
+
+def _parse_datetimes(values: np.ndarray, dtype: str) -> np.ndarray:
+    """values.astype(dtype), except that strings NumPy cannot parse become NaT instead of raising"""
+    try:
+        return values.astype(dtype)
+    except ValueError:
+        # Rare non-ISO strings; parse one by one so only those become NaT
+        parsed = np.full(len(values), np.datetime64('NaT'), dtype=dtype)
+        for i, value in enumerate(values):
+            try:
+                parsed[i] = np.array(value).astype(dtype)
+            except ValueError:
+                pass
+        return parsed
+
+
+class PeriodEngine:
+    """Vectorized day/week/month bucketing around a daily reset hour"""
+
+    def __init__(self, timezone: str = RESET_TIMEZONE, reset_hour: int = RESET_HOUR):
+        self.timezone = pytz.timezone(timezone)
+        self.reset_hour = reset_hour
+        self._year_tables: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._span_tables: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]] = {}
+
+    # Boundary tables
+
+    def _year_table(self, year: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Every local day of a year and the UTC epoch second its reset boundary falls on"""
+        table = self._year_tables.get(year)
+        if table is None:
+            days = np.arange(np.datetime64(f"{year}-01-01"), np.datetime64(f"{year + 1}-01-01"), dtype=DAY)
+            boundaries = np.array([
+                int(self.timezone.localize(datetime(day.year, day.month, day.day, self.reset_hour)).timestamp())
+                for day in days.tolist()
+            ], dtype=np.int64)
+            table = self._year_tables[year] = (days, boundaries)
+        return table
+
+    def boundary_table(self, first_year: int, last_year: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Contiguous days and reset boundaries covering first_year-1 through last_year"""
+        key = (first_year, last_year)
+        table = self._span_tables.get(key)
+        if table is None:
+            years = [self._year_table(year) for year in range(first_year - 1, last_year + 1)]
+            table = self._span_tables[key] = (
+                np.concatenate([days for days, _ in years]),
+                np.concatenate([boundaries for _, boundaries in years]),
+            )
+        return table
+
+    # Bucketing
+
+    def days_from_epoch(self, seconds: np.ndarray) -> np.ndarray:
+        """The reset-shifted local day each UTC epoch second falls in"""
+        seconds = np.asarray(seconds, dtype=np.int64)
+        if len(seconds) == 0:
+            return np.array([], dtype=DAY)
+        years = seconds.astype('datetime64[s]').astype('datetime64[Y]').astype(np.int64) + 1970
+        days, boundaries = self.boundary_table(int(years.min()), int(years.max()) + 1)
+        return days[np.searchsorted(boundaries, seconds, side='right') - 1]
+
+    def day_buckets(self, timestamps: Iterable[str]) -> np.ndarray:
+        """The reset-shifted local day of each ISO date or timestamp (NaT where it is empty or not ISO)"""
+        values = np.asarray(list(timestamps), dtype=str)
+        result = np.full(len(values), np.datetime64('NaT'), dtype=DAY)
+        if len(values) == 0:
+            return result
+        lengths = np.char.str_len(values)
+        # Bare dates are already days
+        dates = lengths == 10
+        result[dates] = _parse_datetimes(values[dates], DAY)
+
+        timed = lengths > 10
+        wall = _parse_datetimes(values[timed].astype('U19'), 'datetime64[s]')
+        # Unparseable timestamps stay NaT
+        timed[timed] = ~np.isnat(wall)
+        wall = wall[~np.isnat(wall)]
+        if not timed.any():
+            return result
+        stamps, stamp_lengths = values[timed], lengths[timed]
+
+        chars = stamps.view('U1').reshape(len(stamps), -1)
+        rows = np.arange(len(stamps))
+        utc = chars[rows, stamp_lengths - 1] == 'Z'
+        sign_char = chars[rows, np.maximum(stamp_lengths - 6, 0)]
+        offset = ((sign_char == '+') | (sign_char == '-')) & (stamp_lengths >= 25)
+        naive = ~(utc | offset)
+
+        days = np.empty(len(stamps), dtype=DAY)
+        # Naive timestamps are local wall-clock time
+        days[naive] = (wall[naive] - np.timedelta64(self.reset_hour, 'h')).astype(DAY)
+
+        aware = ~naive
+        if aware.any():
+            digits = chars[aware][:, :].view(np.uint32).astype(np.int64) - ord('0')
+            ends = stamp_lengths[aware]
+            aware_rows = np.arange(aware.sum())
+            hours = digits[aware_rows, ends - 5] * 10 + digits[aware_rows, ends - 4]
+            minutes = digits[aware_rows, ends - 2] * 10 + digits[aware_rows, ends - 1]
+            sign = np.where(sign_char[aware] == '-', -1, 1)
+            offset_seconds = np.where(utc[aware], 0, sign * (hours * 3600 + minutes * 60))
+            epoch = wall[aware].astype(np.int64) - offset_seconds
+            days[aware] = self.days_from_epoch(epoch)
+
+        result[timed] = days
+        return result
+
+    @staticmethod
+    def week_starts(days: np.ndarray) -> np.ndarray:
+        """The Monday starting the week of each day"""
+        days = np.asarray(days, dtype=DAY)
+        weekday = (days.astype(np.int64) + EPOCH_WEEKDAY_SHIFT) % 7
+        return days - weekday.astype('timedelta64[D]')
+
+    @staticmethod
+    def months(days: np.ndarray) -> np.ndarray:
+        return np.asarray(days, dtype=DAY).astype(MONTH)
+
+    def week_buckets(self, timestamps: Iterable[str]) -> np.ndarray:
+        return self.week_starts(self.day_buckets(timestamps))
+
+    def month_buckets(self, timestamps: Iterable[str]) -> np.ndarray:
+        return self.months(self.day_buckets(timestamps))
+
+    @staticmethod
+    def group_sums(keys: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Sum values per distinct key, returning (sorted keys, sums)"""
+        unique, inverse = np.unique(keys, return_inverse=True)
+        sums = np.zeros(len(unique), dtype=np.float64)
+        np.add.at(sums, inverse, values)
+        return unique, sums
+
+    # The current period
+
+    def now(self) -> datetime:
+        return datetime.now(self.timezone)
+
+    def current_day(self, now: Optional[datetime] = None) -> str:
+        """Today's reset-shifted local day as YYYY-MM-DD"""
+        now = now or self.now()
+        return str(self.days_from_epoch(np.array([int(now.timestamp())]))[0])
+
+    def current_week_start(self, now: Optional[datetime] = None) -> str:
+        """The Monday starting the current reset-shifted week as YYYY-MM-DD"""
+        return str(self.week_starts(np.datetime64(self.current_day(now)))[()])
+
+    def boundary(self, day: str) -> datetime:
+        """The local datetime at which a day starts"""
+        day = np.datetime64(day, 'D')
+        year = int(day.astype('datetime64[Y]').astype(np.int64)) + 1970
+        days, boundaries = self.boundary_table(year, year)
+        seconds = boundaries[int((day - days[0]).astype(np.int64))]
+        return datetime.fromtimestamp(int(seconds), self.timezone)
+
+    def time_until_reset(self, now: Optional[datetime] = None) -> dict:
+        """Seconds until, and the time of, the next daily and weekly reset"""
+        now = now or self.now()
+        today = np.datetime64(self.current_day(now))
+        next_daily = self.boundary(str(today + np.timedelta64(1, 'D')))
+        next_weekly = self.boundary(str(self.week_starts(today)[()] + np.timedelta64(7, 'D')))
+        return {
+            'daily_reset_in_seconds': int((next_daily - now).total_seconds()),
+            'weekly_reset_in_seconds': int((next_weekly - now).total_seconds()),
+            'daily_reset_time': next_daily.isoformat(),
+            'weekly_reset_time': next_weekly.isoformat(),
+        }
+
+
+# Shared engine for the configured reset schedule
+periods = PeriodEngine()
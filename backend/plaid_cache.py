@@ -0,0 +1,120 @@
+"""
+Per-access-token cache for Plaid account and balance responses.
+
+Balances barely move from minute to minute, so each (endpoint, access token)
+response is kept for PLAID_CACHE_TTL_SECONDS. Fresh entries are served
+directly; stale entries are served immediately while a background task
+refreshes them (stale-while-revalidate). Only tokens with no cached response
+at all are fetched inline. Responses are cached raw, so account owners are
+still applied from account_categorizations on every request.
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from plaid_transport import PlaidTransport, TokenResult
+
+PLAID_CACHE_TTL_SECONDS = float(os.getenv('PLAID_CACHE_TTL_SECONDS', '300'))
+
+
+class PlaidCache:
+    """TTL + stale-while-revalidate cache in front of a PlaidTransport"""
+
+    def __init__(self, transport: PlaidTransport, ttl: float = PLAID_CACHE_TTL_SECONDS):
+        self.transport = transport
+        self.ttl = ttl
+        # (path, access_token) -> (response, fetched_at)
+        self._entries: Dict[Tuple[str, str], Tuple[dict, float]] = {}
+        # (path, access_token) -> refresh task currently fetching it
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _store(self, path: str, results: List[TokenResult]):
+        now = time.time()
+        for access_token, response in results:
+            if isinstance(response, Exception):
+                print(f"Error refreshing {path} for token: {str(response)}")
+            else:
+                self._entries[(path, access_token)] = (response, now)
+
+    async def _refresh(self, path: str, access_tokens: List[str]):
+        try:
+            self._store(path, await self.transport.fan_out(path, access_tokens))
+        finally:
+            for access_token in access_tokens:
+                self._inflight.pop((path, access_token), None)
+
+    def refresh_in_background(self, path: str, access_tokens: List[str]) -> Optional[asyncio.Task]:
+        """Start refreshing the given tokens unless a refresh is already running"""
+        access_tokens = [t for t in access_tokens if (path, t) not in self._inflight]
+        if not access_tokens:
+            return None
+        task = self._spawn(self._refresh(path, access_tokens))
+        for access_token in access_tokens:
+            self._inflight[(path, access_token)] = task
+        return task
+
+    def _spawn(self, coro) -> asyncio.Task:
+        # Keep a reference so background refreshes are not garbage collected
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def fetch(self, path: str, access_tokens: List[str]) -> Tuple[List[TokenResult], Optional[float]]:
+        """Responses for every token in order, plus when the oldest one was fetched"""
+        now = time.time()
+        missing = [t for t in access_tokens if (path, t) not in self._entries]
+        stale = [
+            t for t in access_tokens
+            if (path, t) in self._entries and now - self._entries[(path, t)][1] > self.ttl
+        ]
+
+        errors = {}
+        if missing:
+            # Share any refresh already in flight (e.g. the startup warm-up)
+            pending = {self._inflight[(path, t)] for t in missing if (path, t) in self._inflight}
+            to_fetch = [t for t in missing if (path, t) not in self._inflight]
+            fetched, *_ = await asyncio.gather(
+                self.transport.fan_out(path, to_fetch), *pending, return_exceptions=True
+            )
+            if isinstance(fetched, Exception):
+                fetched = [(t, fetched) for t in to_fetch]
+            self._store(path, fetched)
+            errors = {t: r for t, r in fetched if isinstance(r, Exception)}
+        if stale:
+            self.refresh_in_background(path, stale)
+
+        results = []
+        fetched_times = []
+        for access_token in access_tokens:
+            entry = self._entries.get((path, access_token))
+            if entry is None:
+                results.append((access_token, errors.get(access_token, KeyError(access_token))))
+            else:
+                results.append((access_token, entry[0]))
+                fetched_times.append(entry[1])
+        return results, min(fetched_times) if fetched_times else None
+
+    def invalidate(self, access_token: Optional[str] = None):
+        """Forget cached responses for one token, or for every token"""
+        for key in list(self._entries):
+            if access_token is None or key[1] == access_token:
+                del self._entries[key]
+
+    async def aclose(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def data_age(fetched_at: Optional[float]) -> dict:
+    """Response fields telling the UI how old cached Plaid data is"""
+    if fetched_at is None:
+        return {'asOf': None, 'ageSeconds': None}
+    return {
+        'asOf': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(fetched_at)),
+        'ageSeconds': int(time.time() - fetched_at),
+    }
@@ -0,0 +1,277 @@
+"""
+Retries and per-access-token circuit breakers for Plaid calls.
+
+Transient failures (connection errors, timeouts, 429 and 5xx responses) are
+retried up to PLAID_RETRY_ATTEMPTS times with full-jitter exponential backoff
+starting at PLAID_RETRY_BASE_SECONDS, honouring Retry-After. All attempts of
+one call share its PLAID_TIMEOUT_SECONDS deadline.
+
+Each access token (one linked bank) has a circuit breaker. After
+PLAID_BREAKER_FAILURES consecutive calls fail with a transient error or an
+INSTITUTION_ERROR, the breaker opens and calls for that token fail at once
+with CircuitOpenError for PLAID_BREAKER_RESET_SECONDS. Then one probe call is
+let through (half-open): success closes the breaker, failure opens it again.
+Errors that mean the bank answered (say ITEM_LOGIN_REQUIRED) do not trip it,
+but are kept as the item's last error.
+
+Breakers live in this process's memory, so each worker tracks its own.
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import httpx
+
+from instrumentation import plaid_circuit_transitions, plaid_rejected, plaid_retries, token_label
+
+PLAID_RETRY_ATTEMPTS = int(os.getenv('PLAID_RETRY_ATTEMPTS', '3'))
+PLAID_RETRY_BASE_SECONDS = float(os.getenv('PLAID_RETRY_BASE_SECONDS', '0.25'))
+PLAID_RETRY_MAX_SECONDS = float(os.getenv('PLAID_RETRY_MAX_SECONDS', '4'))
+PLAID_BREAKER_FAILURES = int(os.getenv('PLAID_BREAKER_FAILURES', '3'))
+PLAID_BREAKER_RESET_SECONDS = float(os.getenv('PLAID_BREAKER_RESET_SECONDS', '60'))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Plaid error types meaning the bank, not the request, is the problem
+OUTAGE_ERROR_TYPES = {'INSTITUTION_ERROR'}
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Plaid while a token's breaker is open"""
+
+    def __init__(self, retry_in: float):
+        super().__init__(f"bank unavailable, retrying in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+def plaid_error(error: Exception) -> Dict[str, Any]:
+    """Plaid's error_type/error_code for a failed call, if it returned one"""
+    response = getattr(error, 'response', None)
+    if isinstance(response, httpx.Response):
+        try:
+            body = response.json()
+        except ValueError:
+            return {}
+        return body if isinstance(body, dict) else {}
+    body = getattr(error, 'body', None)  # plaid.ApiException
+    if isinstance(body, (str, bytes)):
+        try:
+            body = json.loads(body)
+        except ValueError:
+            return {}
+    return body if isinstance(body, dict) else {}
+
+
+def error_status(error: Exception) -> Optional[int]:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code
+    status = getattr(error, 'status', None)  # plaid.ApiException
+    return status if isinstance(status, int) else None
+
+
+def _is_connection_error(error: Exception, sent: bool) -> bool:
+    """Network failures; with sent=False, only those where the request never reached Plaid"""
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    if isinstance(error, httpx.TransportError):
+        return sent
+    if isinstance(error, ConnectionRefusedError):
+        return True
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return sent
+    # The SDK's urllib3 errors; urllib3 is already imported whenever the SDK raised one
+    urllib3 = sys.modules.get('urllib3')
+    if urllib3 is None:
+        return False
+    exceptions = urllib3.exceptions
+    if isinstance(error, exceptions.MaxRetryError) and isinstance(error.reason, Exception):
+        return _is_connection_error(error.reason, sent)
+    if isinstance(error, (exceptions.NewConnectionError, exceptions.ConnectTimeoutError)):
+        return True
+    return sent and isinstance(error, (exceptions.TimeoutError, exceptions.ProtocolError))
+
+
+def is_transient(error: Exception, idempotent: bool = True) -> bool:
+    """Worth retrying: network trouble, rate limiting or a Plaid server error
+
+    Calls that must not run twice (exchanging a public token) are only
+    retried when the request cannot have been processed.
+    """
+    status = error_status(error)
+    if status is not None:
+        return status == 429 or (idempotent and status in RETRY_STATUSES)
+    return _is_connection_error(error, sent=idempotent)
+
+
+def is_outage(error: Exception) -> bool:
+    """Counts against the token's circuit breaker"""
+    if isinstance(error, CircuitOpenError):
+        return False
+    return is_transient(error) or plaid_error(error).get('error_type') in OUTAGE_ERROR_TYPES
+
+
+def backoff_delay(attempt: int, error: Optional[Exception] = None) -> float:
+    """Seconds to wait before retry number `attempt` (1-based)"""
+    response = getattr(error, 'response', None)
+    if isinstance(response, httpx.Response):
+        try:
+            return min(float(response.headers.get('Retry-After', '')), PLAID_RETRY_MAX_SECONDS)
+        except ValueError:
+            pass
+    # Full jitter: spread retries from many requests over the whole window
+    return random.uniform(0, min(PLAID_RETRY_MAX_SECONDS, PLAID_RETRY_BASE_SECONDS * 2 ** (attempt - 1)))
+
+
+def error_label(error: Exception) -> str:
+    """HTTP status or exception type, as used in metric labels"""
+    status = error_status(error)
+    return str(status) if status is not None else type(error).__name__
+
+
+def describe(error: Exception) -> str:
+    details = plaid_error(error)
+    if details.get('error_code'):
+        return f"{details.get('error_type', 'ERROR')}: {details['error_code']}"
+    status = error_status(error)
+    return f"HTTP {status}" if status is not None else (str(error) or type(error).__name__)
+
+
+class CircuitBreaker:
+    """Failure count and open/half-open/closed state for one access token"""
+
+    def __init__(self, access_token: str,
+                 failures: int = PLAID_BREAKER_FAILURES,
+                 reset_seconds: float = PLAID_BREAKER_RESET_SECONDS):
+        self.label = token_label(access_token)
+        self.failure_threshold = failures
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_error_at: Optional[float] = None
+        self.last_success_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            self.state = state
+            plaid_circuit_transitions.inc((self.label, state))
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go ahead"""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            retry_in = self.opened_at + self.reset_seconds - time.time()
+            if self.state == OPEN and retry_in <= 0:
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN and not self._probing:
+                # This call is the probe; everyone else keeps failing fast until it reports
+                self._probing = True
+                return
+            raise CircuitOpenError(max(retry_in, 0))
+
+    def record(self, error: Optional[Exception] = None):
+        """Report how a call allowed by before_call() ended"""
+        with self._lock:
+            self._probing = False
+            now = time.time()
+            if error is not None:
+                self.last_error, self.last_error_at = describe(error), now
+            if error is None or not is_outage(error):
+                # The bank answered
+                self.last_success_at = now if error is None else self.last_success_at
+                self.consecutive_failures = 0
+                self._set_state(CLOSED)
+                return
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.opened_at = now
+                self._set_state(OPEN)
+
+    def abandon(self):
+        """A call was cancelled before it finished; let another probe through"""
+        with self._lock:
+            self._probing = False
+
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = None
+            if self.state != CLOSED:
+                retry_in = max(0, round(self.opened_at + self.reset_seconds - time.time(), 1))
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'last_error': self.last_error,
+                'last_error_at': _timestamp(self.last_error_at),
+                'last_success_at': _timestamp(self.last_success_at),
+                'retry_in_seconds': retry_in,
+            }
+
+
+def _timestamp(when: Optional[float]) -> Optional[str]:
+    return None if when is None else time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(when))
+
+
+class Breakers:
+    """One CircuitBreaker per access token, created on first use"""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, access_token: str) -> CircuitBreaker:
+        breaker = self._breakers.get(access_token)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(access_token, CircuitBreaker(access_token))
+        return breaker
+
+    def health(self, access_tokens: Iterable[str]) -> Dict[str, dict]:
+        """Breaker state per item, keyed by the last four characters of its token"""
+        return {access_token[-4:]: self.get(access_token).health() for access_token in access_tokens}
+
+
+def call_with_retry(fn: Callable, *args, path: str = 'sdk', access_token: Optional[str] = None,
+                    breakers: Optional[Breakers] = None, idempotent: bool = True,
+                    attempts: int = PLAID_RETRY_ATTEMPTS, **kwargs):
+    """Call a blocking Plaid SDK method with retries, behind the token's breaker if given"""
+    breaker = breakers.get(access_token) if breakers is not None and access_token else None
+    labels = (path, token_label(access_token) if access_token else '')
+    if breaker is not None:
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            plaid_rejected.inc(labels)
+            raise
+    attempt = 1
+    try:
+        while True:
+            try:
+                result = fn(*args, **kwargs)
+                break
+            except Exception as e:
+                if attempt >= attempts or not is_transient(e, idempotent):
+                    raise
+                plaid_retries.inc(labels + (error_label(e),))
+                time.sleep(backoff_delay(attempt, e))
+                attempt += 1
+    except Exception as e:
+        if breaker is not None:
+            breaker.record(e)
+        raise
+    except BaseException:
+        if breaker is not None:
+            breaker.abandon()
+        raise
+    if breaker is not None:
+        breaker.record()
+    return result
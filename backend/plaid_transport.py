@@ -0,0 +1,144 @@
+"""
+Async transport for Plaid's REST API.
+
+All requests share one httpx.AsyncClient, so connections to Plaid are pooled
+and kept alive between dashboard loads. fan_out() calls the same endpoint for
+every access token concurrently (bounded by PLAID_CONCURRENCY), so N linked
+banks take about as long as the slowest one rather than the sum of all of them.
+
+Every call goes through plaid_resilience: transient failures are retried
+with jittered backoff within the call's timeout, and a token whose bank keeps
+failing is short-circuited by its breaker instead of waiting on it again.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import httpx
+
+from instrumentation import plaid_errors, plaid_rejected, plaid_request_seconds, plaid_retries, token_label
+from plaid_resilience import (PLAID_RETRY_ATTEMPTS, Breakers, CircuitOpenError, backoff_delay, error_label,
+                              is_transient)
+
+PLAID_BASE_URL = os.getenv('PLAID_BASE_URL', 'https://production.plaid.com')
+PLAID_CONCURRENCY = int(os.getenv('PLAID_CONCURRENCY', '8'))
+PLAID_TIMEOUT_SECONDS = float(os.getenv('PLAID_TIMEOUT_SECONDS', '30'))
+
+# (access_token, response JSON or the exception raised for that token)
+TokenResult = Tuple[str, Union[Dict[str, Any], Exception]]
+
+
+class PlaidTransport:
+    """Pooled, concurrent POSTs to the Plaid API"""
+
+    def __init__(self, client_id: Optional[str], secret: Optional[str],
+                 base_url: str = PLAID_BASE_URL,
+                 concurrency: int = PLAID_CONCURRENCY,
+                 timeout: float = PLAID_TIMEOUT_SECONDS,
+                 attempts: int = PLAID_RETRY_ATTEMPTS):
+        self.client_id = client_id
+        self.secret = secret
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.attempts = attempts
+        self.breakers = Breakers()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _http(self) -> httpx.AsyncClient:
+        # Created lazily so the pool belongs to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.concurrency,
+                    max_keepalive_connections=self.concurrency,
+                ),
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._client
+
+    async def post(self, path: str, access_token: str, **payload) -> Dict[str, Any]:
+        """POST one Plaid endpoint for one access token and return the JSON body
+
+        Raises CircuitOpenError without calling Plaid while the token's bank is down.
+        """
+        labels = (path, token_label(access_token))
+        breaker = self.breakers.get(access_token)
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            plaid_rejected.inc(labels)
+            raise
+        try:
+            response = await self._post_with_retry(path, access_token, labels, payload)
+        except Exception as e:
+            breaker.record(e)
+            raise
+        except BaseException:
+            breaker.abandon()
+            raise
+        breaker.record()
+        return response
+
+    async def _post_with_retry(self, path: str, access_token: str, labels: tuple, payload: dict) -> Dict[str, Any]:
+        deadline = time.perf_counter() + self.timeout
+        attempt = 1
+        while True:
+            try:
+                return await self._post_once(path, access_token, labels, payload,
+                                             deadline - time.perf_counter())
+            except Exception as e:
+                if attempt >= self.attempts or not is_transient(e):
+                    raise
+                delay = backoff_delay(attempt, e)
+                # Retries share the call's timeout rather than each getting a new one
+                if time.perf_counter() + delay >= deadline:
+                    raise
+                plaid_retries.inc(labels + (error_label(e),))
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _post_once(self, path: str, access_token: str, labels: tuple, payload: dict,
+                         timeout: float) -> Dict[str, Any]:
+        http = self._http()
+        body = {
+            'client_id': self.client_id,
+            'secret': self.secret,
+            'access_token': access_token,
+            **payload,
+        }
+        async with self._semaphore:
+            started = time.perf_counter()
+            try:
+                r = await http.post(path, json=body, timeout=timeout)
+            except Exception as e:
+                plaid_errors.inc(labels + (type(e).__name__,))
+                raise
+            finally:
+                plaid_request_seconds.observe(labels, time.perf_counter() - started)
+        if r.is_error:
+            plaid_errors.inc(labels + (str(r.status_code),))
+        r.raise_for_status()
+        return r.json()
+
+    def health(self, access_tokens: List[str]) -> Dict[str, dict]:
+        """Circuit breaker state per linked item"""
+        return self.breakers.health(access_tokens)
+
+    async def fan_out(self, path: str, access_tokens: List[str], **payload) -> List[TokenResult]:
+        """POST the same endpoint for every token concurrently, in token order"""
+        results = await asyncio.gather(
+            *(self.post(path, token, **payload) for token in access_tokens),
+            return_exceptions=True,
+        )
+        return list(zip(access_tokens, results))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,55 @@
+"""
+In-process scheduler for the 4am CST daily and weekly rollovers.
+
+Rather than checking for expired messages or a new week on every request, the
+rollover job runs once at startup (catching up on any boundaries missed while
+the server was down) and then again exactly at each boundary reported by
+get_time_until_reset(). The job must be idempotent: it is safe to run it
+several times for the same day or week, including across restarts.
+"""
+
+import asyncio
+import inspect
+from typing import Callable, Optional
+
+# Wake slightly after the boundary so the new day/week is already current
+BOUNDARY_SLACK_SECONDS = 1
+
+
+class ResetScheduler:
+    """Runs a rollover job at startup and at every daily/weekly reset boundary"""
+
+    def __init__(self, job: Callable[[], object], time_until_reset: Callable[[], dict]):
+        self.job = job
+        self.time_until_reset = time_until_reset
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_now(self):
+        """Run the job once; it may be a plain function or a coroutine function"""
+        try:
+            result = self.job()
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            print(f"Error running scheduled rollover: {str(e)}")
+
+    def seconds_until_next_boundary(self) -> int:
+        timers = self.time_until_reset()
+        return min(timers['daily_reset_in_seconds'], timers['weekly_reset_in_seconds'])
+
+    async def _loop(self):
+        # Catch up on anything missed while the server was down
+        await self.run_now()
+        while True:
+            await asyncio.sleep(max(0, self.seconds_until_next_boundary()) + BOUNDARY_SLACK_SECONDS)
+            await self.run_now()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Serialization for the data stores and HTTP responses.
+
+dumps()/loads() are the fast JSON path: orjson (listed in requirements.txt),
+or the stdlib's C encoder with compact separators where it is not installed. FastJSONResponse
+renders API responses with it.
+
+Stores can also be kept as binary snapshots (STORE_FORMAT=snapshot) instead
+of pretty-printed JSON. A snapshot is
+
+    MAGIC (8 bytes) | header length (uint32, little-endian) | header | sections
+
+where the header is compact JSON listing each top-level key of the store as
+a section with its offset, length and whether it is zlib-compressed.
+Sections hold compact JSON; those smaller than SNAPSHOT_COMPRESS_MIN_BYTES
+are stored uncompressed. Stores decode every section when they load;
+SnapshotReader reads one section at a time, for the `info` command and
+serialization_benchmark.py.
+
+    python serialization.py export messages.snap [messages.json]   # human-readable JSON
+    python serialization.py import messages.json [messages.snap]
+    python serialization.py info messages.snap
+"""
+
+import json
+import os
+import struct
+import sys
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback
+    orjson = None
+
+CODEC = 'orjson' if orjson is not None else 'json'
+
+SNAPSHOT_MAGIC = b'DSNAP01\n'
+SNAPSHOT_EXTENSION = '.snap'
+SNAPSHOT_COMPRESS_MIN_BYTES = int(os.getenv('SNAPSHOT_COMPRESS_MIN_BYTES', '4096'))
+SNAPSHOT_COMPRESS_LEVEL = 1
+
+_HEADER_LENGTH = struct.Struct('<I')
+
+# orjson only encodes integers in this range; stores hold nothing larger, whichever codec is in use
+MIN_INT, MAX_INT = -2 ** 63, 2 ** 64 - 1
+
+
+# JSON
+
+def dumps(obj: Any) -> bytes:
+    """Compact JSON as UTF-8 bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def dumps_pretty(obj: Any) -> bytes:
+    """Indented JSON as UTF-8 bytes, for files people read"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, indent=2).encode()
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encodable_ints(value: Any) -> bool:
+    """False if value holds an integer outside MIN_INT..MAX_INT"""
+    if isinstance(value, bool):
+        return True
+    if isinstance(value, int):
+        return MIN_INT <= value <= MAX_INT
+    if isinstance(value, dict):
+        return all(encodable_ints(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return all(encodable_ints(item) for item in value)
+    return True
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with dumps()"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# Snapshots
+
+def snapshot_filename(json_filename: str) -> str:
+    """messages.json -> messages.snap"""
+    return os.path.splitext(json_filename)[0] + SNAPSHOT_EXTENSION
+
+
+def is_snapshot(blob: bytes) -> bool:
+    return blob[:len(SNAPSHOT_MAGIC)] == SNAPSHOT_MAGIC
+
+
+def encode_snapshot(data: Dict[str, Any]) -> bytes:
+    """One section per top-level key, behind a header that indexes them"""
+    sections, payloads, offset = [], [], 0
+    for name, value in data.items():
+        payload = dumps(value)
+        compressed = len(payload) >= SNAPSHOT_COMPRESS_MIN_BYTES
+        if compressed:
+            payload = zlib.compress(payload, SNAPSHOT_COMPRESS_LEVEL)
+        sections.append([name, offset, len(payload), compressed])
+        payloads.append(payload)
+        offset += len(payload)
+    header = dumps({'format': 1, 'sections': sections})
+    return b''.join([SNAPSHOT_MAGIC, _HEADER_LENGTH.pack(len(header)), header, *payloads])
+
+
+def _parse_header(prefix: bytes) -> tuple:
+    """(sections, offset of the first section) from the start of a snapshot"""
+    if not is_snapshot(prefix):
+        raise ValueError("not a snapshot file")
+    start = len(SNAPSHOT_MAGIC) + _HEADER_LENGTH.size
+    (header_length,) = _HEADER_LENGTH.unpack_from(prefix, len(SNAPSHOT_MAGIC))
+    header = prefix[start:start + header_length]
+    if len(header) < header_length:
+        raise ValueError("truncated snapshot header")
+    return loads(header)['sections'], start + header_length
+
+
+def _decode_section(payload: bytes, compressed: bool) -> Any:
+    try:
+        return loads(zlib.decompress(payload) if compressed else payload)
+    except zlib.error as e:
+        raise ValueError(f"corrupt snapshot section: {e}")
+
+
+def decode_snapshot(blob: bytes, names: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """The store's data (or just the named sections) from snapshot bytes"""
+    sections, base = _parse_header(blob)
+    wanted = None if names is None else set(names)
+    data = {}
+    for name, offset, length, compressed in sections:
+        if wanted is None or name in wanted:
+            payload = blob[base + offset:base + offset + length]
+            if len(payload) < length:
+                raise ValueError(f"truncated snapshot section {name!r}")
+            data[name] = _decode_section(payload, compressed)
+    return data
+
+
+class SnapshotReader:
+    """Reads a snapshot file's header, then individual sections on demand"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            prefix = f.read(len(SNAPSHOT_MAGIC) + _HEADER_LENGTH.size)
+            if not is_snapshot(prefix):
+                raise ValueError(f"{filename} is not a snapshot file")
+            (header_length,) = _HEADER_LENGTH.unpack_from(prefix, len(SNAPSHOT_MAGIC))
+            prefix += f.read(header_length)
+        sections, self._base = _parse_header(prefix)
+        self._sections = {name: (offset, length, compressed) for name, offset, length, compressed in sections}
+
+    @property
+    def sections(self) -> List[str]:
+        return list(self._sections)
+
+    def section_size(self, name: str) -> int:
+        return self._sections[name][1]
+
+    def section(self, name: str) -> Any:
+        """Decode one top-level key, reading only its bytes"""
+        offset, length, compressed = self._sections[name]
+        with open(self.filename, 'rb') as f:
+            f.seek(self._base + offset)
+            payload = f.read(length)
+        if len(payload) < length:
+            raise ValueError(f"truncated snapshot section {name!r}")
+        return _decode_section(payload, compressed)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command == 'export' and len(sys.argv) > 2:
+        with open(sys.argv[2], 'rb') as f:
+            text = json.dumps(decode_snapshot(f.read()), indent=2)
+        if len(sys.argv) > 3:
+            with open(sys.argv[3], 'w') as f:
+                f.write(text)
+        else:
+            print(text)
+    elif command == 'import' and len(sys.argv) > 2:
+        target = sys.argv[3] if len(sys.argv) > 3 else snapshot_filename(sys.argv[2])
+        with open(sys.argv[2], 'rb') as f:
+            blob = encode_snapshot(loads(f.read()))
+        with open(target, 'wb') as f:
+            f.write(blob)
+        print(f"Wrote {target} ({len(blob)} bytes, was {os.path.getsize(sys.argv[2])})")
+    elif command == 'info' and len(sys.argv) > 2:
+        reader = SnapshotReader(sys.argv[2])
+        for name in reader.sections:
+            print(f"{name}: {reader.section_size(name)} bytes")
+    else:
+        print("Usage: python serialization.py export FILE.snap [FILE.json] | import FILE.json [FILE.snap] | info FILE.snap")
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Size and time of the store file formats and response encoders.
+
+Builds realistic store contents with synthetic_data.py and, for each store,
+measures file size and encode/decode time of the pretty-printed stdlib JSON
+the stores used to write, the fast JSON path (orjson if installed) and the
+binary snapshot format, plus reading a single snapshot section. It also
+times rendering a large API response with Starlette's JSONResponse against
+FastJSONResponse.
+
+    python serialization_benchmark.py --years 5 --spending 100000 --output serialization.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+from typing import Callable, Dict
+
+from fastapi.responses import JSONResponse
+
+from metric_history import HISTORY_DIR, MetricHistory
+from serialization import (CODEC, FastJSONResponse, SnapshotReader, decode_snapshot, dumps_pretty,
+                           encode_snapshot, loads)
+from spending_storage import open_spending_storage
+from synthetic_data import generate
+
+
+def best_of(repeat: int, fn: Callable) -> float:
+    """Fastest of `repeat` runs, in milliseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return round(best * 1000, 3)
+
+
+def store_contents(directory: str) -> Dict[str, dict]:
+    """Each store's data as it would sit in memory, from a generated data directory"""
+    with open(os.path.join(directory, 'messages.json')) as f:
+        messages = json.load(f)
+    with open(os.path.join(directory, 'current_metrics.json')) as f:
+        metrics = json.load(f)
+    storage = open_spending_storage(directory=directory)
+    spending = {'transactions': list(storage.all())}
+    storage.close()
+    # The legacy analytics_data.json layout: a long history next to a small current week
+    analytics = {
+        'weekly_history': MetricHistory(os.path.join(directory, HISTORY_DIR)).weeks_between(),
+        'current_week': metrics['current_week'],
+    }
+    return {'messages': messages, 'current_metrics': metrics, 'spending': spending, 'analytics': analytics}
+
+
+def measure_store(name: str, data: dict, directory: str, repeat: int) -> dict:
+    formats = {
+        'json_stdlib_indent': (lambda: json.dumps(data, indent=2).encode(), json.loads),
+        f"json_{CODEC}_indent": (lambda: dumps_pretty(data), loads),
+        'snapshot': (lambda: encode_snapshot(data), decode_snapshot),
+    }
+    results = {}
+    for format_name, (encode, decode) in formats.items():
+        blob = encode()
+        results[format_name] = {
+            'bytes': len(blob),
+            'encode_ms': best_of(repeat, encode),
+            'decode_ms': best_of(repeat, lambda: decode(blob)),
+        }
+
+    # Lazy load: only the smallest section of the snapshot
+    filename = os.path.join(directory, f"{name}.snap")
+    with open(filename, 'wb') as f:
+        f.write(encode_snapshot(data))
+    reader = SnapshotReader(filename)
+    section = min(reader.sections, key=reader.section_size)
+    results['snapshot_one_section'] = {
+        'section': section,
+        'bytes': reader.section_size(section),
+        'decode_ms': best_of(repeat, lambda: SnapshotReader(filename).section(section)),
+    }
+    return results
+
+
+def measure_responses(data: dict, repeat: int) -> dict:
+    return {
+        'JSONResponse_ms': best_of(repeat, lambda: JSONResponse(data)),
+        'FastJSONResponse_ms': best_of(repeat, lambda: FastJSONResponse(data)),
+    }
+
+
+def format_results(results: dict) -> str:
+    lines = [f"{'store':<16} {'format':<24} {'bytes':>12} {'encode ms':>10} {'decode ms':>10}"]
+    for store, formats in results['stores'].items():
+        for format_name, result in formats.items():
+            lines.append(f"{store:<16} {format_name:<24} {result['bytes']:>12} "
+                         f"{result.get('encode_ms', ''):>10} {result['decode_ms']:>10}")
+    responses = results['responses']
+    lines.append(f"spending response: JSONResponse {responses['JSONResponse_ms']}ms, "
+                 f"FastJSONResponse {responses['FastJSONResponse_ms']}ms")
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--years', type=float, default=3, help='years of metric history and spending')
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--spending', type=int, default=50000, help='spending transactions')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement (the fastest is kept)')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='dashboard-serialization-')
+    try:
+        generate(directory, args.years, args.messages, args.spending, banks=0, seed=args.seed)
+        stores = store_contents(directory)
+        results = {
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'codec': CODEC,
+                'python': platform.python_version(),
+                'args': vars(args),
+            },
+            'stores': {name: measure_store(name, data, directory, args.repeat) for name, data in stores.items()},
+            'responses': measure_responses(stores['spending'], args.repeat),
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(format_results(results))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
@@ -0,0 +1,198 @@
+"""
+CSV import and export of spending transactions.
+
+The CSV columns are the SpendingTransaction fields: id, date, amount, tag and
+person. Only amount, tag and person are required; id and date are filled in
+like a POST /api/spending/transactions would. Dates must be ISO
+(YYYY-MM-DD, optionally with a time). A row whose id already exists is
+reported as an error rather than imported, so re-importing an export is a
+no-op. Extra columns are ignored.
+
+CsvImportParser is fed the request body a chunk at a time and hands back the
+rows it could validate plus a per-row error for the rest, so a large upload
+is parsed as it arrives. Export goes the other way: csv_chunks() turns the
+storage's iter_chunks() into CSV text one chunk at a time.
+"""
+
+import codecs
+import csv
+import io
+import re
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, List, Optional, Set
+
+CSV_FIELDS = ['id', 'date', 'amount', 'tag', 'person']
+REQUIRED_FIELDS = ['amount', 'tag', 'person']
+# Per-row errors included in an import report; the count is always exact
+MAX_REPORTED_ERRORS = 100
+# ISO dates, optionally with a time, as the month filters and aggregates expect
+ISO_DATE = re.compile(r'\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}\S*)?$')
+
+
+def validate_date(value: str) -> str:
+    if not ISO_DATE.match(value):
+        raise ValueError(f"date is not YYYY-MM-DD[THH:MM...]: {value!r}")
+    try:
+        datetime.strptime(value[:10], '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"date is not a valid day: {value!r}")
+    return value
+
+
+def validate_row(row: dict) -> dict:
+    """A transaction dict from one CSV row; raises ValueError describing the first problem"""
+    missing = [field for field in REQUIRED_FIELDS if not (row.get(field) or '').strip()]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    try:
+        amount = float(row['amount'])
+    except ValueError:
+        raise ValueError(f"amount is not a number: {row['amount']!r}")
+    if amount != amount or amount in (float('inf'), float('-inf')):
+        raise ValueError(f"amount is not a finite number: {row['amount']!r}")
+    date = (row.get('date') or '').strip()
+    transaction = {
+        'amount': amount,
+        'tag': row['tag'].strip(),
+        'person': row['person'].strip(),
+        'date': validate_date(date) if date else None,
+        'id': (row.get('id') or '').strip() or None,
+    }
+    return transaction
+
+
+class CsvImportParser:
+    """Incremental CSV parser: feed() bytes, get back validated rows and row errors"""
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self._pending = ''
+        self._record = ''
+        self._header: Optional[List[str]] = None
+        self.line = 0
+        self.rows = 0
+        self.error_count = 0
+        self.errors: List[dict] = []
+        # CSV line of each transaction returned so far, in order
+        self.lines: List[int] = []
+
+    def feed(self, data: bytes, final: bool = False) -> List[dict]:
+        """Parse every complete record in data, returning the valid transactions"""
+        text = self._pending + self._decoder.decode(data, final)
+        lines = text.split('\n')
+        self._pending = '' if final else lines.pop()
+        if final and lines and lines[-1] == '':
+            lines.pop()
+        return self._parse(lines, final)
+
+    def close(self) -> List[dict]:
+        return self.feed(b'', final=True)
+
+    def _parse(self, lines: List[str], final: bool) -> List[dict]:
+        transactions = []
+        for line in lines:
+            self.line += 1
+            self._record += line + '\n'
+            # An odd number of quotes means a quoted field continues on the next line
+            if self._record.count('"') % 2 and not final:
+                continue
+            record, self._record = self._record, ''
+            if not record.strip():
+                continue
+            try:
+                values = next(csv.reader(io.StringIO(record)))
+            except csv.Error as e:
+                self._error(str(e))
+                continue
+            if self._header is None:
+                self._header = [name.strip() for name in values]
+                missing = [field for field in REQUIRED_FIELDS if field not in self._header]
+                if missing:
+                    raise ValueError(f"CSV header is missing {', '.join(missing)}")
+                continue
+            self.rows += 1
+            try:
+                transactions.append(validate_row(dict(zip(self._header, values))))
+                self.lines.append(self.line)
+            except ValueError as e:
+                self._error(str(e))
+        if final and self._record.strip():
+            self._error("unterminated quoted field")
+            self._record = ''
+        return transactions
+
+    def _error(self, message: str, line: Optional[int] = None):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': self.line if line is None else line, 'error': message})
+
+    def reject_taken_ids(self, transactions: List[dict],
+                         existing_ids: Callable[[List[str]], Set[str]]) -> List[dict]:
+        """Drop rows whose id already exists (or repeats an earlier row), reporting each as a row error
+
+        transactions must be every row feed() and close() returned, in order.
+        Re-importing an export therefore adds nothing instead of duplicating it.
+        """
+        taken = existing_ids([t['id'] for t in transactions if t['id']])
+        kept = []
+        for transaction, line in zip(transactions, self.lines):
+            if transaction['id'] and transaction['id'] in taken:
+                self._error(f"id already exists: {transaction['id']!r}", line)
+                continue
+            if transaction['id']:
+                taken.add(transaction['id'])
+            kept.append(transaction)
+        self.errors.sort(key=lambda error: error['line'])
+        return kept
+
+
+def fill_defaults(transactions: List[dict], first_id: int, now: str):
+    """Give rows without an id or date sequential ids from first_id and the current time"""
+    for offset, transaction in enumerate(transactions):
+        transaction['id'] = transaction['id'] or str(first_id + offset)
+        transaction['date'] = transaction['date'] or now
+
+
+def csv_chunks(chunks: Iterable[List[dict]]) -> Iterator[str]:
+    """CSV text (header first) for transaction chunks, one string per chunk"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS, extrasaction='ignore', lineterminator='\n')
+    writer.writeheader()
+    yield buffer.getvalue()
+    for chunk in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+
+
+if __name__ == "__main__":
+    import sys
+
+    from periods import periods
+    from spending_storage import open_spending_storage
+
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command == 'import' and len(sys.argv) > 2:
+        storage = open_spending_storage()
+        parser = CsvImportParser()
+        transactions = []
+        with open(sys.argv[2], 'rb') as f:
+            for block in iter(lambda: f.read(1 << 16), b''):
+                transactions.extend(parser.feed(block))
+        transactions.extend(parser.close())
+        transactions = parser.reject_taken_ids(transactions, storage.existing_ids)
+        fill_defaults(transactions, storage.count() + int(periods.now().timestamp()), periods.now().isoformat())
+        storage.create_many(transactions)
+        for error in parser.errors:
+            print(f"line {error['line']}: {error['error']}")
+        print(f"Imported {len(transactions)} of {parser.rows} rows, {parser.error_count} errors")
+        storage.close()
+    elif command == 'export':
+        storage = open_spending_storage()
+        out = open(sys.argv[2], 'w', newline='') if len(sys.argv) > 2 else sys.stdout
+        for text in csv_chunks(storage.iter_chunks()):
+            out.write(text)
+        storage.close()
+    else:
+        print("Usage: python spending_csv.py import FILE.csv | export [FILE.csv]")
@@ -0,0 +1,155 @@
+"""
+Materialized monthly spending aggregates.
+
+Instead of walking every transaction on each /api/spending/stats request, the
+spending storage keeps per-month totals by tag and person plus a transaction
+count, and applies a delta to them whenever a transaction is created, updated
+or deleted. An update that changes the date or tag moves the amount from the
+old bucket to the new one.
+
+Run `python spending_stats.py verify` to recompute the aggregates from scratch
+and compare them with the stored ones, or `python spending_stats.py rebuild`
+to replace them.
+"""
+
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from periods import PeriodEngine, periods
+
+# Tags and people reported by /api/spending/stats
+STATS_TAGS = ['necessities', 'eating out', 'fun', 'clothes']
+STATS_PEOPLE = ['ben', 'sydney']
+
+# (month, dimension, key, delta) where dimension is 'tag', 'person' or 'count'
+Delta = Tuple[str, str, str, float]
+
+
+def transaction_month(transaction: dict) -> Optional[str]:
+    """The YYYY-MM bucket a transaction is counted in, or None if it has no date"""
+    date_str = transaction.get('date') or ''
+    if not date_str:
+        return None
+    return date_str[:7] if len(date_str) >= 7 else periods.now().strftime('%Y-%m')
+
+
+def transaction_deltas(transaction: dict, sign: int = 1) -> List[Delta]:
+    """Aggregate changes from adding (sign=1) or removing (sign=-1) a transaction"""
+    month = transaction_month(transaction)
+    if month is None:
+        return []
+    amount = float(transaction.get('amount') or 0) * sign
+    return [
+        (month, 'tag', transaction.get('tag') or '', amount),
+        (month, 'person', transaction.get('person') or '', amount),
+        (month, 'count', '', sign),
+    ]
+
+
+class MonthlyAggregates:
+    """Per-month totals by tag and person plus transaction counts"""
+
+    def __init__(self):
+        self.months: Dict[str, Dict[str, Dict[str, float]]] = {}
+
+    @classmethod
+    def from_transactions(cls, transactions: Iterable[dict]) -> 'MonthlyAggregates':
+        """Aggregate every transaction in one vectorized pass (same buckets as transaction_deltas)"""
+        transactions = [t for t in transactions if t.get('date')]
+        aggregates = cls()
+        if not transactions:
+            return aggregates
+        # Bucket by the raw date[:7] like transaction_month, so odd date strings land where
+        # the per-row deltas put them
+        months = np.asarray([t['date'] for t in transactions], dtype=str).astype('U7')
+        months[np.char.str_len(months) < 7] = periods.now().strftime('%Y-%m')
+        month_keys, month_index = np.unique(months, return_inverse=True)
+        month_keys = month_keys.tolist()
+        amounts = np.array([float(t.get('amount') or 0) for t in transactions])
+
+        for dimension in ('tag', 'person'):
+            keys, key_index = np.unique(np.array([t.get(dimension) or '' for t in transactions], dtype=str),
+                                        return_inverse=True)
+            keys = keys.tolist()
+            # One group per (month, key) pair, without joining them into strings
+            groups, sums = PeriodEngine.group_sums(month_index * len(keys) + key_index, amounts)
+            aggregates.apply(
+                (month_keys[group // len(keys)], dimension, keys[group % len(keys)], total)
+                for group, total in zip(groups.tolist(), sums.tolist())
+            )
+        counts = np.bincount(month_index, minlength=len(month_keys))
+        aggregates.apply((month, 'count', '', int(count)) for month, count in zip(month_keys, counts))
+        return aggregates
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Delta]) -> 'MonthlyAggregates':
+        aggregates = cls()
+        aggregates.apply(rows)
+        return aggregates
+
+    def apply(self, deltas: Iterable[Delta]):
+        for month, dimension, key, delta in deltas:
+            bucket = self.months.setdefault(month, {'tag': {}, 'person': {}, 'count': {}})
+            bucket[dimension][key] = bucket[dimension].get(key, 0) + delta
+
+    def rows(self) -> List[Delta]:
+        return [
+            (month, dimension, key, total)
+            for month, bucket in self.months.items()
+            for dimension, totals in bucket.items()
+            for key, total in totals.items()
+        ]
+
+    def to_stats(self) -> dict:
+        """The /api/spending/stats payload"""
+        monthly_stats = {}
+        for month, bucket in self.months.items():
+            count = int(bucket['count'].get('', 0))
+            if count <= 0:
+                # Every transaction of the month has been removed
+                continue
+            stats = {
+                'total_by_tag': {tag: round(bucket['tag'].get(tag, 0), 6) for tag in STATS_TAGS},
+                'total_by_person': {person: round(bucket['person'].get(person, 0), 6) for person in STATS_PEOPLE},
+                'transaction_count': count,
+            }
+            stats['avg_by_tag'] = {
+                tag: stats['total_by_tag'][tag] / max(1, count)
+                for tag in STATS_TAGS
+            }
+            monthly_stats[month] = stats
+        return monthly_stats
+
+
+def diff_aggregates(stored: MonthlyAggregates, expected: MonthlyAggregates, tolerance: float = 1e-6) -> List[str]:
+    """Human-readable differences between stored and freshly computed aggregates"""
+    stored_rows = {row[:3]: row[3] for row in stored.rows()}
+    expected_rows = {row[:3]: row[3] for row in expected.rows()}
+    problems = []
+    for key in sorted(set(stored_rows) | set(expected_rows)):
+        have = stored_rows.get(key, 0)
+        want = expected_rows.get(key, 0)
+        if abs(have - want) > tolerance:
+            problems.append(f"{'/'.join(key)}: stored {have}, expected {want}")
+    return problems
+
+
+if __name__ == "__main__":
+    from spending_storage import open_spending_storage
+
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    storage = open_spending_storage()
+    if command == 'verify':
+        problems = storage.verify_stats()
+        for problem in problems:
+            print(problem)
+        print(f"{len(problems)} mismatched aggregates")
+        sys.exit(1 if problems else 0)
+    elif command == 'rebuild':
+        storage.rebuild_stats()
+        print("Rebuilt spending aggregates")
+    else:
+        print("Usage: python spending_stats.py verify|rebuild")
+    storage.close()
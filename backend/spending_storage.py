@@ -0,0 +1,543 @@
+"""
+Pluggable storage for spending transactions.
+
+Two backends share one interface:
+- JsonSpendingStorage keeps the original spending.json file (via JsonStore)
+- SqliteSpendingStorage keeps transactions in an indexed SQLite database in
+  WAL mode, so month queries and edits stay fast with hundreds of thousands
+  of rows
+
+The backend is chosen with SPENDING_BACKEND ('sqlite' or 'json'). The first
+time the SQLite backend opens an empty database it imports spending.json.
+Both backends keep the monthly aggregates from spending_stats.py up to date on
+every create, update and delete, and expose a `version` string that changes
+whenever the transactions may have changed.
+
+Transactions are listed newest first, ordered by (date, id). page() returns
+one keyset page before and/or after a (date, id) cursor, and iter_chunks()
+walks every matching row a chunk at a time for streaming.
+
+Run `python spending_storage.py migrate` to perform the migration by hand.
+"""
+
+import base64
+import heapq
+import json
+import os
+import sqlite3
+import sys
+import threading
+import uuid
+from contextlib import contextmanager, nullcontext
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+from instrumentation import store_io
+from spending_stats import MonthlyAggregates, diff_aggregates, transaction_deltas
+from store import JsonStore
+
+SPENDING_BACKEND = os.getenv('SPENDING_BACKEND', 'sqlite')
+SPENDING_JSON_FILE = 'spending.json'
+SPENDING_DB_FILE = os.getenv('SPENDING_DB_FILE', 'spending.db')
+
+# Columns of a SpendingTransaction; any other keys set through PUT are kept in `extra`
+TRANSACTION_FIELDS = ['id', 'amount', 'tag', 'person', 'date']
+# Rows fetched per round trip when streaming every matching transaction
+STREAM_CHUNK_SIZE = 500
+
+# (date, id) position of a transaction in newest-first order
+Cursor = Tuple[str, str]
+
+
+def month_range(month: str):
+    """Bounds for an indexed prefix match on ISO date strings"""
+    return month, month + '\x7f'
+
+
+def sort_key(transaction: dict) -> Cursor:
+    return transaction.get('date') or '', str(transaction.get('id') or '')
+
+
+def encode_cursor(transaction: dict) -> str:
+    """Opaque cursor naming a transaction's position"""
+    return base64.urlsafe_b64encode(json.dumps(sort_key(transaction)).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Inverse of encode_cursor; raises ValueError for anything else"""
+    try:
+        date, transaction_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    return str(date), str(transaction_id)
+
+
+class DuplicateIdError(ValueError):
+    """An update would give a transaction an id another transaction already has"""
+
+
+class JsonSpendingStorage:
+    """Transactions kept in spending.json"""
+
+    def __init__(self, filename: str = SPENDING_JSON_FILE):
+        self.store = JsonStore(filename, {'transactions': []})
+        self._aggregates_data = None
+        self._aggregates_cache = MonthlyAggregates()
+
+    def _aggregates(self) -> MonthlyAggregates:
+        data = self.store.data
+        if self._aggregates_data is not data:
+            # First use, or the file was reloaded after an external edit
+            self._aggregates_cache = MonthlyAggregates.from_transactions(data.get('transactions', []))
+            self._aggregates_data = data
+        return self._aggregates_cache
+
+    @property
+    def version(self) -> str:
+        return f"{self.store.instance}.{self.store.version}"
+
+    def count(self) -> int:
+        return len(self.store.data['transactions'])
+
+    def _matching(self, month: Optional[str], person: Optional[str], tag: Optional[str],
+                  before: Optional[Cursor], after: Optional[Cursor]) -> Iterator[dict]:
+        for t in self.store.data.get('transactions', []):
+            if month and not (t.get('date') or '').startswith(month):
+                continue
+            if (person and t.get('person') != person) or (tag and t.get('tag') != tag):
+                continue
+            if (before and sort_key(t) >= before) or (after and sort_key(t) <= after):
+                continue
+            yield t
+
+    def list(self, month: Optional[str] = None) -> List[dict]:
+        """Transactions (optionally for one YYYY-MM month), newest first"""
+        return self.page(month)
+
+    def page(self, month: Optional[str] = None, person: Optional[str] = None, tag: Optional[str] = None,
+             before: Optional[Cursor] = None, after: Optional[Cursor] = None,
+             limit: Optional[int] = None) -> List[dict]:
+        """Up to `limit` matching transactions, newest first; with only `after`, the oldest ones newer than it"""
+        matching = self._matching(month, person, tag, before, after)
+        if limit is None:
+            return sorted(matching, key=sort_key, reverse=True)
+        if after and not before:
+            return heapq.nsmallest(limit, matching, key=sort_key)[::-1]
+        return heapq.nlargest(limit, matching, key=sort_key)
+
+    def iter_chunks(self, month: Optional[str] = None, person: Optional[str] = None, tag: Optional[str] = None,
+                    before: Optional[Cursor] = None, after: Optional[Cursor] = None,
+                    chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[List[dict]]:
+        """Every matching transaction, newest first, in lists of at most chunk_size"""
+        # The file is already in memory; one sort of references is cheaper than keyset rescans
+        transactions = self.page(month, person, tag, before, after)
+        for start in range(0, len(transactions), chunk_size):
+            yield transactions[start:start + chunk_size]
+
+    def all(self) -> Iterator[dict]:
+        return iter(list(self.store.data.get('transactions', [])))
+
+    def existing_ids(self, transaction_ids: Iterable[str]) -> Set[str]:
+        """Which of these ids are already taken"""
+        return set(transaction_ids) & {t['id'] for t in self.store.data['transactions']}
+
+    def get(self, transaction_id: str) -> Optional[dict]:
+        for transaction in self.store.data['transactions']:
+            if transaction['id'] == transaction_id:
+                return transaction
+        return None
+
+    def create(self, transaction: dict) -> dict:
+        aggregates = self._aggregates()
+        self.store.data['transactions'].append(transaction)
+        aggregates.apply(transaction_deltas(transaction))
+        self.store.save()
+        return transaction
+
+    def create_many(self, transactions: List[dict]) -> List[dict]:
+        """Append many transactions with a single save"""
+        aggregates = self._aggregates()
+        self.store.data['transactions'].extend(transactions)
+        aggregates.apply(MonthlyAggregates.from_transactions(transactions).rows())
+        self.store.save()
+        return transactions
+
+    def update(self, transaction_id: str, updates: dict) -> Optional[dict]:
+        aggregates = self._aggregates()
+        transaction = self.get(transaction_id)
+        if transaction is None:
+            return None
+        new_id = updates.get('id', transaction_id)
+        if new_id != transaction_id and self.existing_ids([new_id]):
+            raise DuplicateIdError(new_id)
+        old_transaction = dict(transaction)
+        transaction.update(updates)
+        aggregates.apply(transaction_deltas(old_transaction, -1) + transaction_deltas(transaction))
+        self.store.save()
+        return transaction
+
+    def delete(self, transaction_id: str) -> Optional[dict]:
+        aggregates = self._aggregates()
+        transaction = self.get(transaction_id)
+        if transaction is None:
+            return None
+        data = self.store.data
+        data['transactions'] = [t for t in data['transactions'] if t['id'] != transaction_id]
+        aggregates.apply(transaction_deltas(transaction, -1))
+        self.store.save()
+        return transaction
+
+    @contextmanager
+    def transaction(self):
+        """Group several writes; the file and aggregates are restored if the block raises"""
+        with self.store.transaction():
+            # A rollback replaces the data object, which makes _aggregates() rebuild
+            yield
+
+    def stats(self) -> dict:
+        """Monthly aggregates in the /api/spending/stats format"""
+        return self._aggregates().to_stats()
+
+    def rebuild_stats(self):
+        self._aggregates_data = None
+        self._aggregates()
+
+    def verify_stats(self) -> List[str]:
+        expected = MonthlyAggregates.from_transactions(self.store.data.get('transactions', []))
+        return diff_aggregates(self._aggregates(), expected)
+
+    def close(self):
+        self.store.close()
+
+
+class SqliteSpendingStorage:
+    """Transactions kept in SQLite, indexed by date, id and (person, tag)"""
+
+    def __init__(self, filename: str = SPENDING_DB_FILE):
+        self.filename = filename
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(filename, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.instance = uuid.uuid4().hex[:12]
+        # Bumped by our own commits and whenever data_version shows another connection's
+        self._version = 0
+        self._data_version = None
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS transactions (
+                id TEXT PRIMARY KEY,
+                amount REAL,
+                tag TEXT,
+                person TEXT,
+                date TEXT,
+                extra TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date);
+            CREATE INDEX IF NOT EXISTS idx_transactions_date_id ON transactions (date, id);
+            CREATE INDEX IF NOT EXISTS idx_transactions_person_tag ON transactions (person, tag);
+            CREATE TABLE IF NOT EXISTS monthly_aggregates (
+                month TEXT,
+                dimension TEXT,
+                key TEXT,
+                total REAL,
+                PRIMARY KEY (month, dimension, key)
+            );
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        ''')
+        if not self.conn.execute("SELECT 1 FROM meta WHERE key = 'aggregates_built'").fetchone():
+            self.rebuild_stats()
+
+    @staticmethod
+    def _to_row(transaction: dict) -> tuple:
+        extra = {k: v for k, v in transaction.items() if k not in TRANSACTION_FIELDS}
+        return (
+            transaction.get('id'),
+            transaction.get('amount'),
+            transaction.get('tag'),
+            transaction.get('person'),
+            transaction.get('date'),
+            json.dumps(extra) if extra else None,
+        )
+
+    @staticmethod
+    def _from_row(row: sqlite3.Row) -> dict:
+        transaction = {
+            'id': row['id'],
+            'amount': row['amount'],
+            'tag': row['tag'],
+            'person': row['person'],
+            'date': row['date'],
+        }
+        if row['extra']:
+            transaction.update(json.loads(row['extra']))
+        return transaction
+
+    @property
+    def version(self) -> str:
+        with self._lock:
+            data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+            if data_version != self._data_version:
+                self._data_version = data_version
+                self._version += 1
+            return f"{self.instance}.{self._version}"
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+
+    def list(self, month: Optional[str] = None) -> List[dict]:
+        """Transactions (optionally for one YYYY-MM month), newest first"""
+        return self.page(month)
+
+    def page(self, month: Optional[str] = None, person: Optional[str] = None, tag: Optional[str] = None,
+             before: Optional[Cursor] = None, after: Optional[Cursor] = None,
+             limit: Optional[int] = None) -> List[dict]:
+        """Up to `limit` matching transactions, newest first; with only `after`, the oldest ones newer than it"""
+        clauses, params = [], []
+        if month:
+            clauses.append('date >= ? AND date < ?')
+            params.extend(month_range(month))
+        if person:
+            clauses.append('person = ?')
+            params.append(person)
+        if tag:
+            clauses.append('tag = ?')
+            params.append(tag)
+        if before:
+            clauses.append('(date, id) < (?, ?)')
+            params.extend(before)
+        if after:
+            clauses.append('(date, id) > (?, ?)')
+            params.extend(after)
+        # Walk forwards from `after` so LIMIT keeps the rows closest to it
+        ascending = bool(after and not before)
+        order = 'ASC' if ascending else 'DESC'
+        sql = 'SELECT * FROM transactions'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += f' ORDER BY date {order}, id {order}'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        with self._lock, store_io(self.filename, 'query'):
+            transactions = [self._from_row(row) for row in self.conn.execute(sql, params)]
+        return transactions[::-1] if ascending else transactions
+
+    def iter_chunks(self, month: Optional[str] = None, person: Optional[str] = None, tag: Optional[str] = None,
+                    before: Optional[Cursor] = None, after: Optional[Cursor] = None,
+                    chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[List[dict]]:
+        """Every matching transaction, newest first, in lists of at most chunk_size"""
+        # Keyset pages: constant memory, and writers only wait for one chunk at a time
+        while True:
+            chunk = self.page(month, person, tag, before, after, chunk_size)
+            if chunk:
+                yield chunk
+            if len(chunk) < chunk_size:
+                return
+            before = sort_key(chunk[-1])
+
+    def all(self) -> Iterator[dict]:
+        with self._lock:
+            rows = self.conn.execute('SELECT * FROM transactions').fetchall()
+        return (self._from_row(row) for row in rows)
+
+    def get(self, transaction_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self.conn.execute('SELECT * FROM transactions WHERE id = ?', (transaction_id,)).fetchone()
+            return self._from_row(row) if row else None
+
+    def existing_ids(self, transaction_ids: Iterable[str]) -> Set[str]:
+        """Which of these ids are already taken"""
+        transaction_ids = list(transaction_ids)
+        taken = set()
+        with self._lock:
+            # Bounded batches stay under SQLite's bound-parameter limit
+            for start in range(0, len(transaction_ids), 500):
+                batch = transaction_ids[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT id FROM transactions WHERE id IN ({','.join('?' * len(batch))})", batch
+                )
+                taken.update(row[0] for row in rows)
+        return taken
+
+    def _unique_id(self, transaction_id: str) -> str:
+        # Ids are derived from a timestamp, so bump numeric ids until one is free
+        while self.conn.execute('SELECT 1 FROM transactions WHERE id = ?', (transaction_id,)).fetchone():
+            transaction_id = str(int(transaction_id) + 1) if transaction_id.isdigit() else transaction_id + '_'
+        return transaction_id
+
+    @contextmanager
+    def transaction(self):
+        """Group several writes into one SQLite transaction, rolled back if the block raises"""
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so another process can't interleave
+            with store_io(self.filename, 'commit'):
+                self.conn.execute('BEGIN IMMEDIATE')
+                try:
+                    yield
+                except BaseException:
+                    self.conn.execute('ROLLBACK')
+                    raise
+                self.conn.execute('COMMIT')
+            self._version += 1
+
+    def _write(self, statements, deltas):
+        """Run row changes and their aggregate deltas in one SQLite transaction"""
+        # Inside transaction() the caller commits; otherwise commit right away
+        with nullcontext() if self.conn.in_transaction else self.transaction():
+            for sql, params in statements:
+                self.conn.execute(sql, params)
+            self._apply_deltas(deltas)
+
+    def _apply_deltas(self, deltas):
+        self.conn.executemany(
+            '''INSERT INTO monthly_aggregates VALUES (?, ?, ?, ?)
+               ON CONFLICT (month, dimension, key) DO UPDATE SET total = total + excluded.total''',
+            deltas,
+        )
+        # Drop months whose last transaction was removed
+        self.conn.executemany(
+            '''DELETE FROM monthly_aggregates WHERE month = ? AND (
+                   SELECT total FROM monthly_aggregates WHERE month = ? AND dimension = 'count') <= 0''',
+            [(month, month) for month in {delta[0] for delta in deltas}],
+        )
+
+    def create(self, transaction: dict) -> dict:
+        with self._lock:
+            transaction['id'] = self._unique_id(transaction['id'])
+            self._write(
+                [('INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?)', self._to_row(transaction))],
+                transaction_deltas(transaction),
+            )
+            return transaction
+
+    def create_many(self, transactions: List[dict]) -> List[dict]:
+        """Insert many transactions and their aggregate deltas in one SQLite transaction"""
+        with self._lock, nullcontext() if self.conn.in_transaction else self.transaction():
+            for transaction in transactions:
+                # Checked row by row so ids repeated within the batch are bumped too
+                transaction['id'] = self._unique_id(transaction['id'])
+                self.conn.execute('INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?)', self._to_row(transaction))
+            self._apply_deltas(MonthlyAggregates.from_transactions(transactions).rows())
+            return transactions
+
+    def update(self, transaction_id: str, updates: dict) -> Optional[dict]:
+        with self._lock:
+            transaction = self.get(transaction_id)
+            if transaction is None:
+                return None
+            new_id = updates.get('id', transaction_id)
+            if new_id != transaction_id and self.existing_ids([new_id]):
+                raise DuplicateIdError(new_id)
+            old_transaction = dict(transaction)
+            transaction.update(updates)
+            self._write(
+                [(
+                    'UPDATE transactions SET id = ?, amount = ?, tag = ?, person = ?, date = ?, extra = ? WHERE id = ?',
+                    self._to_row(transaction) + (transaction_id,),
+                )],
+                transaction_deltas(old_transaction, -1) + transaction_deltas(transaction),
+            )
+            return transaction
+
+    def delete(self, transaction_id: str) -> Optional[dict]:
+        with self._lock:
+            transaction = self.get(transaction_id)
+            if transaction is not None:
+                self._write(
+                    [('DELETE FROM transactions WHERE id = ?', (transaction_id,))],
+                    transaction_deltas(transaction, -1),
+                )
+            return transaction
+
+    def _stored_aggregates(self) -> MonthlyAggregates:
+        rows = self.conn.execute('SELECT month, dimension, key, total FROM monthly_aggregates')
+        return MonthlyAggregates.from_rows(tuple(row) for row in rows)
+
+    def stats(self) -> dict:
+        """Monthly aggregates in the /api/spending/stats format"""
+        with self._lock:
+            return self._stored_aggregates().to_stats()
+
+    def rebuild_stats(self):
+        """Recompute the aggregates table from every transaction"""
+        with self._lock:
+            self.conn.execute('BEGIN')
+            try:
+                self._rebuild_aggregates()
+                self.conn.execute('COMMIT')
+                self._version += 1
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    def _rebuild_aggregates(self):
+        # Inside the caller's SQLite transaction
+        aggregates = MonthlyAggregates.from_transactions(self.all())
+        self.conn.execute('DELETE FROM monthly_aggregates')
+        self.conn.executemany('INSERT INTO monthly_aggregates VALUES (?, ?, ?, ?)', aggregates.rows())
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('aggregates_built', '1')")
+
+    def verify_stats(self) -> List[str]:
+        with self._lock:
+            expected = MonthlyAggregates.from_transactions(self.all())
+            return diff_aggregates(self._stored_aggregates(), expected)
+
+    def migrate_from_json(self, json_filename: str = SPENDING_JSON_FILE, force: bool = False) -> int:
+        """One-shot import of spending.json, returning the number of rows imported"""
+        with self._lock:
+            done = self.conn.execute("SELECT value FROM meta WHERE key = 'migrated_from_json'").fetchone()
+            if (done and not force) or not os.path.exists(json_filename):
+                return 0
+            with open(json_filename, 'r') as f:
+                transactions = json.load(f).get('transactions', [])
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Another worker may have migrated while we were reading the file
+                if not force and self.conn.execute(
+                        "SELECT 1 FROM meta WHERE key = 'migrated_from_json'").fetchone():
+                    self.conn.execute('ROLLBACK')
+                    return 0
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?)',
+                    [self._to_row(t) for t in transactions],
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('migrated_from_json', ?)", (json_filename,)
+                )
+                # In the same transaction, so the rows never commit without their aggregates
+                self._rebuild_aggregates()
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+            self._version += 1
+            return len(transactions)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def open_spending_storage(backend: str = SPENDING_BACKEND, directory: Optional[str] = None):
+    """Create the configured spending backend, migrating spending.json on first use"""
+    json_file = os.path.join(directory, SPENDING_JSON_FILE) if directory else SPENDING_JSON_FILE
+    db_file = os.path.join(directory, os.path.basename(SPENDING_DB_FILE)) if directory else SPENDING_DB_FILE
+    if backend == 'json':
+        return JsonSpendingStorage(json_file)
+    if backend == 'sqlite':
+        storage = SqliteSpendingStorage(db_file)
+        imported = storage.migrate_from_json(json_file)
+        if imported:
+            print(f"Migrated {imported} transactions from {json_file} to {db_file}")
+        return storage
+    raise ValueError(f"Unknown SPENDING_BACKEND: {backend}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'migrate':
+        storage = SqliteSpendingStorage()
+        count = storage.migrate_from_json(force='--force' in sys.argv)
+        print(f"Imported {count} transactions into {SPENDING_DB_FILE}")
+    else:
+        print("Usage: python spending_storage.py migrate [--force]")
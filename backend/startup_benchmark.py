@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark with an import-time budget.
+
+Measures, each in fresh processes:
+
+- how long `import main` takes, against --budget-ms (default
+  IMPORT_BUDGET_MS), and that modules in DEFERRED_MODULES (the Plaid SDK)
+  are not imported with it
+- how long uvicorn takes from process start to answering /api/health,
+  with FAST_START on and off, on a synthetic data set
+
+and lists the slowest imports from `python -X importtime`. Exits non-zero
+if the import budget is exceeded or a deferred module is imported eagerly,
+so it can gate deploys:
+
+    python startup_benchmark.py --runs 5 --output startup.json
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+# Median `import main` time allowed, in milliseconds
+IMPORT_BUDGET_MS = float(os.getenv('IMPORT_BUDGET_MS', '1000'))
+# Modules that must only be imported on first use
+DEFERRED_MODULES = ['plaid']
+READY_TIMEOUT_SECONDS = 60
+
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+print(json.dumps({'ms': elapsed * 1000, 'modules': sorted({name.split('.')[0] for name in sys.modules})}))
+"""
+
+
+def backend_env(**extra) -> Dict[str, str]:
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, **extra)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    return env
+
+
+def measure_import(data_dir: str) -> dict:
+    result = subprocess.run([sys.executable, '-c', IMPORT_PROBE], cwd=data_dir, env=backend_env(),
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(data_dir: str, top: int) -> List[dict]:
+    """Top-level modules imported by main, by cumulative import time"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=data_dir,
+                            env=backend_env(), capture_output=True, text=True, check=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)', line)
+        # Direct imports of main are indented by two spaces
+        if match and len(match.group(3)) == 2:
+            imports.append({'module': match.group(4), 'self_ms': int(match.group(1)) / 1000,
+                            'cumulative_ms': int(match.group(2)) / 1000})
+    return sorted(imports, key=lambda item: item['cumulative_ms'], reverse=True)[:top]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def measure_ready(data_dir: str, fast_start: bool) -> Optional[float]:
+    """Milliseconds from starting uvicorn to the first successful /api/health"""
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--log-level', 'warning'],
+        # Credentials make the warm-up import the Plaid SDK, as in production (no banks are linked)
+        cwd=data_dir, env=backend_env(FAST_START='1' if fast_start else '0',
+                                      PLAID_CLIENT_ID='benchmark', PLAID_PRODUCTION_API='benchmark'),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < READY_TIMEOUT_SECONDS:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/api/health", timeout=1).status_code == 200:
+                    return round((time.perf_counter() - started) * 1000, 1)
+            except httpx.TransportError:
+                pass
+            if server.poll() is not None:
+                return None
+            time.sleep(0.01)
+        return None
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def summarize(values: List[Optional[float]]) -> dict:
+    """Median/min/max of the runs that finished; `failed` counts the ones that did not (None)"""
+    failed = sum(value is None for value in values)
+    values = [value for value in values if value is not None]
+    if not values:
+        return {'runs': 0, 'failed': failed}
+    return {'runs': len(values), 'failed': failed, 'median_ms': round(statistics.median(values), 1),
+            'min_ms': round(min(values), 1), 'max_ms': round(max(values), 1)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes per measurement')
+    parser.add_argument('--budget-ms', type=float, default=IMPORT_BUDGET_MS, help='allowed median import time')
+    parser.add_argument('--years', type=float, default=2, help='years of synthetic data to start up on')
+    parser.add_argument('--spending', type=int, default=20000)
+    parser.add_argument('--top', type=int, default=10, help='slowest imports to list')
+    parser.add_argument('--skip-ready', action='store_true', help='only measure the import')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    from synthetic_data import generate
+
+    data_dir = tempfile.mkdtemp(prefix='dashboard-startup-')
+    try:
+        generate(data_dir, args.years, spending=args.spending, banks=0)
+        imports = [measure_import(data_dir) for _ in range(args.runs)]
+        results = {
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'python': sys.version.split()[0],
+                'args': vars(args),
+            },
+            'import': summarize([run['ms'] for run in imports]),
+            'deferred_modules_imported': sorted(set(DEFERRED_MODULES) & set(imports[0]['modules'])),
+            'slowest_imports': slowest_imports(data_dir, args.top),
+        }
+        if not args.skip_ready:
+            results['ready'] = {
+                'fast_start': summarize([measure_ready(data_dir, True) for _ in range(args.runs)]),
+                'eager': summarize([measure_ready(data_dir, False) for _ in range(args.runs)]),
+            }
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(f"import main: {results['import']}")
+    for item in results['slowest_imports']:
+        print(f"  {item['module']:<24} {item['cumulative_ms']:>8.1f} ms")
+    for mode, summary in results.get('ready', {}).items():
+        print(f"ready ({mode}): {summary}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    failures = []
+    if results['import'].get('median_ms', 0) > args.budget_ms:
+        failures.append(f"import main took {results['import']['median_ms']}ms, over the {args.budget_ms:g}ms budget")
+    for module in results['deferred_modules_imported']:
+        failures.append(f"{module} is imported by `import main`; it should be imported on first use")
+    for mode, summary in results.get('ready', {}).items():
+        if summary['failed'] or not summary['runs']:
+            failures.append(f"ready ({mode}): {summary['failed']} of {summary['runs'] + summary['failed']} "
+                            f"servers never answered /api/health within {READY_TIMEOUT_SECONDS:g}s")
+    for failure in failures:
+        print(f"FAIL  {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"OK: within the {args.budget_ms:g}ms import budget")
@@ -0,0 +1,235 @@
+"""
+Process-resident data stores for the Relationship Dashboard backend.
+
+Each JSON data file is parsed once and then served from memory. Writes only
+mark a store dirty; a background thread flushes dirty stores to disk on a
+write-behind schedule, and flush_all() is called on shutdown. If a file is
+edited outside the process its mtime changes and the store reloads it on the
+next read. Stores are compared by (mtime_ns, inode, size) rather than mtime
+alone, so every atomic replace by another worker process is noticed, even
+within one filesystem timestamp tick.
+
+Every store keeps a version that increases whenever its contents may have
+changed (a save, a rollback or a reload), so readers can tell cheaply whether
+anything is new. Versions are per process; `instance` tells stores apart.
+
+Files are pretty-printed JSON by default. With STORE_FORMAT=snapshot they are
+written as binary snapshots (serialization.py) next to the JSON file, which
+is read once if no snapshot exists yet.
+"""
+
+import atexit
+import copy
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+from instrumentation import count_store_bytes, store_io
+from serialization import decode_snapshot, dumps_pretty, encode_snapshot, loads, snapshot_filename
+
+# How often dirty stores are written back to disk
+WRITE_BEHIND_SECONDS = float(os.getenv('WRITE_BEHIND_SECONDS', '2'))
+# 'json' (pretty-printed, human-readable) or 'snapshot' (compact binary)
+STORE_FORMAT = os.getenv('STORE_FORMAT', 'json')
+
+_stores: List['JsonStore'] = []
+
+
+class CorruptStoreError(Exception):
+    """A data file exists but cannot be parsed, and the store refuses to replace it"""
+
+
+def fsync_directory(filename: str):
+    """Make a rename in filename's directory durable"""
+    fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class JsonStore:
+    """In-memory copy of one JSON data file"""
+
+    # fsync each write (and the rename) so it survives power loss, not just process crashes
+    fsync = False
+
+    def __init__(self, filename: str, default_data: dict, file_format: str = STORE_FORMAT):
+        self.file_format = file_format
+        self.json_filename = filename
+        self.filename = snapshot_filename(filename) if file_format == 'snapshot' else filename
+        self.default_data = default_data
+        self._data: Optional[dict] = None
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._version = 0
+        self.instance = uuid.uuid4().hex[:12]
+        # Cleared for stores that are flushed under a cross-process lock instead
+        self.write_behind = True
+        _stores.append(self)
+
+    @property
+    def lock(self) -> threading.RLock:
+        """Thread lock guarding the in-memory data against the background flusher"""
+        return self._lock
+
+    def _disk_signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.filename)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_ino, st.st_size
+
+    def _source_filename(self, signature) -> Optional[str]:
+        if signature is not None:
+            return self.filename
+        # A snapshot store starts from the JSON file it replaces
+        if self.json_filename != self.filename and os.path.exists(self.json_filename):
+            return self.json_filename
+        return None
+
+    def _load(self):
+        signature = self._disk_signature()
+        source = self._source_filename(signature)
+        data = None
+        if source is not None:
+            try:
+                with store_io(self.filename, 'read'):
+                    with open(source, 'rb') as f:
+                        blob = f.read()
+                count_store_bytes(self.filename, 'read', len(blob))
+                snapshot = source == self.filename and self.file_format == 'snapshot'
+                with store_io(self.filename, 'decode'):
+                    data = decode_snapshot(blob) if snapshot else loads(blob)
+            except (ValueError, IOError) as e:
+                self._unreadable(source, e)
+        if data is None:
+            data = copy.deepcopy(self.default_data)
+        self._data = data
+        self._signature = signature
+        self._version += 1
+
+    def _unreadable(self, source: str, error: Exception):
+        """Called when the data file cannot be read; by default the store starts from default data"""
+        print(f"Error reading {source}, using default data")
+
+    @property
+    def data(self) -> dict:
+        """Current contents, reloaded from disk if the file changed externally"""
+        with self._lock:
+            if self._data is None or (not self._dirty and self._disk_signature() != self._signature):
+                self._load()
+            return self._data
+
+    @property
+    def version(self) -> int:
+        """Increases whenever the contents may have changed; checks the file like `data` does"""
+        with self._lock:
+            self.data
+            return self._version
+
+    def save(self, data: Optional[dict] = None):
+        """Replace (or keep) the in-memory data and schedule a write to disk"""
+        with self._lock:
+            if data is not None:
+                self._data = data
+            elif self._data is None:
+                self._load()
+            self._dirty = True
+            self._version += 1
+
+    @contextmanager
+    def transaction(self):
+        """Roll the in-memory data back if the block raises"""
+        with self._lock:
+            snapshot = copy.deepcopy(self.data)
+            was_dirty = self._dirty
+            try:
+                yield self._data
+            except BaseException:
+                self._data = snapshot
+                self._dirty = was_dirty
+                self._version += 1
+                raise
+
+    def flush(self):
+        """Write the in-memory data to disk if it has unsaved changes"""
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp_filename = f"{self.filename}.tmp"
+            try:
+                with store_io(self.filename, 'encode'):
+                    blob = encode_snapshot(self._data) if self.file_format == 'snapshot' else dumps_pretty(self._data)
+                with store_io(self.filename, 'write', len(blob)):
+                    with open(tmp_filename, 'wb') as f:
+                        f.write(blob)
+                        if self.fsync:
+                            f.flush()
+                            os.fsync(f.fileno())
+                    os.replace(tmp_filename, self.filename)
+                    if self.fsync:
+                        fsync_directory(self.filename)
+                self._signature = self._disk_signature()
+                self._dirty = False
+            except Exception as e:
+                # Encode errors too: the store stays dirty and the flusher moves on to the next one
+                print(f"Error saving {self.filename}: {e}")
+
+    def close(self):
+        """Final flush; the store is no longer flushed in the background afterwards"""
+        self.flush()
+        if self in _stores:
+            _stores.remove(self)
+
+
+def flush_all():
+    """Flush every dirty write-behind store to disk"""
+    for store in list(_stores):
+        if store.write_behind:
+            try:
+                store.flush()
+            except Exception as e:
+                # One failing store must not stop the others (or the write-behind thread)
+                print(f"Error flushing {store.filename}: {e}")
+
+
+class _WriteBehindThread(threading.Thread):
+    def __init__(self, interval: float):
+        super().__init__(name='store-write-behind', daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            flush_all()
+
+
+_flusher: Optional[_WriteBehindThread] = None
+
+
+def start_write_behind(interval: float = WRITE_BEHIND_SECONDS):
+    """Start the background thread that periodically flushes dirty stores"""
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    _flusher = _WriteBehindThread(interval)
+    _flusher.start()
+
+
+def stop_write_behind():
+    """Stop the background flusher and write out any pending changes"""
+    global _flusher
+    if _flusher is not None:
+        _flusher.stopped.set()
+        _flusher.join()
+        _flusher = None
+    for store in list(_stores):
+        store.close()
+
+
+# Never lose buffered writes if the process exits without a clean shutdown
+atexit.register(flush_all)
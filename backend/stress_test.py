@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress harness for the read-modify-write handlers.
+
+Fires thousands of concurrent metric taps, message posts and spending entries
+at the app in a scratch data directory, then checks that nothing was lost:
+every tap is counted, the daily entries still add up to the weekly totals,
+and the spending aggregates match the transactions.
+
+    python stress_test.py --requests 5000 --concurrency 200
+    python stress_test.py --workers 4    # separate processes, STORE_PROCESS_LOCKS=1
+    python stress_test.py --households 50 --max-loaded 10    # exercise eviction
+
+Requests go straight to the ASGI app through httpx, so no server is needed.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# MetricEntry fields that also have a weekly total
+STRESS_METRICS = ['sexCount', 'qualityTimeHours', 'dishesDone', 'kittyDuties']
+
+
+def household_ids(count: int) -> list:
+    return ['default'] if count <= 1 else [f"stress-{i}" for i in range(count)]
+
+
+def empty_counts() -> dict:
+    return {'metrics': {metric: 0 for metric in STRESS_METRICS}, 'messages': 0, 'spending': 0}
+
+
+def load_app(data_dir: str, max_loaded: int = None):
+    """Import main with its data files in data_dir"""
+    os.chdir(data_dir)
+    if max_loaded:
+        os.environ['MAX_LOADED_HOUSEHOLDS'] = str(max_loaded)
+    sys.path.insert(0, BACKEND_DIR)
+    import main
+    return main
+
+
+async def drive(app, requests: int, concurrency: int, seed: int, households: list) -> dict:
+    """Send a mixed workload and return how many of each write succeeded, per household"""
+    import httpx
+
+    rng = random.Random(seed)
+    sent = {'households': {household: empty_counts() for household in households}, 'errors': 0}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(client):
+        roll = rng.random()
+        household = rng.choice(households)
+        counts = sent['households'][household]
+        headers = {'X-Household-Id': household}
+        async with semaphore:
+            if roll < 0.8:
+                metric = rng.choice(STRESS_METRICS)
+                response = await client.post('/api/metrics/update', headers=headers,
+                                             json={'metric': metric, 'increment': 1})
+                if response.status_code == 200:
+                    counts['metrics'][metric] += 1
+            elif roll < 0.9:
+                response = await client.post('/api/messages', headers=headers,
+                                             json={'content': 'stress', 'author': 'partner1'})
+                if response.status_code == 200:
+                    counts['messages'] += 1
+            else:
+                response = await client.post('/api/spending/transactions', headers=headers, json={
+                    'amount': rng.randint(1, 50), 'tag': rng.choice(['fun', 'necessities']), 'person': 'ben'
+                })
+                if response.status_code == 200:
+                    counts['spending'] += 1
+        if response.status_code != 200:
+            sent['errors'] += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://stress') as client:
+        await asyncio.gather(*(one(client) for _ in range(requests)))
+    return sent
+
+
+async def snapshot(main, household_id: str) -> dict:
+    """Counts to compare before and after the run"""
+    household = await main.households.acquire(household_id)
+    try:
+        return household_snapshot(household)
+    finally:
+        main.households.release(household)
+
+
+def household_snapshot(household) -> dict:
+    week = household.metrics_store.data['current_week']
+    return {
+        'totals': {metric: week['weekly_totals'][metric] for metric in STRESS_METRICS},
+        'daily_sums': {
+            metric: sum(entry.get(metric, 0) for entry in week['daily_entries'].values())
+            for metric in STRESS_METRICS
+        },
+        'messages': household.messages_store.count(),
+        'spending': household.spending_storage.count(),
+        'stats_drift': household.spending_storage.verify_stats(),
+    }
+
+
+def check(before: dict, after: dict, sent: dict) -> list:
+    problems = [f"spending stats: {line}" for line in after['stats_drift']]
+    for metric in STRESS_METRICS:
+        expected = before['totals'][metric] + sent['metrics'][metric]
+        if after['totals'][metric] != expected:
+            problems.append(f"{metric}: weekly total {after['totals'][metric]}, expected {expected}")
+        if after['daily_sums'][metric] != after['totals'][metric]:
+            problems.append(f"{metric}: daily entries sum to {after['daily_sums'][metric]}, "
+                            f"weekly total is {after['totals'][metric]}")
+    for key in ('messages', 'spending'):
+        if after[key] != before[key] + sent[key]:
+            problems.append(f"{key}: {after[key]} stored, expected {before[key] + sent[key]}")
+    return problems
+
+
+def merge(results: list, households: list) -> dict:
+    total = {'households': {household: empty_counts() for household in households}, 'errors': 0}
+    for sent in results:
+        for household, counts in sent['households'].items():
+            merged = total['households'][household]
+            for metric in STRESS_METRICS:
+                merged['metrics'][metric] += counts['metrics'][metric]
+            merged['messages'] += counts['messages']
+            merged['spending'] += counts['spending']
+        total['errors'] += sent['errors']
+    return total
+
+
+def run_child(args):
+    main = load_app(args.data_dir, args.max_loaded)
+    sent = asyncio.run(drive(main.app, args.requests, args.concurrency, args.seed, household_ids(args.households)))
+    print(json.dumps(sent))
+
+
+def run_workers(args, data_dir: str) -> dict:
+    children = [
+        subprocess.Popen(
+            [sys.executable, os.path.join(BACKEND_DIR, 'stress_test.py'), '--child',
+             '--data-dir', data_dir, '--requests', str(args.requests),
+             '--concurrency', str(args.concurrency), '--seed', str(args.seed + i),
+             '--households', str(args.households), '--max-loaded', str(args.max_loaded or 0)],
+            stdout=subprocess.PIPE, env=os.environ,
+        )
+        for i in range(args.workers)
+    ]
+    results = [json.loads(child.communicate()[0].decode().strip().splitlines()[-1]) for child in children]
+    return merge(results, household_ids(args.households))
+
+
+async def run(args, main, data_dir: str):
+    from households import create_household
+
+    households = household_ids(args.households)
+    for household in households:
+        create_household(household)
+    before = {household: await snapshot(main, household) for household in households}
+
+    started = time.perf_counter()
+    if args.workers > 1:
+        sent = await asyncio.get_running_loop().run_in_executor(None, run_workers, args, data_dir)
+    else:
+        sent = await drive(main.app, args.requests, args.concurrency, args.seed, households)
+    elapsed = time.perf_counter() - started
+
+    problems = []
+    for household in households:
+        after = await snapshot(main, household)
+        prefix = '' if len(households) == 1 else f"{household} "
+        problems.extend(prefix + problem for problem in check(before[household], after, sent['households'][household]))
+    await main.households.close()
+    return sent, elapsed, problems
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000, help='requests per worker')
+    parser.add_argument('--concurrency', type=int, default=100, help='in-flight requests per worker')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes (enables STORE_PROCESS_LOCKS)')
+    parser.add_argument('--data-dir', help='data directory (default: a fresh temporary directory)')
+    parser.add_argument('--households', type=int, default=1, help='spread requests over this many households')
+    parser.add_argument('--max-loaded', type=int, help='MAX_LOADED_HOUSEHOLDS for the run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    data_dir = os.path.abspath(args.data_dir or tempfile.mkdtemp(prefix='dashboard-stress-'))
+    if args.workers > 1:
+        os.environ['STORE_PROCESS_LOCKS'] = '1'
+    main = load_app(data_dir, args.max_loaded)
+    sent, elapsed, problems = asyncio.run(run(args, main, data_dir))
+
+    total = args.requests * args.workers
+    print(f"{total} requests from {args.workers} worker(s) to {args.households} household(s) in {elapsed:.2f}s "
+          f"({total / elapsed:.0f} req/s), {sent['errors']} errors, data in {data_dir}")
+    for problem in problems:
+        print(f"LOST UPDATE  {problem}")
+    if problems or sent['errors']:
+        sys.exit(1)
+    print("OK: no lost updates")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Synthetic dashboard data for benchmarks and load tests.
+
+Fills a data directory with years of archived metric weeks, a current week,
+today's messages, spending transactions spread over the same years and
+linked fake Plaid tokens whose accounts are split between the owners:
+
+    python synthetic_data.py /tmp/bench-data --years 5 --spending 100000 --banks 8
+
+The directory is laid out like the working directory of the default
+household, so `cd /tmp/bench-data && python /path/to/main.py` serves it.
+Generation is deterministic for a given --seed.
+"""
+
+import argparse
+import json
+import os
+import random
+from datetime import timedelta
+
+import numpy as np
+
+from counters import METRIC_FIELDS
+from fake_plaid import fake_accounts
+from metric_history import HISTORY_DIR, WEEKLY_TOTAL_FIELDS, MetricHistory
+from periods import periods
+from spending_storage import open_spending_storage
+from spending_stats import STATS_PEOPLE, STATS_TAGS
+
+OWNERS = ['sydney', 'ben', 'investments']
+
+
+def synthetic_week(rng: random.Random, week_start: np.datetime64, days: int = 7) -> dict:
+    """One week in the current_week format with `days` daily entries"""
+    daily_entries = {}
+    for offset in range(days):
+        day = str(week_start + np.timedelta64(offset, 'D'))
+        entry = {'date': day}
+        entry.update({field: rng.randint(0, 3) for field in METRIC_FIELDS})
+        daily_entries[day] = entry
+    totals = {field: sum(entry.get(field, 0) for entry in daily_entries.values()) for field in WEEKLY_TOTAL_FIELDS}
+    totals['trashTargetHours'] = rng.randint(0, 24)
+    return {'week_start': str(week_start), 'daily_entries': daily_entries, 'weekly_totals': totals}
+
+
+def generate(directory: str, years: float = 3, messages: int = 50, spending: int = 10000,
+             banks: int = 3, seed: int = 0) -> dict:
+    """Write the synthetic data set and return how much of each kind was generated"""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    now = periods.now()
+    current_week = np.datetime64(periods.current_week_start())
+    today = np.datetime64(periods.current_day())
+
+    # Archived weeks, oldest first, ending the week before the current one
+    weeks = int(years * 52)
+    history = [synthetic_week(rng, current_week - np.timedelta64(7 * (weeks - i), 'D')) for i in range(weeks)]
+    MetricHistory(os.path.join(directory, HISTORY_DIR)).upsert_weeks(history)
+
+    days_so_far = int((today - current_week).astype(int)) + 1
+    week = synthetic_week(rng, current_week, days_so_far)
+    with open(os.path.join(directory, 'current_metrics.json'), 'w') as f:
+        json.dump({'current_week': week}, f, indent=2)
+
+    with open(os.path.join(directory, 'messages.json'), 'w') as f:
+        json.dump({'messages': [
+            {
+                'id': str(i),
+                'content': f"Synthetic note {i}",
+                'author': rng.choice(['partner1', 'partner2']),
+                'timestamp': (now - timedelta(seconds=rng.randint(0, 3600))).isoformat(),
+                'isRead': rng.random() < 0.5,
+                'isFavorite': rng.random() < 0.1,
+            }
+            for i in range(messages)
+        ]}, f, indent=2)
+
+    span_days = max(1, int(years * 365))
+    storage = open_spending_storage(directory=directory)
+    storage.create_many([
+        {
+            'id': f"syn-{i}",
+            'amount': round(rng.uniform(1, 200), 2),
+            'tag': rng.choice(STATS_TAGS),
+            'person': rng.choice(STATS_PEOPLE),
+            'date': (now - timedelta(days=rng.randint(0, span_days), minutes=rng.randint(0, 1439))).isoformat(),
+        }
+        for i in range(spending)
+    ])
+    storage.close()
+
+    tokens = [f"synthetic-token-{i}" for i in range(banks)]
+    categorizations = {
+        account['account_id']: rng.choice(OWNERS)
+        for token in tokens for account in fake_accounts(token)
+    }
+    with open(os.path.join(directory, 'account_setup.json'), 'w') as f:
+        json.dump({'access_tokens': tokens, 'account_categorizations': categorizations}, f, indent=2)
+
+    return {'weeks': weeks, 'messages': messages, 'spending': spending, 'banks': banks}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('directory')
+    parser.add_argument('--years', type=float, default=3, help='years of metric history and spending')
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--spending', type=int, default=10000, help='spending transactions')
+    parser.add_argument('--banks', type=int, default=3, help='linked fake Plaid tokens')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    counts = generate(args.directory, args.years, args.messages, args.spending, args.banks, args.seed)
+    print(f"Generated {counts} in {args.directory}")
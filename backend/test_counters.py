@@ -0,0 +1,95 @@
+"""
+Metric counter snapshots survive restarts and are never silently reset.
+
+    python -m pytest test_counters.py
+"""
+
+import json
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from counters import MetricCounters
+from store import CorruptStoreError
+
+WEEK = {'week_start': '2026-10-12', 'daily_entries': {}, 'weekly_totals': {'dishesDone': 0}}
+
+
+def crashed(counters: MetricCounters):
+    """Leave the store as a killed process would: no final checkpoint"""
+    counters.write_behind = False
+    counters.close()
+
+
+def test_checkpoint_truncates_journal_after_snapshot():
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'current_metrics.json')
+        counters = MetricCounters(filename)
+        counters.save({'current_week': None})
+        counters.checkpoint()
+        assert os.path.getsize(counters.journal_filename) == 0
+        assert MetricCounters(filename).data['current_week'] is None
+        counters.close()
+
+
+def test_journal_newer_than_snapshot_is_replayed_after_crash():
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'current_metrics.json')
+        counters = MetricCounters(filename)
+        counters.save({'current_week': json.loads(json.dumps(WEEK))})
+        counters.increment('2026-10-13', 'dishesDone', 2)
+        counters.increment_many([('2026-10-13', 'dishesDone', 1), ('2026-10-14', 'dishesDone', 4)])
+        crashed(counters)
+        # A write torn by the crash is ignored
+        with open(counters.journal_filename, 'a') as f:
+            f.write('{"seq": 3, "week_s')
+
+        with open(filename) as f:
+            assert json.load(f)['current_week']['weekly_totals']['dishesDone'] == 0
+        restarted = MetricCounters(filename)
+        week = restarted.data['current_week']
+        assert week['weekly_totals']['dishesDone'] == 7
+        assert week['daily_entries']['2026-10-13']['dishesDone'] == 3
+
+        # Once checkpointed, the same records are not applied a second time
+        restarted.checkpoint()
+        crashed(restarted)
+        assert MetricCounters(filename).data['current_week']['weekly_totals']['dishesDone'] == 7
+
+
+def test_failed_journal_truncation_keeps_the_checkpoint():
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'current_metrics.json')
+        counters = MetricCounters(filename)
+        counters.save({'current_week': json.loads(json.dumps(WEEK))})
+        counters.increment('2026-10-13', 'dishesDone', 2)
+        journal = counters.journal_filename
+        os.replace(journal, journal + '.saved')
+        os.mkdir(journal)
+        counters.checkpoint()
+        with open(filename) as f:
+            assert json.load(f)['current_week']['weekly_totals']['dishesDone'] == 2
+        crashed(counters)
+
+        # The snapshot's journal_seq covers the old records, so they are skipped
+        os.rmdir(journal)
+        shutil.move(journal + '.saved', journal)
+        assert MetricCounters(filename).data['current_week']['weekly_totals']['dishesDone'] == 2
+
+
+def test_corrupt_snapshot_is_refused_and_kept():
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'current_metrics.json')
+        with open(filename, 'w') as f:
+            f.write('{"current_week": {')
+        with open(f"{filename}.journal", 'w') as f:
+            f.write('{"seq": 1, "week_start": "2026-10-12", "day": "2026-10-13", '
+                    '"metric": "dishesDone", "increment": 1}\n')
+        with pytest.raises(CorruptStoreError):
+            MetricCounters(filename).data
+        with open(filename) as f:
+            assert f.read() == '{"current_week": {'
+        with open(f"{filename}.journal") as f:
+            assert '"seq": 1' in f.read()
@@ -0,0 +1,33 @@
+"""
+Legacy flat messages.json files are sharded by reset day on load.
+
+    python -m pytest test_message_store.py
+"""
+
+import json
+import os
+import tempfile
+
+from message_store import MessageStore
+from periods import periods
+
+
+def test_legacy_file_with_bad_timestamp_is_converted():
+    messages = [
+        {'id': '1', 'content': 'a', 'author': 'partner1', 'timestamp': '2025-01-02T12:00:00'},
+        {'id': '2', 'content': 'b', 'author': 'partner2', 'timestamp': '10/17/2026 9am'},
+        {'id': '3', 'content': 'c', 'author': 'partner1', 'timestamp': '10/17/2026'},
+        {'id': '4', 'content': 'd', 'author': 'partner2', 'timestamp': '2025-01-02T12:00:00Z'},
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'messages.json')
+        with open(filename, 'w') as f:
+            json.dump({'messages': messages}, f)
+        store = MessageStore(filename, file_format='json')
+        try:
+            days = store.data['days']
+            assert set(days['2025-01-02']) == {'1', '4'}
+            assert set(days[periods.current_day()]) == {'2', '3'}
+            assert store.count() == 4
+        finally:
+            store.close()
@@ -0,0 +1,86 @@
+"""
+The vectorized aggregate rebuild must bucket exactly like the per-row deltas,
+and updates keep the aggregates and ids consistent.
+
+    python -m pytest test_spending_stats.py
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import pytest
+
+from spending_stats import MonthlyAggregates, diff_aggregates, transaction_deltas
+from spending_storage import DuplicateIdError, open_spending_storage
+
+ROWS = [
+    {'id': '1', 'amount': 12.5, 'tag': 'fun', 'person': 'ben', 'date': '2025-10-02'},
+    {'id': '2', 'amount': 7, 'tag': 'fun', 'person': 'sydney', 'date': '2025-10-31T23:59:00'},
+    {'id': '3', 'amount': '3.25', 'tag': 'clothes', 'person': 'ben', 'date': '2025-11-01'},
+    {'id': '4', 'amount': 4, 'tag': 'fun', 'person': 'ben', 'date': '10/02/2025'},
+    {'id': '5', 'amount': 5, 'tag': 'fun', 'person': 'ben', 'date': '10/02/2026'},
+    {'id': '6', 'amount': 6, 'tag': None, 'person': '', 'date': '2025'},
+    {'id': '7', 'amount': None, 'tag': 'a|b', 'person': 'ben', 'date': 'yesterday'},
+    {'id': '8', 'amount': 8, 'tag': 'fun', 'person': 'ben', 'date': ''},
+    {'id': '9', 'amount': 9, 'tag': 'fun', 'person': 'ben'},
+]
+
+
+def row_by_row(rows):
+    aggregates = MonthlyAggregates()
+    for row in rows:
+        aggregates.apply(transaction_deltas(row))
+    return aggregates
+
+
+def test_from_transactions_matches_transaction_deltas():
+    expected = row_by_row(ROWS)
+    assert diff_aggregates(MonthlyAggregates.from_transactions(ROWS), expected) == []
+    assert diff_aggregates(expected, MonthlyAggregates.from_transactions(ROWS)) == []
+
+
+def test_from_transactions_matches_for_generated_rows():
+    rng = np.random.default_rng(0)
+    dates = ['2024-01-15', '2024-02-01T08:00:00', '01/02/2024', '2024', '2024-13-01', 'Feb 3 2024']
+    rows = [
+        {'id': str(i), 'amount': float(rng.uniform(-50, 200)), 'tag': str(rng.choice(['fun', 'clothes', ''])),
+         'person': str(rng.choice(['ben', 'sydney'])), 'date': str(rng.choice(dates))}
+        for i in range(500)
+    ]
+    assert diff_aggregates(MonthlyAggregates.from_transactions(rows), row_by_row(rows)) == []
+
+
+def test_migration_with_odd_dates_keeps_stats():
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, 'spending.json'), 'w') as f:
+            f.write('{"transactions": [{"id": "1", "amount": 4, "tag": "fun", "person": "ben", '
+                    '"date": "10/02/2025"}, {"id": "2", "amount": 6, "tag": "fun", "person": "ben", '
+                    '"date": "2025-10-02"}]}')
+        storage = open_spending_storage('sqlite', directory)
+        try:
+            assert storage.verify_stats() == []
+            assert storage.stats()['2025-10']['transaction_count'] == 1
+            assert storage.stats()['10/02/2']['transaction_count'] == 1
+            storage.update('2', {'date': '11/30/2025'})
+            assert storage.verify_stats() == []
+            storage.rebuild_stats()
+            assert storage.verify_stats() == []
+        finally:
+            storage.close()
+
+
+def test_update_to_a_taken_id_is_refused():
+    for backend in ('json', 'sqlite'):
+        with tempfile.TemporaryDirectory() as directory:
+            storage = open_spending_storage(backend, directory)
+            try:
+                storage.create({'id': '1', 'amount': 4, 'tag': 'fun', 'person': 'ben', 'date': '2025-10-02'})
+                storage.create({'id': '2', 'amount': 6, 'tag': 'fun', 'person': 'ben', 'date': '2025-10-03'})
+                with pytest.raises(DuplicateIdError):
+                    storage.update('2', {'id': '1', 'amount': 1})
+                assert storage.get('2')['amount'] == 6
+                assert storage.verify_stats() == []
+                assert storage.update('2', {'id': '3'})['id'] == '3'
+            finally:
+                storage.close()
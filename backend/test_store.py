@@ -0,0 +1,55 @@
+"""
+One store that cannot be written must not stop the others being flushed,
+and the API keeps unencodable integers out of the stores.
+
+    python -m pytest test_store.py
+"""
+
+import os
+import tempfile
+
+from fastapi.testclient import TestClient
+
+import store
+from serialization import encodable_ints
+from store import JsonStore
+
+
+def test_flush_all_survives_an_unencodable_store():
+    with tempfile.TemporaryDirectory() as directory:
+        broken = JsonStore(os.path.join(directory, 'broken.json'), {}, file_format='json')
+        healthy = JsonStore(os.path.join(directory, 'healthy.json'), {}, file_format='json')
+        try:
+            broken.save({'value': {1, 2}})
+            healthy.save({'value': 1})
+            store.flush_all()
+            assert not os.path.exists(broken.filename)
+            with open(healthy.filename) as f:
+                assert '"value"' in f.read()
+        finally:
+            broken.save({})
+            broken.close()
+            healthy.close()
+
+
+def test_encodable_ints():
+    assert encodable_ints({'a': [1, -2 ** 63, 2 ** 64 - 1, True, 'x', None]})
+    assert not encodable_ints({'a': [{'b': 2 ** 64}]})
+    assert not encodable_ints({'a': -2 ** 63 - 1})
+
+
+def test_out_of_range_ints_are_rejected():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            import main
+            with TestClient(main.app) as client:
+                message = client.post('/api/messages', json={'content': 'hi', 'author': 'partner1'}).json()
+                response = client.put(f"/api/messages/{message['id']}", json={'isRead': 2 ** 70})
+                assert response.status_code == 422
+                assert client.get('/api/messages').json()['messages'][0]['isRead'] is False
+                response = client.post('/api/metrics/update', json={'metric': 'dishesDone', 'increment': 2 ** 70})
+                assert response.status_code == 422
+        finally:
+            os.chdir(cwd)
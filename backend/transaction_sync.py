@@ -0,0 +1,207 @@
+"""
+Incremental bank transaction ingestion via Plaid /transactions/sync.
+
+Each access token has a stored sync cursor. A sync pulls only the transactions
+added, modified or removed since that cursor and applies them to a local
+SQLite store indexed by account and date, in one database transaction per
+token. Weekly changes and other transaction-derived numbers are then computed
+from local data instead of pulling /transactions/get windows from Plaid.
+
+Syncs run on demand (POST /api/transactions/sync) or in the background every
+TRANSACTION_SYNC_SECONDS. Point PLAID_BASE_URL at fake_plaid.py to try it
+locally.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from plaid_transport import PlaidTransport
+
+BANK_TRANSACTIONS_DB_FILE = os.getenv('BANK_TRANSACTIONS_DB_FILE', 'bank_transactions.db')
+TRANSACTION_SYNC_SECONDS = float(os.getenv('TRANSACTION_SYNC_SECONDS', '3600'))
+SYNC_PAGE_SIZE = 500
+
+
+class BankTransactionStore:
+    """Synced Plaid transactions and per-token cursors in SQLite"""
+
+    def __init__(self, filename: str = BANK_TRANSACTIONS_DB_FILE):
+        self.filename = filename
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(filename, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS bank_transactions (
+                transaction_id TEXT PRIMARY KEY,
+                access_token TEXT,
+                account_id TEXT,
+                amount REAL,
+                date TEXT,
+                name TEXT,
+                pending INTEGER,
+                raw TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_bank_transactions_date ON bank_transactions (date);
+            CREATE INDEX IF NOT EXISTS idx_bank_transactions_account_date ON bank_transactions (account_id, date);
+            CREATE TABLE IF NOT EXISTS sync_cursors (
+                access_token TEXT PRIMARY KEY,
+                cursor TEXT,
+                synced_at REAL
+            );
+        ''')
+
+    def get_cursor(self, access_token: str) -> Optional[str]:
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT cursor FROM sync_cursors WHERE access_token = ?', (access_token,)
+            ).fetchone()
+            return row[0] if row else None
+
+    def apply(self, access_token: str, added: List[dict], modified: List[dict],
+              removed: List[dict], cursor: str):
+        """Apply one token's sync delta and advance its cursor atomically"""
+        rows = [
+            (
+                t['transaction_id'], access_token, t['account_id'], t['amount'], str(t['date']),
+                t.get('name'), int(bool(t.get('pending'))), json.dumps(t, default=str),
+            )
+            for t in added + modified
+        ]
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO bank_transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows
+                )
+                self.conn.executemany(
+                    'DELETE FROM bank_transactions WHERE transaction_id = ?',
+                    [(t['transaction_id'],) for t in removed],
+                )
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO sync_cursors VALUES (?, ?, ?)', (access_token, cursor, time.time())
+                )
+                self.conn.execute('COMMIT')
+            except sqlite3.Error:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    def totals_by_account(self, since: str) -> Dict[str, float]:
+        """Sum of transaction amounts per account on or after a YYYY-MM-DD date"""
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT account_id, SUM(amount) FROM bank_transactions WHERE date >= ? GROUP BY account_id',
+                (since,),
+            )
+            return {account_id: total for account_id, total in rows}
+
+    def last_synced(self) -> Optional[float]:
+        with self._lock:
+            return self.conn.execute('SELECT MIN(synced_at) FROM sync_cursors').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class TransactionSync:
+    """Pulls /transactions/sync deltas for every access token into a BankTransactionStore"""
+
+    def __init__(self, transport: PlaidTransport, store: BankTransactionStore):
+        self.transport = transport
+        self.store = store
+        self._token_locks: Dict[str, asyncio.Lock] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def sync_token(self, access_token: str) -> dict:
+        """Sync one token from its stored cursor, returning change counts"""
+        lock = self._token_locks.setdefault(access_token, asyncio.Lock())
+        async with lock:
+            start_cursor = self.store.get_cursor(access_token)
+            while True:
+                cursor = start_cursor
+                added, modified, removed = [], [], []
+                try:
+                    while True:
+                        payload = {'count': SYNC_PAGE_SIZE}
+                        if cursor:
+                            payload['cursor'] = cursor
+                        page = await self.transport.post('/transactions/sync', access_token, **payload)
+                        added.extend(page.get('added', []))
+                        modified.extend(page.get('modified', []))
+                        removed.extend(page.get('removed', []))
+                        cursor = page['next_cursor']
+                        if not page.get('has_more'):
+                            break
+                except httpx.HTTPStatusError as e:
+                    # Plaid asks for the whole pagination to restart if data changed mid-way
+                    if _plaid_error_code(e.response) == 'TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION':
+                        continue
+                    raise
+                break
+
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.store.apply, access_token, added, modified, removed, cursor
+            )
+            return {'added': len(added), 'modified': len(modified), 'removed': len(removed)}
+
+    async def sync_all(self, access_tokens: List[str]) -> Dict[str, dict]:
+        """Sync every token concurrently; failures are reported per token"""
+        results = await asyncio.gather(
+            *(self.sync_token(token) for token in access_tokens), return_exceptions=True
+        )
+        summary = {}
+        for access_token, result in zip(access_tokens, results):
+            if isinstance(result, Exception):
+                print(f"Error syncing transactions for token: {str(result)}")
+                result = {'error': str(result)}
+            summary[access_token[-4:]] = result
+        return summary
+
+    def start_background(self, get_access_tokens: Callable[[], List[str]],
+                         interval: float = TRANSACTION_SYNC_SECONDS):
+        """Sync now and then every `interval` seconds until stop_background()"""
+        async def loop():
+            while True:
+                # Re-read the tokens each round; another worker may have linked a bank
+                await self.sync_all(list(get_access_tokens()))
+                await asyncio.sleep(interval)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(loop())
+
+    async def stop_background(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+def _plaid_error_code(response: httpx.Response) -> Optional[str]:
+    try:
+        return response.json().get('error_code')
+    except ValueError:
+        return None
+
+
+def weekly_changes(store: BankTransactionStore, account_categorizations: Dict[str, str],
+                   now: Optional[datetime] = None) -> Dict[str, float]:
+    """Net money in/out over the past 7 days per owner, from locally synced transactions"""
+    now = now or datetime.now()
+    since = (now - timedelta(days=7)).date().isoformat()
+    changes: Dict[str, float] = {}
+    for account_id, total in store.totals_by_account(since).items():
+        owner = account_categorizations.get(account_id)
+        if owner is None:
+            continue
+        # Plaid amounts are positive for money leaving the account
+        changes[owner] = changes.get(owner, 0.0) - total
+    return changes
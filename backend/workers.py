@@ -0,0 +1,125 @@
+"""
+Coordination between uvicorn worker processes.
+
+With `uvicorn main:app --workers N` every worker runs the FastAPI startup
+hooks. Work that must happen once per deployment (opening the default
+household at startup, warming the Plaid cache, background transaction
+syncs) runs only in the leader: the one worker holding an exclusive fcntl
+lock on LEADER_LOCK_FILE. If the leader exits, its lock is released and the
+next worker to poll takes over.
+
+Every worker also polls the store version counters (see concurrency.py) of
+its open households and reports writes made by other workers, so each
+worker can push change events to its own /api/stream clients.
+
+In a single process the leader lock is always granted immediately.
+"""
+
+import asyncio
+import os
+from typing import Awaitable, Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process only
+    fcntl = None
+
+from concurrency import STORE_PROCESS_LOCKS
+from households import HouseholdRegistry, Household
+
+LEADER_LOCK_FILE = os.getenv('LEADER_LOCK_FILE', 'leader.lock')
+# How often followers retry the leader lock and workers poll for others' writes
+LEADER_POLL_SECONDS = float(os.getenv('LEADER_POLL_SECONDS', '5'))
+SHARED_STATE_POLL_SECONDS = float(os.getenv('SHARED_STATE_POLL_SECONDS', '1'))
+
+
+class LeaderElection:
+    """Holds the leader lock for the lifetime of the process once acquired"""
+
+    def __init__(self, filename: str = LEADER_LOCK_FILE, on_elected: Optional[Callable[[], Awaitable[None]]] = None):
+        self.filename = filename
+        self.on_elected = on_elected
+        self.is_leader = False
+        self._fd: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def try_acquire(self) -> bool:
+        if self.is_leader:
+            return True
+        if fcntl is None:
+            self.is_leader = True
+            return True
+        fd = os.open(self.filename, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        self.is_leader = True
+        return True
+
+    async def start(self, interval: float = LEADER_POLL_SECONDS):
+        """Try to become leader now, and keep trying in the background if another worker is"""
+        if self.try_acquire():
+            return
+
+        async def loop():
+            while not self.try_acquire():
+                await asyncio.sleep(interval)
+            print(f"Worker {os.getpid()} took over as leader")
+            if self.on_elected is not None:
+                await self.on_elected()
+
+        self._task = asyncio.get_running_loop().create_task(loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self.is_leader = False
+
+
+class SharedStateWatcher:
+    """Reports stores that other workers changed in households with connected clients"""
+
+    def __init__(self, registry: HouseholdRegistry, on_change: Callable[[Household, str], None]):
+        self.registry = registry
+        self.on_change = on_change
+        self._task: Optional[asyncio.Task] = None
+
+    def poll(self):
+        for household in self.registry.loaded():
+            if household.events.subscriber_count == 0:
+                continue
+            for name in household.concurrency.changed_elsewhere():
+                self.on_change(household, name)
+
+    def start(self, interval: float = SHARED_STATE_POLL_SECONDS):
+        if not STORE_PROCESS_LOCKS:
+            # Single process: every write already publishes its own event
+            return
+
+        async def loop():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    self.poll()
+                except Exception as e:
+                    print(f"Error polling shared state: {str(e)}")
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
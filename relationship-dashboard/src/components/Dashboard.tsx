@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Favorite, Add, Message, Schedule } from '@mui/icons-material';
 import LoveComposite from './LoveComposite';
 import DualFinanceWheel from './DualFinanceWheel';
@@ -6,6 +6,11 @@ import ChoresComposite from './ChoresComposite';
 import { DataService } from '../services/dataService';
 import { MetricEntry, WeeklyMetrics, PartnerFinances, METRIC_CONFIGS, DARK_THEME, Note } from '../types/metrics';
 
+type MetricKey = keyof Pick<MetricEntry, 'sexCount' | 'qualityTimeHours' | 'dishesDone' | 'trashFullHours' | 'kittyDuties'>;
+
+// Taps this close together are sent to the backend as one /api/batch request
+const METRIC_BATCH_DELAY_MS = 300;
+
 const Dashboard: React.FC = () => {
   const [todaysEntry, setTodaysEntry] = useState<MetricEntry | null>(null);
   const [weeklyMetrics, setWeeklyMetrics] = useState<WeeklyMetrics | null>(null);
@@ -17,18 +22,32 @@ const Dashboard: React.FC = () => {
   const [resetTimers, setResetTimers] = useState<{ daily_reset_in_seconds: number; weekly_reset_in_seconds: number } | null>(null);
   const [expandedMessages, setExpandedMessages] = useState<Set<string>>(new Set());
   const [isLoading, setIsLoading] = useState(true);
+  const pendingTaps = useRef<{ metric: MetricKey; increment: number }[]>([]);
+  const tapTimer = useRef<ReturnType<typeof setTimeout> | null>(null);
 
   useEffect(() => {
     loadData();
-    loadMessages();
-    loadResetTimers();
     
-    // Refresh data every 30 seconds
-    const interval = setInterval(() => {
-      loadResetTimers();
-    }, 30000);
+    // The backend pushes changes and a timer heartbeat, so there is nothing to poll
+    const unsubscribe = DataService.subscribeToUpdates({
+      onMetrics: (today, week) => {
+        setTodaysEntry(today);
+        setWeeklyMetrics((current) => current ? { ...current, ...week } : current);
+      },
+      onMessages: () => loadMessages(),
+      onTimers: (timers) => setResetTimers(timers),
+      // Refetch quietly: a reconnect or rollover should not bring back the full-page spinner
+      onReset: () => loadData(true),
+    });
     
-    return () => clearInterval(interval);
+    return () => {
+      unsubscribe();
+      // Nothing may set state after unmount, so a batch that has not gone out yet is dropped
+      if (tapTimer.current) {
+        clearTimeout(tapTimer.current);
+        tapTimer.current = null;
+      }
+    };
   }, []);
 
   const loadMessages = async () => {
@@ -56,15 +75,6 @@ const Dashboard: React.FC = () => {
 
   const shouldTruncateMessage = (content: string) => content.length > 15;
 
-  const loadResetTimers = async () => {
-    try {
-      const timers = await DataService.getResetTimers();
-      setResetTimers(timers);
-    } catch (error) {
-      console.error('Error loading reset timers:', error);
-    }
-  };
-
   const handleAddMessage = async () => {
     if (newMessage.trim()) {
       try {
@@ -110,44 +120,59 @@ const Dashboard: React.FC = () => {
     return author === 'partner1' ? 'Ben' : 'Sydney';
   };
 
-  const loadData = async () => {
-    setIsLoading(true);
+  const loadData = async (background = false) => {
+    if (!background) {
+      setIsLoading(true);
+    }
     try {
-      const [entry, weekly] = await Promise.all([
-        DataService.getTodaysEntry(),
-        DataService.getCurrentWeekMetrics()
-      ]);
-      
-      setTodaysEntry(entry);
-      setWeeklyMetrics(weekly);
-      
-      // Try to load finances, but don't fail if it errors
-      try {
-        const finances = await DataService.getPartnerFinances();
-        setPartnerFinances(finances);
-      } catch (financeError) {
-        console.error('Finance data failed to load:', financeError);
-        setPartnerFinances(null); // This will show error state in DualFinanceWheel
+      // One request for metrics, messages, timers and balances; a failed section is null
+      const dashboard = await DataService.getDashboard();
+      setTodaysEntry(dashboard.todaysEntry);
+      setWeeklyMetrics(dashboard.weeklyMetrics);
+      // Show only recent messages (last 5); they arrive newest first
+      setNotes((dashboard.notes || []).slice(0, 5));
+      if (dashboard.resetTimers) {
+        setResetTimers(dashboard.resetTimers);
       }
+      // A null here shows the error state in DualFinanceWheel
+      setPartnerFinances(dashboard.finances);
     } catch (error) {
       console.error('Error loading data:', error);
     } finally {
-      setIsLoading(false);
+      if (!background) {
+        setIsLoading(false);
+      }
     }
   };
 
-  const handleMetricUpdate = async (metric: keyof Pick<MetricEntry, 'sexCount' | 'qualityTimeHours' | 'dishesDone' | 'trashFullHours' | 'kittyDuties'>, increment: number) => {
+  const flushMetricTaps = async () => {
+    tapTimer.current = null;
+    const taps = pendingTaps.current;
+    pendingTaps.current = [];
+    if (taps.length === 0) {
+      return;
+    }
     try {
-      const updatedEntry = await DataService.updateTodaysMetric(metric, increment);
-      setTodaysEntry(updatedEntry);
-      
-      // Refresh weekly metrics
-      const weekly = await DataService.getCurrentWeekMetrics();
-      setWeeklyMetrics(weekly);
+      // Each tap stays its own operation: counts stop at zero, so taps can't be summed
+      const results = await DataService.applyBatch(taps.map((tap) => ({ op: 'metrics.update', data: tap })));
+      // The week's totals arrive with the batch's 'metrics' stream event (onMetrics)
+      setTodaysEntry({ ...results[results.length - 1].result, notes: [] });
     } catch (error) {
       console.error('Error updating metric:', error);
       alert('Failed to update metric. Please try again.');
+      // Drop the optimistic counts
+      loadData(true);
+    }
+  };
+
+  const handleMetricUpdate = (metric: MetricKey, increment: number) => {
+    // Show the tap at once; the batch result replaces it with the server's count
+    setTodaysEntry((current) => current ? { ...current, [metric]: Math.max(0, current[metric] + increment) } : current);
+    pendingTaps.current.push({ metric, increment });
+    if (tapTimer.current) {
+      clearTimeout(tapTimer.current);
     }
+    tapTimer.current = setTimeout(flushMetricTaps, METRIC_BATCH_DELAY_MS);
   };
 
   if (isLoading) {
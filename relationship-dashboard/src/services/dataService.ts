@@ -1,4 +1,5 @@
 import { MetricEntry, Note, WeeklyMetrics, PartnerFinances } from '../types/metrics';
+import { PlaidService } from './plaidService';
 
 // Use environment variable for API URL, fallback to localhost for development
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000/api';
@@ -33,17 +34,7 @@ export class DataService {
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
-      const data = await response.json();
-      return {
-        weekStart: data.weekStart,
-        sexCount: data.sexCount || 0,
-        qualityTimeHours: data.qualityTimeHours || 0,
-        dishesDone: data.dishesDone || 0,
-        trashTargetHours: data.trashTargetHours || 0,
-        kittyDuties: data.kittyDuties || 0,
-        partner1FinanceChange: 0,
-        partner2FinanceChange: 0
-      };
+      return DataService.toWeeklyMetrics(await response.json());
     } catch (error) {
       console.error('Error fetching weekly metrics:', error);
       return {
@@ -59,6 +50,19 @@ export class DataService {
     }
   }
 
+  private static toWeeklyMetrics(data: any): WeeklyMetrics {
+    return {
+      weekStart: data.weekStart,
+      sexCount: data.sexCount || 0,
+      qualityTimeHours: data.qualityTimeHours || 0,
+      dishesDone: data.dishesDone || 0,
+      trashTargetHours: data.trashTargetHours || 0,
+      kittyDuties: data.kittyDuties || 0,
+      partner1FinanceChange: 0,
+      partner2FinanceChange: 0
+    };
+  }
+
   static async updateTodaysMetric(metric: keyof Pick<MetricEntry, 'sexCount' | 'qualityTimeHours' | 'dishesDone' | 'trashFullHours' | 'kittyDuties'>, increment: number): Promise<MetricEntry> {
     try {
       const response = await fetch(`${API_BASE_URL}/metrics/update`, {
@@ -102,6 +106,97 @@ export class DataService {
     }
   }
 
+  // Everything the dashboard shows on load in one request. Sections the backend
+  // could not build come back as null (the reason is in data.sections).
+  static async getDashboard(): Promise<{
+    todaysEntry: MetricEntry | null;
+    weeklyMetrics: WeeklyMetrics | null;
+    notes: Note[] | null;
+    resetTimers: { daily_reset_in_seconds: number; weekly_reset_in_seconds: number } | null;
+    finances: PartnerFinances | null;
+  }> {
+    const response = await fetch(`${API_BASE_URL}/dashboard`);
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    const data = await response.json();
+    for (const [name, section] of Object.entries<any>(data.sections || {})) {
+      if (section.error) {
+        console.error(`Dashboard section ${name} failed:`, section.error);
+      }
+    }
+    return {
+      todaysEntry: data.metrics ? { ...data.metrics.today, notes: [] } : null,
+      weeklyMetrics: data.metrics ? DataService.toWeeklyMetrics(data.metrics.week) : null,
+      notes: data.messages,
+      resetTimers: data.timers,
+      finances: data.balances ? PlaidService.toPartnerFinances(data.balances) : null
+    };
+  }
+
+  // Apply several metric/message/spending operations in one all-or-nothing request
+  static async applyBatch(operations: { op: string; id?: string; data?: any }[]): Promise<any[]> {
+    try {
+      const response = await fetch(`${API_BASE_URL}/batch`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ operations }),
+      });
+
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+
+      const data = await response.json();
+      return data.results;
+    } catch (error) {
+      console.error('Error applying batch:', error);
+      throw error;
+    }
+  }
+
+  // Live updates pushed by the backend (server-sent events)
+  static subscribeToUpdates(handlers: {
+    onMetrics?: (today: MetricEntry, week: any) => void;
+    onMessages?: () => void;
+    onSpending?: () => void;
+    onTimers?: (timers: { daily_reset_in_seconds: number; weekly_reset_in_seconds: number }) => void;
+    onReset?: () => void;
+  }): () => void {
+    const source = new EventSource(`${API_BASE_URL}/stream`);
+
+    source.addEventListener('metrics', (event) => {
+      const data = JSON.parse((event as MessageEvent).data);
+      handlers.onMetrics?.({ ...data.today, notes: [] }, data.week);
+    });
+    source.addEventListener('messages', () => handlers.onMessages?.());
+    source.addEventListener('spending', () => handlers.onSpending?.());
+    source.addEventListener('heartbeat', (event) => {
+      handlers.onTimers?.(JSON.parse((event as MessageEvent).data));
+    });
+    source.addEventListener('reset', (event) => {
+      handlers.onTimers?.(JSON.parse((event as MessageEvent).data));
+      handlers.onReset?.();
+    });
+    // The server dropped events for us; refetch everything
+    source.addEventListener('resync', () => handlers.onReset?.());
+    // EventSource reconnects on its own, but events sent while it was down are lost
+    let disconnected = false;
+    source.addEventListener('error', () => {
+      disconnected = true;
+    });
+    source.addEventListener('open', () => {
+      if (disconnected) {
+        disconnected = false;
+        handlers.onReset?.();
+      }
+    });
+
+    return () => source.close();
+  }
+
   // Messages management
   static async getNotes(): Promise<Note[]> {
     try {
@@ -189,7 +284,6 @@ export class DataService {
   // Finance data (delegated to PlaidService)
   static async getPartnerFinances(): Promise<PartnerFinances> {
     try {
-      const { PlaidService } = await import('./plaidService');
       const result = await PlaidService.getFinanceData();
       console.log('DataService: Got finance data from PlaidService:', result);
       return result;
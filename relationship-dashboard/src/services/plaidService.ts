@@ -91,6 +91,18 @@ export class PlaidService {
     }
   }
 
+  // Backend returns aggregated data in the format: { sydney: {balance, weeklyChange}, ben: {...}, investments: {...} }
+  static toPartnerFinances(data: any): PartnerFinances {
+    return {
+      sydneyBalance: data.sydney?.balance || 0,
+      benBalance: data.ben?.balance || 0,
+      investmentsBalance: data.investments?.balance || 0,
+      sydneyWeeklyChange: data.sydney?.weeklyChange || 0,
+      benWeeklyChange: data.ben?.weeklyChange || 0,
+      investmentsWeeklyChange: data.investments?.weeklyChange || 0
+    };
+  }
+
   // Get finance data for the dashboard
   static async getFinanceData(): Promise<PartnerFinances> {
     console.log('PlaidService: Starting API call to:', `${API_BASE_URL}/balances`);
@@ -107,15 +119,7 @@ export class PlaidService {
       const data = await response.json();
       console.log('PlaidService: Received finance data:', data);
 
-      // Backend now returns aggregated data in the format: { sydney: {balance, weeklyChange}, ben: {...}, investments: {...} }
-      const result = {
-        sydneyBalance: data.sydney?.balance || 0,
-        benBalance: data.ben?.balance || 0,
-        investmentsBalance: data.investments?.balance || 0,
-        sydneyWeeklyChange: data.sydney?.weeklyChange || 0,
-        benWeeklyChange: data.ben?.weeklyChange || 0,
-        investmentsWeeklyChange: data.investments?.weeklyChange || 0
-      };
+      const result = PlaidService.toPartnerFinances(data);
       console.log('PlaidService: Returning finance data:', result);
       return result;
     } catch (error) {